@@ -0,0 +1,74 @@
+"""Bytes held per inventory lot by the in-memory store, before and after.
+
+"Before" keeps the validated Inventory models themselves in an InventoryStore,
+with the same id dict, indexes and ledger, as MemoryRepository did before it
+stored slotted InventoryRecords; "after" is the current MemoryRepository.
+
+Usage: python bench_memory.py [--records N]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+from models import Inventory
+from repository import MemoryRepository
+from store import InventoryStore
+
+
+def _batches(records, batch_size):
+    # Validated like an API request, then handed to the store
+    states = ("received", "on-hand-ready", "allocated")
+    for first in range(0, records, batch_size):
+        yield [
+            Inventory(id=f"INV-{uuid.uuid4().hex[:12]}", component_id=f"C{n % 1000}",
+                      state=states[n % len(states)], quantity=10)
+            for n in range(first, min(first + batch_size, records))
+        ]
+
+
+def _measure(records, add, batch_size=10000):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for batch in _batches(records, batch_size):
+        add(batch)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held / records, records / elapsed
+
+
+def bench_models(records):
+    # The previous storage: the models themselves, indexed the same way
+    store = InventoryStore()
+    per_record, rate = _measure(records, store.add_many)
+    return per_record, rate, store
+
+
+def bench_store(records):
+    repo = MemoryRepository()
+    per_record, rate = _measure(records, repo.add_inventory)
+    return per_record, rate, repo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000000)
+    args = parser.parse_args()
+    per_model, _, store = bench_models(args.records)
+    del store
+    per_record, rate, repo = bench_store(args.records)
+    for label, size in (("before (Inventory models)", per_model), ("after (InventoryRecords, indexed)", per_record)):
+        print(f"{label}: {size:,.0f} bytes per lot, {size * args.records / 2**20:,.0f} MiB for {args.records:,} lots")
+    print(f"{1 - per_record / per_model:.0%} less per lot")
+    print(f"inserts under tracemalloc, which slows them: {rate:,.0f} lots/s")
+    start = time.perf_counter()
+    read = sum(1 for _ in repo.scan_inventory())
+    print(f"full scan back into models: {read / (time.perf_counter() - start):,.0f} lots/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Latency and throughput of the web API under a mixed read/write load.
+
+Serves the current app and, for comparison, the sync web.py it replaced (taken
+from git) under uvicorn, and drives both with the same workload: concurrent
+clients issuing point reads, paged listings, a report and writes (lot state
+changes and cost updates). Prints p50/p99 latency per kind and requests/s.
+
+Usage: python bench_web.py [--clients N] [--requests N] [--write-ratio F] [--baseline REV]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def baseline_source(rev):
+    # web.py as it was before the writer queue, unless a revision is given
+    if rev is None:
+        added = subprocess.run(["git", "rev-list", "-n1", "--diff-filter=A", "HEAD", "--", "writer.py"],
+                               cwd=HERE, capture_output=True, text=True).stdout.strip()
+        rev = f"{added}^" if added else "HEAD"
+    return subprocess.run(["git", "show", f"{rev}:web.py"], cwd=HERE, capture_output=True, text=True,
+                          check=True).stdout
+
+
+def serve(module, app_dir, port):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([app_dir, HERE]))
+    env.pop("AIM_DATABASE", None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning",
+         "--app-dir", app_dir],
+        cwd=HERE, env=env,
+    )
+
+
+async def wait_ready(client):
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def seed(client, components, lots):
+    for n in range(components):
+        await client.post("/components/", json={"id": f"B-{n}", "vendor_name": f"V{n % 5}",
+                                               "manufacturer_name": "M", "estimated_lead_time": "2w", "cost": 1.0})
+    created = await client.post("/inventory/bulk", json=[
+        {"component_id": f"B-{n % components}", "state": "on-hand-ready", "quantity": 10} for n in range(lots)
+    ])
+    return [item["id"] for item in created.json()["created"]]
+
+
+async def worker(client, rng, lot_ids, components, requests, write_ratio, latencies):
+    for _ in range(requests):
+        cid = f"B-{rng.randrange(components)}"
+        if rng.random() < write_ratio:
+            if rng.random() < 0.5:
+                kind, call = "write:transition", client.post("/inventory/transitions", json=[{
+                    "inventory_id": rng.choice(lot_ids), "state": rng.choice(["on-hand-ready", "setup"]),
+                }])
+            else:
+                kind, call = "write:cost", client.post(f"/components/{cid}/cost", params={"new_cost": rng.uniform(1, 9)})
+        else:
+            pick = rng.random()
+            if pick < 0.6:
+                kind, call = "read:component", client.get(f"/components/{cid}")
+            elif pick < 0.95:
+                kind, call = "read:page", client.get("/inventory/", params={"component_id": cid, "limit": 50})
+            else:
+                kind, call = "read:report", client.get("/lead-time-report", params={"by": "estimated"})
+        start = time.perf_counter()
+        response = await call
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{kind}: {response.status_code} {response.text}")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def bench(port, args):
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        await wait_ready(client)
+        lot_ids = await seed(client, args.components, args.lots)
+        latencies = {}
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, random.Random(n), lot_ids, args.components, args.requests, args.write_ratio, latencies)
+            for n in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def run(label, module, app_dir, port, args):
+    server = serve(module, app_dir, port)
+    try:
+        latencies, elapsed = asyncio.run(bench(port, args))
+    finally:
+        server.terminate()
+        server.wait()
+    total = sum(len(v) for v in latencies.values())
+    print(f"{label}: {total / elapsed:,.0f} req/s")
+    for kind in sorted(latencies) + ["all"]:
+        values = sum(latencies.values(), []) if kind == "all" else latencies[kind]
+        print(f"  {kind:<18} n={len(values):<6} p50 {percentile(values, 0.5) * 1000:7.2f} ms"
+              f"  p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--components", type=int, default=100)
+    parser.add_argument("--lots", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--baseline", help="git revision of the sync web.py to compare against")
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, "web_sync.py"), "w") as f:
+            f.write(baseline_source(args.baseline))
+        run("before (sync handlers)", "web_sync", directory, args.port, args)
+        run("after (async handlers, writer queue)", "web", HERE, args.port + 1, args)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import threading
+
+# BOM lines reference either a component or another hardware revision
+# (a sub-assembly): {"component_id": ..., "quantity": n} or {"hwrev_id": ..., "quantity": n}
+
+
+def lead_time_days(component):
+    # The actual lead time when known, else the parsed estimate
+    if component.actual_lead_time:
+        return float(component.actual_lead_time)
+    return component.estimated_lead_time_days or 0.0
+
+
+def _parse_lines(hw):
+    components, subassemblies = {}, {}
+    for line in hw.components:
+        target = subassemblies if line.get("hwrev_id") else components
+        key = line.get("hwrev_id") or line.get("component_id")
+        target[key] = target.get(key, 0) + line.get("quantity", 1)
+    return components, subassemblies
+
+
+class BomIndex:
+    """Hardware revision structure with memoized rollups.
+
+    Keeps each revision's direct component and sub-assembly quantities plus
+    the reverse edges (component -> revisions using it directly, revision ->
+    revisions using it as a sub-assembly). A rollup (leaf requirements, cost,
+    critical-path lead time) is computed once per revision and reused by its
+    parents; a change to a component or revision drops the memo of that node
+    and of its ancestors only.
+
+    The index loads every revision on first use and is then kept current by
+    the CRUD functions in operations.py, which reload it when a store shared
+    with other processes has changed under it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self._loaded = False
+        self._components = {}      # hwrev_id -> {component_id: quantity}
+        self._subassemblies = {}   # hwrev_id -> {hwrev_id: quantity}
+        self._users = {}           # component_id -> {hwrev_id}
+        self._parents = {}         # hwrev_id -> {parent hwrev_id}
+        self._rollups = {}
+
+    def load(self, revisions):
+        with self._lock:
+            if self._loaded:
+                return
+            for hw in revisions:
+                self._link(hw.id, *_parse_lines(hw))
+            self._loaded = True
+
+    def reload(self, revisions):
+        # Replaces the whole index; readers see the old one until it is built
+        fresh = BomIndex()
+        fresh.load(revisions)
+        with self._lock:
+            self._components, self._subassemblies = fresh._components, fresh._subassemblies
+            self._users, self._parents = fresh._users, fresh._parents
+            self._rollups = {}
+            self._loaded = True
+
+    def drop_rollups(self):
+        with self._lock:
+            self._rollups = {}
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def _link(self, hwrev_id, components, subassemblies):
+        self._components[hwrev_id] = components
+        self._subassemblies[hwrev_id] = subassemblies
+        for cid in components:
+            self._users.setdefault(cid, set()).add(hwrev_id)
+        for child in subassemblies:
+            self._parents.setdefault(child, set()).add(hwrev_id)
+
+    def _unlink(self, hwrev_id):
+        for cid in self._components.pop(hwrev_id, {}):
+            users = self._users.get(cid)
+            users.discard(hwrev_id)
+            if not users:
+                del self._users[cid]
+        for child in self._subassemblies.pop(hwrev_id, {}):
+            parents = self._parents.get(child)
+            parents.discard(hwrev_id)
+            if not parents:
+                del self._parents[child]
+
+    def check(self, hw, exists):
+        # Raises ValueError if hw references a missing revision or would make
+        # the sub-assembly graph cyclic; `exists` looks a revision id up
+        _, subassemblies = _parse_lines(hw)
+        with self._lock:
+            for child in subassemblies:
+                if child == hw.id:
+                    raise ValueError(f"Hardware revision {hw.id} cannot contain itself")
+                if child not in self._subassemblies and not exists(child):
+                    raise ValueError(f"Sub-assembly {child} not found")
+            # A cycle exists if hw is reachable from one of its new children
+            stack, seen = list(subassemblies), set()
+            while stack:
+                node = stack.pop()
+                if node == hw.id:
+                    raise ValueError(f"Sub-assembly cycle through hardware revision {hw.id}")
+                if node not in seen:
+                    seen.add(node)
+                    stack.extend(self._subassemblies.get(node, ()))
+
+    def ancestors(self, hwrev_ids):
+        # The given revisions plus every revision that contains them
+        result, stack = set(), list(hwrev_ids)
+        while stack:
+            node = stack.pop()
+            if node not in result:
+                result.add(node)
+                stack.extend(self._parents.get(node, ()))
+        return result
+
+    def _invalidate(self, hwrev_ids):
+        affected = self.ancestors(hwrev_ids)
+        for node in affected:
+            self._rollups.pop(node, None)
+        return affected
+
+    def revision_changed(self, hw):
+        with self._lock:
+            self._unlink(hw.id)
+            self._link(hw.id, *_parse_lines(hw))
+            return self._invalidate([hw.id])
+
+    def revision_removed(self, hwrev_id):
+        with self._lock:
+            affected = self._invalidate([hwrev_id])
+            self._unlink(hwrev_id)
+            return affected
+
+    def component_changed(self, component_id):
+        # Returns the revisions whose rollups depended on the component
+        with self._lock:
+            return self._invalidate(self._users.get(component_id, ()))
+
+    def parents(self, hwrev_id):
+        return set(self._parents.get(hwrev_id, ()))
+
+    def users(self, component_id):
+        return set(self._users.get(component_id, ()))
+
+    def rollup(self, hwrev_id, get_component):
+        # {"leaves": {component_id: quantity}, "cost", "unpriced",
+        # "lead_time_days", "critical_path"} for one build of the revision
+        with self._lock:
+            if hwrev_id not in self._components:
+                return None
+            return self._rollup(hwrev_id, get_component)
+
+    def _rollup(self, hwrev_id, get_component):
+        memo = self._rollups.get(hwrev_id)
+        if memo is not None:
+            return memo
+        leaves, cost, unpriced = {}, 0.0, set()
+        lead_time, critical_path = 0.0, [hwrev_id]
+        for cid, qty in self._components[hwrev_id].items():
+            leaves[cid] = leaves.get(cid, 0) + qty
+            component = get_component(cid)
+            if component is None or component.cost is None:
+                unpriced.add(cid)
+            else:
+                cost += component.cost * qty
+            days = lead_time_days(component) if component is not None else 0.0
+            if days > lead_time:
+                lead_time, critical_path = days, [hwrev_id, cid]
+        for child, qty in self._subassemblies[hwrev_id].items():
+            sub = self._rollup(child, get_component)
+            for cid, n in sub["leaves"].items():
+                leaves[cid] = leaves.get(cid, 0) + n * qty
+            cost += sub["cost"] * qty
+            unpriced.update(sub["unpriced"])
+            if sub["lead_time_days"] > lead_time:
+                lead_time, critical_path = sub["lead_time_days"], [hwrev_id] + sub["critical_path"]
+        memo = self._rollups[hwrev_id] = {
+            "leaves": leaves,
+            "cost": cost,
+            "unpriced": sorted(unpriced),
+            "lead_time_days": lead_time,
+            "critical_path": critical_path,
+        }
+        return memo
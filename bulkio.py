@@ -0,0 +1,164 @@
+import csv
+import itertools
+import json
+import os
+import time
+from models import Component, Inventory
+from operations import (
+    create_components_bulk, create_inventory_bulk, get_repository, iter_inventory
+)
+
+KINDS = ("components", "inventory")
+FORMATS = (".csv", ".jsonl", ".ndjson")
+DEFAULT_CHUNK_SIZE = 1000
+_MODELS = {"components": Component, "inventory": Inventory}
+# Fields holding lists; CSV cells carry them as JSON
+_LIST_FIELDS = {"costs", "state_history", "sub_items"}
+# Kept in the cost series and transition log rather than on the records
+_EXPORT_EXCLUDE = {"components": {"costs"}, "inventory": {"state_history"}}
+
+
+def infer_kind(path):
+    # "components.csv" -> "components", "inventory-2024.jsonl" -> "inventory"
+    name = os.path.basename(path).lower()
+    for kind in KINDS:
+        if name.startswith(kind):
+            return kind
+    raise ValueError(f"Cannot tell what {path} holds; name it components.* or inventory.*, or pass --kind")
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported file type {ext!r}; use one of {FORMATS}")
+    return "csv" if ext == ".csv" else "jsonl"
+
+
+def _read_rows(f, fmt):
+    # Yields (line number, row dict or None, error or None) one row at a time
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                yield reader.line_num, _from_csv(row), None
+            except ValueError as e:
+                yield reader.line_num, row, f"Invalid list field: {e}"
+        return
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, line.rstrip("\n"), f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, row, "Each line must be a JSON object"
+        else:
+            yield line_no, row, None
+
+
+def _from_csv(row):
+    # Blank cells are left to the model defaults
+    return {
+        key: json.loads(value) if key in _LIST_FIELDS else value
+        for key, value in row.items() if key and value not in (None, "")
+    }
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _apply_chunk(kind, rows, actor):
+    # Returns [(index in rows, error)] for the rows that were not written
+    if kind == "components":
+        return [(e["index"], e["error"]) for e in create_components_bulk(rows, atomic=False)["errors"]]
+    result = create_inventory_bulk(rows, atomic=False, actor=actor)
+    return [(e["index"], e["error"]) for e in result["errors"]]
+
+
+def import_file(path, kind=None, chunk_size=DEFAULT_CHUNK_SIZE, rejects_path=None, actor="import", progress=None):
+    # Streams a CSV or JSONL file into the store in chunks of `chunk_size`
+    # rows, through the batch operations, so memory use is bounded by the
+    # chunk rather than the file. Rows that fail to parse or validate are
+    # written with their line number and error to `rejects_path` (default
+    # <path>.rejects.jsonl) and the import carries on. Returns counts and
+    # throughput; `progress`, if given, is called with them after each chunk.
+    kind = kind or infer_kind(path)
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    fmt = _format(path)
+    rejects_path = rejects_path or path + ".rejects.jsonl"
+    stats = {"kind": kind, "rows": 0, "imported": 0, "rejected": 0, "seconds": 0.0, "rows_per_second": 0.0,
+             "rejects_path": None}
+    started = time.perf_counter()
+    rejects = None
+    with open(path, newline="" if fmt == "csv" else None, encoding="utf-8") as f:
+        try:
+            for chunk in _chunks(_read_rows(f, fmt), chunk_size):
+                rows, lines, failed = [], [], []
+                for line_no, row, error in chunk:
+                    if error:
+                        failed.append((line_no, row, error))
+                    else:
+                        rows.append(row)
+                        lines.append(line_no)
+                failed.extend((lines[i], rows[i], error) for i, error in _apply_chunk(kind, rows, actor))
+                if failed:
+                    if rejects is None:
+                        rejects = open(rejects_path, "w", encoding="utf-8")
+                    for line_no, row, error in sorted(failed, key=lambda r: r[0]):
+                        rejects.write(json.dumps({"line": line_no, "row": row, "error": error}, default=str) + "\n")
+                stats["rows"] += len(chunk)
+                stats["rejected"] += len(failed)
+                stats["imported"] = stats["rows"] - stats["rejected"]
+                stats["seconds"] = time.perf_counter() - started
+                stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+                if progress:
+                    progress(stats)
+        finally:
+            if rejects is not None:
+                rejects.close()
+                stats["rejects_path"] = rejects_path
+    return stats
+
+
+def _export_records(kind, state=None, component_id=None):
+    if kind == "components":
+        return iter(get_repository().list_components())
+    return (item for _, item in iter_inventory(state=state, component_id=component_id))
+
+
+def export_file(path, kind=None, state=None, component_id=None):
+    # Writes components or inventory (optionally filtered) as CSV or JSONL,
+    # one record at a time. Returns the row count and throughput.
+    kind = kind or infer_kind(path)
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    fmt = _format(path)
+    exclude = _EXPORT_EXCLUDE[kind]
+    fields = [name for name in _MODELS[kind].model_fields if name not in exclude]
+    started = time.perf_counter()
+    rows = 0
+    with open(path, "w", newline="" if fmt == "csv" else None, encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for record in _export_records(kind, state, component_id):
+            if writer:
+                row = record.model_dump(mode="json", exclude=exclude)
+                writer.writerow({
+                    key: json.dumps(value) if key in _LIST_FIELDS else value
+                    for key, value in row.items()
+                })
+            else:
+                f.write(record.model_dump_json(exclude=exclude) + "\n")
+            rows += 1
+    seconds = time.perf_counter() - started
+    return {"kind": kind, "rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
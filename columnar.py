@@ -0,0 +1,190 @@
+import json
+import os
+import time
+from array import array
+import numpy as np
+from operations import get_repository, sync_transition_log
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = ("npy", "arrow", "parquet")
+TABLES = ("components", "inventory", "costs", "transitions")
+# Code columns share one dictionary per kind of value across tables, so codes join directly
+DICTIONARIES = ("component_id", "inventory_id", "state", "vendor_name", "manufacturer_name")
+_NAN = float("nan")
+
+
+class _Dictionary:
+    """Assigns int32 codes to values in first-seen order; None is -1."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _components(dicts):
+    columns = {"component_id": array("i"), "vendor_name": array("i"), "manufacturer_name": array("i"),
+               "cost": array("d"), "failure_rate": array("d"), "actual_lead_time": array("q"),
+               "estimated_lead_time_days": array("d")}
+    for cid, vendor, manufacturer, cost, rate, actual, estimated in get_repository().component_rows():
+        columns["component_id"].append(dicts["component_id"].code(cid))
+        columns["vendor_name"].append(dicts["vendor_name"].code(vendor))
+        columns["manufacturer_name"].append(dicts["manufacturer_name"].code(manufacturer))
+        # NaN where unknown; an actual lead time of 0 already means unknown
+        columns["cost"].append(_NAN if cost is None else cost)
+        columns["failure_rate"].append(_NAN if rate is None else rate)
+        columns["actual_lead_time"].append(actual or 0)
+        columns["estimated_lead_time_days"].append(_NAN if estimated is None else estimated)
+    return columns
+
+
+def _inventory(dicts):
+    columns = {"inventory_id": array("i"), "component_id": array("i"), "state": array("i"), "quantity": array("q")}
+    for item_id, cid, state, quantity in get_repository().inventory_rows():
+        columns["inventory_id"].append(dicts["inventory_id"].code(item_id))
+        columns["component_id"].append(dicts["component_id"].code(cid))
+        columns["state"].append(dicts["state"].code(state))
+        columns["quantity"].append(quantity)
+    return columns
+
+
+def _costs(dicts):
+    columns = {"component_id": array("i"), "timestamp": array("d"), "cost": array("d")}
+    for cid, ts, value in get_repository().cost_rows():
+        columns["component_id"].append(dicts["component_id"].code(cid))
+        columns["timestamp"].append(ts)
+        columns["cost"].append(value)
+    return columns
+
+
+def _transitions(dicts):
+    # The log is already columnar; its interned codes are mapped onto the shared dictionaries
+    log, values = sync_transition_log().columns()
+    columns = {"timestamp": np.frombuffer(log["timestamp"], dtype=np.float64)}
+    for name, dictionary in (("inventory_id", "inventory_id"), ("component_id", "component_id"),
+                             ("from_state", "state"), ("to_state", "state")):
+        key = "state" if dictionary == "state" else name
+        mapping = np.fromiter((dicts[dictionary].code(v) for v in values[key]), dtype=np.int32,
+                              count=len(values[key]))
+        codes = np.frombuffer(log[name], dtype=np.int8 if dictionary == "state" else np.int64)
+        columns[name] = mapping[codes] if len(mapping) else np.empty(0, dtype=np.int32)
+    columns["quantity"] = np.frombuffer(log["quantity"], dtype=np.int64)
+    return columns
+
+
+_READERS = {"components": _components, "inventory": _inventory, "costs": _costs, "transitions": _transitions}
+# Which dictionary each code column refers to
+_CODED = {"component_id": "component_id", "inventory_id": "inventory_id", "state": "state",
+          "from_state": "state", "to_state": "state", "vendor_name": "vendor_name",
+          "manufacturer_name": "manufacturer_name"}
+_DTYPES = {"i": np.int32, "q": np.int64, "d": np.float64}
+
+
+def _as_numpy(column):
+    # array.array buffers become numpy arrays without a copy
+    return np.frombuffer(column, dtype=_DTYPES[column.typecode]) if isinstance(column, array) else column
+
+
+def _arrow_table(columns, dicts):
+    fields = {}
+    for name, column in columns.items():
+        if name in _CODED:
+            fields[name] = pa.DictionaryArray.from_arrays(
+                pa.array(column, mask=column < 0), pa.array(dicts[_CODED[name]].values, type=pa.string())
+            )
+        else:
+            fields[name] = pa.array(column)
+    return pa.table(fields)
+
+
+def export_snapshot(directory, fmt=None, tables=TABLES):
+    # Writes the stores as columnar files for offline analysis, reading
+    # plain rows from the repository rather than dumping models. Each table
+    # is gathered into typed column buffers (a few bytes per value), then:
+    #   npy     <directory>/<table>/<column>.npy plus dictionaries/<name>.npy
+    #   arrow   <directory>/<table>.arrow (uncompressed IPC file)
+    #   parquet <directory>/<table>.parquet
+    # String columns are int32 codes into shared dictionaries (-1 for None);
+    # unknown floats are NaN. fmt defaults to arrow when pyarrow is installed
+    # and npy otherwise. manifest.json records the format, row counts and
+    # which dictionary each code column uses.
+    fmt = fmt or ("arrow" if pa is not None else "npy")
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}")
+    if fmt != "npy" and pa is None:
+        raise ValueError(f"{fmt} export needs pyarrow; use fmt='npy'")
+    unknown = set(tables) - set(TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables {sorted(unknown)}; choose from {TABLES}")
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    dicts = {name: _Dictionary() for name in DICTIONARIES}
+    manifest = {"format": fmt, "exported_at": time.time(), "tables": {}}
+    for table in tables:
+        columns = {name: _as_numpy(column) for name, column in _READERS[table](dicts).items()}
+        rows = len(next(iter(columns.values())))
+        manifest["tables"][table] = {
+            "rows": rows,
+            "columns": {name: _CODED.get(name) or str(column.dtype) for name, column in columns.items()},
+        }
+        if fmt == "npy":
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+            for name, column in columns.items():
+                np.save(os.path.join(directory, table, f"{name}.npy"), column)
+        elif fmt == "arrow":
+            arrow = _arrow_table(columns, dicts)
+            with pa.OSFile(os.path.join(directory, f"{table}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, arrow.schema) as writer:
+                    writer.write_table(arrow)
+        else:
+            pq.write_table(_arrow_table(columns, dicts), os.path.join(directory, f"{table}.parquet"))
+    if fmt == "npy":
+        os.makedirs(os.path.join(directory, "dictionaries"), exist_ok=True)
+        for name, dictionary in dicts.items():
+            np.save(os.path.join(directory, "dictionaries", f"{name}.npy"), np.array(dictionary.values, dtype=str))
+    manifest["seconds"] = time.perf_counter() - started
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_table(directory, table):
+    # npy snapshots: {column: array} memory-mapped read-only, so nothing is
+    # copied until used; code columns are decoded with load_dictionary.
+    # arrow snapshots: a pyarrow Table over a memory map (also zero-copy);
+    # parquet snapshots: a pyarrow Table read into memory.
+    manifest = load_manifest(directory)
+    fmt = manifest["format"]
+    if fmt == "npy":
+        return {
+            name: np.load(os.path.join(directory, table, f"{name}.npy"), mmap_mode="r")
+            for name in manifest["tables"][table]["columns"]
+        }
+    if pa is None:
+        raise ValueError(f"Reading a {fmt} snapshot needs pyarrow")
+    if fmt == "arrow":
+        return pa.ipc.open_file(pa.memory_map(os.path.join(directory, f"{table}.arrow"))).read_all()
+    return pq.read_table(os.path.join(directory, f"{table}.parquet"), memory_map=True)
+
+
+def load_dictionary(directory, name):
+    # Values of an npy snapshot's dictionary; values[code] decodes a code column
+    return np.load(os.path.join(directory, "dictionaries", f"{name}.npy"), mmap_mode="r")
@@ -0,0 +1,21 @@
+import pytest
+from operations import get_repository, set_repository
+from repository import MemoryRepository, SqliteRepository
+from journal import JournaledRepository
+
+
+@pytest.fixture(params=["memory", "sqlite", "journal"])
+def backend(request, tmp_path):
+    # Runs a test against each storage backend, starting from an empty store
+    previous = get_repository()
+    if request.param == "memory":
+        repo = MemoryRepository()
+    elif request.param == "sqlite":
+        repo = SqliteRepository(str(tmp_path / "aim.db"))
+    else:
+        repo = JournaledRepository(str(tmp_path / "journal"))
+    set_repository(repo)
+    yield request.param
+    set_repository(previous)
+    if request.param == "journal":
+        repo.close()
@@ -0,0 +1,339 @@
+import bisect
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+
+
+class _Interned:
+    """Maps strings to small ints so event columns can be numeric arrays."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class TransitionLog:
+    """Append-only log of inventory state changes, stored column by column.
+
+    Each event is one slot in parallel arrays (timestamp, item, component,
+    from-state, to-state, quantity, actor); strings are interned to ints, so an
+    event costs a few dozen bytes instead of a dict per Pydantic object. Per-item
+    and per-component position lists index the log. Timestamps only grow, so
+    time-range queries are binary searches over those positions.
+
+    A creation event has from_state None and a removal (deletion, or units
+    taken off a lot) has to_state None. When a lot is split, the new lot's
+    timeline starts with the parent's events up to the split.
+
+    The log also keeps running quantities per (component, state) and packs a
+    copy of them into two int arrays every `checkpoint_every` events, or every
+    as many events as there are (component, state) pairs if that is more, so
+    checkpoints cost at most 16 bytes per event however many pairs there are.
+    The stock at a past time is the nearest checkpoint plus a replay of the
+    events after it.
+
+    The log is an in-memory index of events the repository stores. attach()
+    gives it a function that persists each new event as a row; rows read back
+    from the store are applied with ingest(), in the order they were stored.
+    When the store is shared with other processes, new events are only
+    persisted, and join the log when it is caught up, so every process sees
+    every process's events in the same order. A store that held lots before
+    events were stored is seeded with one creation event per lot; `since` is
+    then the time of seeding, and stock before it is unknown.
+
+    Rows are (kind, timestamp, item_id, component_id, from_state, to_state,
+    quantity, actor, parent_id) with kind "event", "split" (item_id is the new
+    lot, parent_id the lot it was split from) or "seed".
+    """
+
+    def __init__(self, checkpoint_every=4096):
+        self._lock = threading.Lock()
+        self.checkpoint_every = checkpoint_every
+        # Objects notified in log order through on_event(item_id,
+        # component_id, from_state, to_state, quantity, timestamp) and
+        # on_split(parent_id, child_id, quantity)
+        self.listeners = []
+        self._persist = None
+        self.shared = False
+        self.clear()
+
+    def attach(self, persist, shared=False):
+        # persist(rows) stores new events; with shared=True they are applied
+        # only once read back through ingest()
+        self._persist, self.shared = persist, shared
+
+    def clear(self):
+        self.timestamps = array("d")
+        self.items = array("q")
+        self.components = array("q")
+        self.from_states = array("b")
+        self.to_states = array("b")
+        self.quantities = array("q")
+        self.actors = array("q")
+        self._item_ids = _Interned()
+        self._component_ids = _Interned()
+        self._states = _Interned()
+        self._actor_names = _Interned()
+        self._states.code(None)
+        self._actor_names.code(None)
+        self._by_item = {}
+        self._by_component = {}
+        self._parents = {}
+        # (component code, state code) -> quantity now, and at each position in
+        # _checkpoint_at as (component << 8 | state, quantity) arrays
+        self._counts = {}
+        self._checkpoint_at = array("q", [0])
+        self._checkpoints = [(array("q"), array("q"))]
+        # Start of the known history; None when the log saw it all
+        self.since = None
+        # Sequence number of the last row ingested from the store
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def record(self, item_id, component_id, from_state, to_state, quantity, actor=None, timestamp=None):
+        with self._lock:
+            self._add([("event", self._now(timestamp), item_id, component_id, from_state, to_state, quantity,
+                        actor, None)])
+
+    def seed(self, rows, timestamp=None):
+        # Starts an empty log from lots that already exist, given as
+        # (id, component_id, state, quantity) rows: one creation event each,
+        # at `timestamp`. Listeners are not told; these are not new events.
+        with self._lock:
+            if self.timestamps:
+                raise ValueError("Only an empty transition log can be seeded")
+            ts = self._now(timestamp)
+            self._add([("seed", ts, item_id, component_id, None, state, quantity, None, None)
+                       for item_id, component_id, state, quantity in rows])
+
+    def ingest(self, rows):
+        # Applies (seq, *row) rows read back from the store, skipping those
+        # already applied; listeners are told of events and splits
+        with self._lock:
+            for seq, *row in rows:
+                if seq > self.seq:
+                    self._apply_row(row)
+                    self.seq = seq
+
+    def _now(self, timestamp):
+        ts = time.time() if timestamp is None else timestamp
+        return max(ts, self.timestamps[-1]) if self.timestamps else ts
+
+    def _add(self, rows):
+        if self._persist is not None:
+            self._persist(rows)
+        if not self.shared:
+            for row in rows:
+                self._apply_row(row)
+
+    def _apply_row(self, row):
+        kind, ts, item_id, component_id, from_state, to_state, quantity, actor, parent_id = row
+        if self.timestamps and ts < self.timestamps[-1]:
+            ts = self.timestamps[-1]
+        if kind == "split":
+            self._parents[self._item_ids.code(item_id)] = (self._item_ids.code(parent_id), len(self.timestamps))
+            for listener in self.listeners:
+                listener.on_split(parent_id, item_id, quantity)
+            return
+        if kind == "seed" and self.since is None:
+            self.since = ts
+        self._append(item_id, component_id, from_state, to_state, quantity, actor, ts)
+        if kind == "event":
+            for listener in self.listeners:
+                listener.on_event(item_id, component_id, from_state, to_state, quantity, ts)
+
+    def _append(self, item_id, component_id, from_state, to_state, quantity, actor, ts):
+        position = len(self.timestamps)
+        item = self._item_ids.code(item_id)
+        component = self._component_ids.code(component_id)
+        self.timestamps.append(ts)
+        self.items.append(item)
+        self.components.append(component)
+        self.from_states.append(self._states.code(from_state))
+        self.to_states.append(self._states.code(to_state))
+        self.quantities.append(quantity)
+        self.actors.append(self._actor_names.code(actor))
+        self._by_item.setdefault(item, array("q")).append(position)
+        self._by_component.setdefault(component, array("q")).append(position)
+        self._apply(self._counts, position)
+        if position + 1 - self._checkpoint_at[-1] >= max(self.checkpoint_every, len(self._counts)):
+            self._checkpoint_at.append(position + 1)
+            self._checkpoints.append((
+                array("q", (component << 8 | state for component, state in self._counts)),
+                array("q", self._counts.values()),
+            ))
+        return position
+
+    def record_change(self, item_id, before, after, actor=None):
+        # Logs the difference between two (component_id, state, quantity)
+        # views of one record as moves, additions and removals
+        (old_component, old_state, old_quantity), (component, state, quantity) = before, after
+        if component != old_component:
+            self.record(item_id, old_component, old_state, None, old_quantity, actor)
+            self.record(item_id, component, None, state, quantity, actor)
+            return
+        if state != old_state:
+            self.record(item_id, component, old_state, state, old_quantity, actor)
+        if quantity > old_quantity:
+            self.record(item_id, component, None, state, quantity - old_quantity, actor)
+        elif quantity < old_quantity:
+            self.record(item_id, component, state, None, old_quantity - quantity, actor)
+
+    def _apply(self, counts, position):
+        component, quantity = self.components[position], self.quantities[position]
+        for state, delta in ((self.from_states[position], -quantity), (self.to_states[position], quantity)):
+            if state:
+                key = (component, state)
+                counts[key] = counts.get(key, 0) + delta
+
+    def record_split(self, parent_id, child_id, quantity):
+        # The child inherits the parent's history up to this point
+        with self._lock:
+            self._add([("split", self._now(None), child_id, None, None, None, quantity, None, parent_id)])
+
+    def columns(self):
+        # A consistent copy of the event columns, plus the interned values
+        # each code column refers to (state code 0 is None)
+        with self._lock:
+            return {
+                "timestamp": array("d", self.timestamps),
+                "inventory_id": array("q", self.items),
+                "component_id": array("q", self.components),
+                "from_state": array("b", self.from_states),
+                "to_state": array("b", self.to_states),
+                "quantity": array("q", self.quantities),
+            }, {
+                "inventory_id": list(self._item_ids.values),
+                "component_id": list(self._component_ids.values),
+                "state": list(self._states.values),
+            }
+
+    def _event(self, position):
+        return {
+            "inventory_id": self._item_ids.values[self.items[position]],
+            "component_id": self._component_ids.values[self.components[position]],
+            "from_state": self._states.values[self.from_states[position]],
+            "to_state": self._states.values[self.to_states[position]],
+            "quantity": self.quantities[position],
+            "timestamp": datetime.fromtimestamp(self.timestamps[position]),
+            "actor": self._actor_names.values[self.actors[position]],
+        }
+
+    def _range(self, positions, since=None, until=None):
+        ts = self.timestamps
+        lo = bisect.bisect_left(positions, since, key=ts.__getitem__) if since is not None else 0
+        hi = bisect.bisect_right(positions, until, key=ts.__getitem__) if until is not None else len(positions)
+        return positions[lo:hi]
+
+    def _item_positions(self, item, before=None):
+        own = self._by_item.get(item, array("q"))
+        if before is not None:
+            own = own[:bisect.bisect_left(own, before)]
+        parent = self._parents.get(item)
+        if parent is None:
+            return list(own)
+        parent_item, split_at = parent
+        return self._item_positions(parent_item, split_at if before is None else min(before, split_at)) + list(own)
+
+    def timeline(self, item_id):
+        # Every event that shaped this item, including those of the lot it was split from
+        item = self._item_ids.codes.get(item_id)
+        if item is None:
+            return []
+        return [self._event(p) for p in self._item_positions(item)]
+
+    def for_component(self, component_id, since=None, until=None, limit=None):
+        # The first `limit` events in the range, oldest first
+        component = self._component_ids.codes.get(component_id)
+        if component is None:
+            return []
+        positions = self._range(self._by_component[component], _ts(since), _ts(until))
+        return [self._event(p) for p in positions[:limit]]
+
+    def counts_as_of(self, timestamp, component_id=None):
+        # {(component_id, state): quantity} once every event up to `timestamp`
+        # has been applied; optionally for one component only
+        with self._lock:
+            if self.since is not None and _ts(timestamp) < self.since:
+                raise ValueError(f"Stock is only known from {datetime.fromtimestamp(self.since)}, "
+                                 "when the store was loaded")
+            end = bisect.bisect_right(self.timestamps, _ts(timestamp))
+            checkpoint = bisect.bisect_right(self._checkpoint_at, end) - 1
+            start = self._checkpoint_at[checkpoint]
+            keys, quantities = self._checkpoints[checkpoint]
+            if component_id is None:
+                counts = {(key >> 8, key & 255): qty for key, qty in zip(keys, quantities)}
+                positions = range(start, end)
+            else:
+                component = self._component_ids.codes.get(component_id)
+                counts = {(key >> 8, key & 255): qty for key, qty in zip(keys, quantities) if key >> 8 == component}
+                own = self._by_component.get(component, array("q"))
+                positions = own[bisect.bisect_left(own, start):bisect.bisect_left(own, end)]
+            for position in positions:
+                self._apply(counts, position)
+        return {
+            (self._component_ids.values[component], self._states.values[state]): qty
+            for (component, state), qty in counts.items() if qty
+        }
+
+    def between(self, since=None, until=None, limit=None):
+        ts = self.timestamps
+        lo = bisect.bisect_left(ts, _ts(since)) if since is not None else 0
+        hi = bisect.bisect_right(ts, _ts(until)) if until is not None else len(ts)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self._event(p) for p in range(lo, hi)]
+
+
+class ChangeLog:
+    """Field-level diffs of record updates, oldest first.
+
+    Each entry names the kind of record, its id, {field: {"old", "new"}} for
+    the fields that changed, the actor and the time. Only the last `size`
+    entries are kept.
+    """
+
+    def __init__(self, size=10000):
+        self._lock = threading.Lock()
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self._entries = deque(maxlen=self.size)
+
+    def record(self, kind, record_id, changes, actor=None, timestamp=None):
+        entry = {
+            "kind": kind,
+            "id": record_id,
+            "changes": changes,
+            "actor": actor,
+            "timestamp": datetime.fromtimestamp(time.time() if timestamp is None else timestamp),
+        }
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def entries(self, kind=None, record_id=None, limit=None):
+        # The most recent `limit` entries matching the filters
+        with self._lock:
+            matched = [e for e in self._entries
+                       if (kind is None or e["kind"] == kind) and (record_id is None or e["id"] == record_id)]
+        return matched[-limit:] if limit else matched
+
+
+def _ts(value):
+    # Accepts datetimes or epoch seconds
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
@@ -0,0 +1,123 @@
+import math
+import threading
+from models import InventoryState
+
+# Rolling windows, in days, kept next to the all-time counts
+WINDOWS = (30, 90)
+_DAY = 86400.0
+_Z_95 = 1.96
+
+
+def wilson_interval(failed, exposed, z=_Z_95):
+    # 95% Wilson score interval for failed / exposed; (None, None) without data
+    if not exposed:
+        return None, None
+    p = failed / exposed
+    denominator = 1 + z * z / exposed
+    centre = (p + z * z / (2 * exposed)) / denominator
+    half = z * math.sqrt(p * (1 - p) / exposed + z * z / (4 * exposed * exposed)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class _Counter:
+    """Failed and exposed units of one component, all-time and per window.
+
+    The last max(WINDOWS) days are kept as a ring of daily buckets next to a
+    running sum per window. Moving to a new day subtracts the buckets that
+    fall out of each window, so an event costs O(len(WINDOWS)) amortized.
+    """
+
+    __slots__ = ("failed", "exposed", "day", "ring_failed", "ring_exposed", "window_failed", "window_exposed")
+
+    def __init__(self, day):
+        self.failed = self.exposed = 0
+        self.day = day
+        self.ring_failed = [0] * WINDOWS[-1]
+        self.ring_exposed = [0] * WINDOWS[-1]
+        self.window_failed = [0] * len(WINDOWS)
+        self.window_exposed = [0] * len(WINDOWS)
+
+    def advance(self, day):
+        size = len(self.ring_failed)
+        if day - self.day >= size:
+            self.ring_failed, self.ring_exposed = [0] * size, [0] * size
+            self.window_failed, self.window_exposed = [0] * len(WINDOWS), [0] * len(WINDOWS)
+        else:
+            for current in range(self.day + 1, day + 1):
+                for i, window in enumerate(WINDOWS):
+                    slot = (current - window) % size
+                    self.window_failed[i] -= self.ring_failed[slot]
+                    self.window_exposed[i] -= self.ring_exposed[slot]
+                # The longest window's oldest day shares the new day's slot
+                self.ring_failed[current % size] = self.ring_exposed[current % size] = 0
+        self.day = max(self.day, day)
+
+    def add(self, day, failed, exposed):
+        self.failed += failed
+        self.exposed += exposed
+        if day > self.day:
+            self.advance(day)
+        age = self.day - day
+        if age >= len(self.ring_failed):
+            return
+        self.ring_failed[day % len(self.ring_failed)] += failed
+        self.ring_exposed[day % len(self.ring_exposed)] += exposed
+        for i, window in enumerate(WINDOWS):
+            if age < window:
+                self.window_failed[i] += failed
+                self.window_exposed[i] += exposed
+
+
+class FailureStats:
+    """Failure counts per component, derived from inventory state changes.
+
+    A unit counts as exposed when it enters in-production, or when it fails
+    without having been in production; it counts as failed when it enters
+    the failed state. The failure rate is failed / exposed. Counters are
+    updated per transition-log event, so reports never scan inventory. They
+    are rebuilt from the stored events when a store is loaded, and follow
+    other workers' events on a shared store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._counters = {}
+
+    # Transition-log listener
+    def on_event(self, item_id, component_id, from_state, to_state, quantity, timestamp):
+        if to_state == InventoryState.FAILED:
+            failed, exposed = quantity, 0 if from_state == InventoryState.IN_PRODUCTION else quantity
+        elif to_state == InventoryState.IN_PRODUCTION:
+            failed, exposed = 0, quantity
+        else:
+            return
+        day = int(timestamp // _DAY)
+        with self._lock:
+            counter = self._counters.get(component_id)
+            if counter is None:
+                counter = self._counters[component_id] = _Counter(day)
+            counter.add(day, failed, exposed)
+
+    def on_split(self, parent_id, child_id, quantity):
+        pass
+
+    def counts(self, now):
+        # {component_id: {"failed", "exposed", "windows": {days: (failed, exposed)}}}
+        # with the windows ending at `now` (epoch seconds)
+        day = int(now // _DAY)
+        with self._lock:
+            result = {}
+            for component_id, counter in self._counters.items():
+                counter.advance(day)
+                result[component_id] = {
+                    "failed": counter.failed,
+                    "exposed": counter.exposed,
+                    "windows": {
+                        window: (counter.window_failed[i], counter.window_exposed[i])
+                        for i, window in enumerate(WINDOWS)
+                    },
+                }
+            return result
@@ -0,0 +1,361 @@
+import gc
+import glob
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from models import Component, HardwareRevision
+from repository import MemoryRepository
+from store import InventoryRecord, INVENTORY_FIELDS
+from timeseries import CostSeries
+
+# Each log frame is <length><crc32> followed by a pickled (lsn, op, *args) tuple
+_FRAME = struct.Struct("<II")
+FSYNC_POLICIES = ("always", "batch", "off")
+
+
+@contextmanager
+def _gc_paused():
+    # Building millions of records would otherwise trigger many full
+    # collections that find nothing to free
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class WriteAheadLog:
+    """Append-only log segment with configurable fsync batching.
+
+    "always" fsyncs every record, "batch" fsyncs once `batch_size` records or
+    `batch_interval` seconds have accumulated, and "off" leaves flushing to the
+    OS. A torn or corrupt frame at the tail ends replay cleanly.
+    """
+
+    def __init__(self, path, fsync="batch", batch_size=256, batch_interval=0.05):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.path = path
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._file = open(path, "ab")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(_FRAME.pack(len(data), zlib.crc32(data)) + data)
+        self._pending += 1
+        if self.fsync == "always":
+            self.sync()
+        elif self.fsync == "batch" and (
+            self._pending >= self.batch_size or time.monotonic() - self._last_sync >= self.batch_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        if self.fsync != "off":
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    @staticmethod
+    def read(path):
+        # Yields records up to the first incomplete or corrupt frame
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(_FRAME.size)
+                if len(header) < _FRAME.size:
+                    return
+                length, crc = _FRAME.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    return
+                yield pickle.loads(data)
+
+
+class JournaledRepository(MemoryRepository):
+    """In-memory repository made durable by a write-ahead log plus snapshots.
+
+    Every mutation is applied to the in-memory stores and appended to the
+    current log segment under one lock. snapshot() writes a compacted image of
+    the stores and starts a new segment, so startup only loads the latest
+    snapshot and replays the log written after it.
+
+    Inventory transition events are history rather than state, so they go to
+    their own log segments (transitions-*.log), which snapshots leave alone.
+    """
+
+    def __init__(self, directory, fsync="batch", batch_size=256, batch_interval=0.05):
+        super().__init__()
+        self.directory = directory
+        self._wal_options = dict(fsync=fsync, batch_size=batch_size, batch_interval=batch_interval)
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._snapshotter = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        with _gc_paused():
+            self.lsn = self._recover()
+        self._wal = self._open_segment(self.lsn + 1)
+        self.transition_seq = self._last_transition_seq()
+        self._events = self._open_segment(self.transition_seq + 1, "transitions")
+        self._flusher = None
+        self._start_flusher()
+
+    def _start_flusher(self):
+        # Records still buffered when writes pause are flushed in the background
+        if self._wal_options["fsync"] != "always":
+            self._flusher = threading.Thread(target=self._flush_loop, name="aim-wal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self._wal_options["batch_interval"]):
+            with self._lock:
+                for wal in (self._wal, self._events):
+                    if not wal.closed and wal._pending:
+                        wal.sync()
+
+    def _open_segment(self, start_lsn, prefix="wal"):
+        # A leftover segment with this start holds only a torn first record
+        path = self._segment_path(start_lsn, prefix)
+        if os.path.exists(path):
+            os.remove(path)
+        return WriteAheadLog(path, **self._wal_options)
+
+    def _segment_path(self, start_lsn, prefix="wal"):
+        return os.path.join(self.directory, f"{prefix}-{start_lsn:020d}.log")
+
+    def _last_transition_seq(self):
+        # Events are appended after the last whole record; a torn tail is left
+        # behind in its segment, as a new segment starts after it
+        segments = sorted(glob.glob(os.path.join(self.directory, "transitions-*.log")))
+        if not segments:
+            return 0
+        seq = int(os.path.basename(segments[-1])[len("transitions-"):-len(".log")]) - 1
+        for record in WriteAheadLog.read(segments[-1]):
+            seq = record[0]
+        return seq
+
+    def _snapshot_path(self, lsn):
+        return os.path.join(self.directory, f"snapshot-{lsn:020d}.bin")
+
+    # Recovery
+    def _recover(self):
+        lsn = 0
+        snapshots = sorted(glob.glob(os.path.join(self.directory, "snapshot-*.bin")))
+        if snapshots:
+            lsn = self._load_snapshot(snapshots[-1])
+        for segment in sorted(glob.glob(os.path.join(self.directory, "wal-*.log"))):
+            for record in WriteAheadLog.read(segment):
+                if record[0] > lsn:
+                    self._apply(*record[1:])
+                    lsn = record[0]
+        return lsn
+
+    def _load_snapshot(self, path):
+        with open(path, "rb") as f:
+            image = pickle.load(f)
+        for data in image["components"]:
+            MemoryRepository.save_component(self, Component.model_validate(data))
+        for component_id, (timestamps, values) in image.get("costs", {}).items():
+            self.costs[component_id] = CostSeries(timestamps, values)
+        # Snapshot rows were validated when first written, so skip revalidation
+        MemoryRepository.add_inventory(self, [InventoryRecord(*row) for row in image["inventory"]])
+        for data in image["hardware_revisions"]:
+            MemoryRepository.save_hardware_revision(self, HardwareRevision.model_validate(data))
+        return image["lsn"]
+
+    def _apply(self, op, *args):
+        if op == "save_component":
+            MemoryRepository.save_component(self, Component.model_validate(args[0]))
+        elif op == "delete_component":
+            MemoryRepository.delete_component(self, args[0])
+        elif op == "add_cost":
+            MemoryRepository.add_cost(self, *args)
+        elif op == "add_inventory":
+            MemoryRepository.add_inventory(self, [InventoryRecord(*row) for row in args[0]])
+        elif op == "update_inventory":
+            item = self.inventory.get(args[0])
+            if item is not None:
+                MemoryRepository.update_inventory(self, item, args[1])
+        elif op == "delete_inventory":
+            MemoryRepository.delete_inventory(self, args[0])
+        elif op == "save_hardware_revision":
+            MemoryRepository.save_hardware_revision(self, HardwareRevision.model_validate(args[0]))
+        elif op == "delete_hardware_revision":
+            MemoryRepository.delete_hardware_revision(self, args[0])
+        else:
+            raise ValueError(f"Unknown journal operation {op!r}")
+
+    # Logging
+    def _log(self, op, *args):
+        self._reopen()
+        self.lsn += 1
+        self._wal.append((self.lsn, op) + args)
+
+    def _reopen(self):
+        # Closed, then written to again: carry on in the same segments
+        if self._wal.closed:
+            self._wal = WriteAheadLog(self._wal.path, **self._wal_options)
+        if self._events.closed:
+            self._events = WriteAheadLog(self._events.path, **self._wal_options)
+        if self._flusher is None and self._stop.is_set():
+            self._stop = threading.Event()
+            self._start_flusher()
+
+    def append_transitions(self, rows):
+        with self._lock:
+            self._reopen()
+            for row in rows:
+                self.transition_seq += 1
+                self._events.append((self.transition_seq,) + tuple(row))
+
+    def transitions(self, after=0):
+        with self._lock:
+            if not self._events.closed:
+                self._events.sync()
+        for segment in sorted(glob.glob(os.path.join(self.directory, "transitions-*.log"))):
+            for record in WriteAheadLog.read(segment):
+                if record[0] > after:
+                    yield record
+
+    @staticmethod
+    def _inventory_row(item):
+        # Lists are copied so the row does not change if the record does
+        return tuple(
+            list(value) if isinstance(value, list) else value
+            for value in (getattr(item, name) for name in INVENTORY_FIELDS)
+        )
+
+    def save_component(self, component):
+        with self._lock:
+            super().save_component(component)
+            self._log("save_component", component.model_dump())
+        return component
+
+    def delete_component(self, component_id):
+        with self._lock:
+            deleted = super().delete_component(component_id)
+            if deleted:
+                self._log("delete_component", component_id)
+        return deleted
+
+    def add_cost(self, component_id, value, timestamp):
+        with self._lock:
+            super().add_cost(component_id, value, timestamp)
+            self._log("add_cost", component_id, value, timestamp)
+
+    def add_inventory(self, items):
+        with self._lock:
+            super().add_inventory(items)
+            self._log("add_inventory", [self._inventory_row(item) for item in items])
+        return items
+
+    def update_inventory(self, item, changes):
+        with self._lock:
+            super().update_inventory(item, changes)
+            self._log("update_inventory", item.id, dict(changes))
+        return item
+
+    def delete_inventory(self, inventory_id):
+        with self._lock:
+            deleted = super().delete_inventory(inventory_id)
+            if deleted:
+                self._log("delete_inventory", inventory_id)
+        return deleted
+
+    def save_hardware_revision(self, hw):
+        with self._lock:
+            super().save_hardware_revision(hw)
+            self._log("save_hardware_revision", hw.model_dump())
+        return hw
+
+    def delete_hardware_revision(self, hwrev_id):
+        with self._lock:
+            deleted = super().delete_hardware_revision(hwrev_id)
+            if deleted:
+                self._log("delete_hardware_revision", hwrev_id)
+        return deleted
+
+    # Snapshots
+    def snapshot(self):
+        # Under the write lock, only takes references to the stored records and
+        # rotates the log: records and models are replaced on change, never
+        # changed in place, so the references stay a consistent image while
+        # they are dumped and written without blocking writers. Cost series
+        # take points out of order, so their arrays are copied.
+        with self._snapshot_lock, _gc_paused():
+            with self._lock:
+                lsn = self.lsn
+                components = self.list_components()
+                costs = {cid: (series.timestamps[:], series.values[:]) for cid, series in self._cost_series()}
+                inventory = self.inventory.values()
+                hardware_revisions = self.list_hardware_revisions()
+                self._wal.close()
+                self._wal = self._open_segment(lsn + 1)
+            image = {
+                "lsn": lsn,
+                "components": [c.model_dump() for c in components],
+                "costs": costs,
+                "inventory": [self._inventory_row(item) for item in inventory],
+                "hardware_revisions": [hw.model_dump() for hw in hardware_revisions],
+            }
+            path = self._snapshot_path(lsn)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(image, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            # Everything up to lsn is in the snapshot, so older files can go
+            for old in glob.glob(os.path.join(self.directory, "snapshot-*.bin")):
+                if old != path:
+                    os.remove(old)
+            current = self._segment_path(lsn + 1)
+            for old in glob.glob(os.path.join(self.directory, "wal-*.log")):
+                if old < current:
+                    os.remove(old)
+            return path
+
+    def start_snapshotter(self, interval=300):
+        # Periodically snapshots in a daemon thread
+        def run():
+            while not self._stop.wait(interval):
+                self.snapshot()
+        self._snapshotter = threading.Thread(target=run, name="aim-snapshotter", daemon=True)
+        self._snapshotter.start()
+
+    def sync(self):
+        with self._lock:
+            for wal in (self._wal, self._events):
+                if not wal.closed:
+                    wal.sync()
+
+    def close(self):
+        # Stops the background threads and syncs and closes the log; safe to
+        # call more than once, and a later write reopens the log
+        self._stop.set()
+        for thread in (self._snapshotter, self._flusher):
+            if thread is not None:
+                thread.join()
+        self._snapshotter = self._flusher = None
+        with self._lock:
+            self._wal.close()
+            self._events.close()
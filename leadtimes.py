@@ -0,0 +1,164 @@
+import math
+import threading
+from models import InventoryState
+
+_DAY = 86400.0
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RunningStats:
+    """Count, mean and variance by Welford's method; mergeable."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        # Chan et al.'s pairwise update
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+
+class QuantileSketch:
+    """Log-bucketed histogram answering quantiles within a relative error.
+
+    A positive value v goes to bucket ceil(log(v) / log(gamma)), with
+    gamma = (1 + accuracy) / (1 - accuracy); every value in a bucket is within
+    `accuracy` of the bucket's midpoint, so quantiles are too. Adding is O(1),
+    memory grows with the log of the value range, and sketches of the same
+    accuracy merge by adding bucket counts.
+    """
+
+    __slots__ = ("gamma", "buckets", "zeros", "count")
+
+    def __init__(self, accuracy=0.01):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value, self.gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+
+    def quantile(self, q):
+        # Nearest rank: the smallest value with at least q of the count at or below it
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = self.zeros
+        if rank <= seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank <= seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class LeadTimeStats:
+    """Ordered-to-received durations per component, from inventory state changes.
+
+    The time a lot entered `ordered` is remembered, with its units on order,
+    until it moves on or all its units are removed; a lot split off an
+    ordered lot keeps the original order time. Each receipt adds
+    one duration, in days, to the component's RunningStats and QuantileSketch,
+    so reports cost O(components) however many transitions there were. All of
+    it is rebuilt from the stored events when a store is loaded, so an order
+    placed before a restart is timed when it arrives after it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._ordered_at = {}
+        self._stats = {}
+
+    # Transition-log listener
+    def on_event(self, item_id, component_id, from_state, to_state, quantity, timestamp):
+        with self._lock:
+            if to_state == InventoryState.ORDERED:
+                entry = self._ordered_at.setdefault(item_id, [timestamp, 0])
+                entry[1] += quantity
+            elif from_state == InventoryState.ORDERED:
+                entry = self._ordered_at.get(item_id)
+                if entry is None:
+                    return
+                if to_state == InventoryState.RECEIVED:
+                    stats = self._stats.get(component_id)
+                    if stats is None:
+                        stats = self._stats[component_id] = (RunningStats(), QuantileSketch())
+                    days = (timestamp - entry[0]) / _DAY
+                    stats[0].add(days)
+                    stats[1].add(days)
+                # A lot that moves on, is deleted or merged away leaves no
+                # units on order; one that is only reduced keeps its time
+                entry[1] -= quantity
+                if entry[1] <= 0 or to_state is not None:
+                    del self._ordered_at[item_id]
+
+    def on_split(self, parent_id, child_id, quantity):
+        with self._lock:
+            entry = self._ordered_at.get(parent_id)
+            if entry is not None:
+                self._ordered_at[child_id] = [entry[0], quantity]
+                entry[1] -= quantity
+
+    def ordered_at(self, item_id):
+        entry = self._ordered_at.get(item_id)
+        return entry[0] if entry is not None else None
+
+    def component_ids(self):
+        with self._lock:
+            return list(self._stats)
+
+    def merged(self, component_ids):
+        # (RunningStats, QuantileSketch) over the given components' receipts
+        running, sketch = RunningStats(), QuantileSketch()
+        with self._lock:
+            for component_id in component_ids:
+                stats = self._stats.get(component_id)
+                if stats is not None:
+                    running.merge(stats[0])
+                    sketch.merge(stats[1])
+        return running, sketch
+
+
+def summarize(running, sketch):
+    # Report fields for one distribution; None without receipts
+    if not running.count:
+        return None
+    summary = {"count": running.count, "mean_days": running.mean, "stddev_days": running.stddev}
+    for q in QUANTILES:
+        summary[f"p{round(q * 100)}_days"] = sketch.quantile(q)
+    return summary
@@ -1,14 +1,26 @@
 import sys
 import time
+from datetime import datetime
 from models import Component, Inventory, HardwareRevision
 from operations import (
-    create_component, get_component, update_component, delete_component,
+    create_component, get_component, delete_component,
     create_inventory, get_inventory, update_inventory, delete_inventory,
     create_hardware_revision, get_hardware_revision, update_hardware_revision, delete_hardware_revision,
     update_component_cost, get_component_cost_history,
-    list_inventory, verify_hardware_revision_inventory,
-    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report
+    list_inventory, iter_inventory, verify_hardware_revision_inventory,
+    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report,
+    get_inventory_history, get_where_used, patch_component, close_repository
 )
+from reports import valuation_report
+from reservations import reserve_component, release_reservation, InsufficientStockError
+
+def ask_number(prompt, convert=int):
+    # Asks again until the answer parses as a number
+    while True:
+        try:
+            return convert(input(prompt))
+        except ValueError:
+            print("Please enter a number.")
 
 def main_menu():
     while True:
@@ -33,6 +45,11 @@ def main_menu():
         print("18. Failure Rate Analysis")
         print("19. Validate Inventory Allocation")
         print("20. Cost History Report")
+        print("21. Reserve Inventory")
+        print("22. Release Reservation")
+        print("23. Inventory State History")
+        print("24. Inventory Valuation Report")
+        print("25. Where Used")
         print("0. Exit")
         choice = input("Select an option: ")
         if choice == "1":
@@ -49,16 +66,30 @@ def main_menu():
             cid = input("Component ID: ")
             field = input("Field to update: ")
             value = input("New value: ")
-            updated = update_component(cid, {field: value})
-            print(updated or "Not found.")
+            # Typed input is converted and checked by the field's validators
+            try:
+                result = patch_component(cid, {field: value}, actor="cli")
+            except ValueError as e:
+                print(e)
+                continue
+            if result is None:
+                print("Not found.")
+            else:
+                print(result["component"] if result["changes"] else "No change.")
         elif choice == "4":
             cid = input("Component ID: ")
-            deleted = delete_component(cid)
+            try:
+                deleted = delete_component(cid)
+            except ValueError as e:
+                print(f"{e}")
+                if input("Delete it with its inventory and BOM lines? (y/n): ").strip().lower() != "y":
+                    continue
+                deleted = delete_component(cid, cascade=True)
             print("Deleted." if deleted else "Not found.")
         elif choice == "5":
             compid = input("Component ID: ")
             state = input("State: ")
-            qty = int(input("Quantity: "))
+            qty = ask_number("Quantity: ")
             inv = Inventory(component_id=compid, state=state, quantity=qty)
             items = create_inventory(inv)
             print(f"Created: {items}")
@@ -69,8 +100,12 @@ def main_menu():
         elif choice == "7":
             iid = input("Inventory ID: ")
             state = input("New state: ")
-            updated = update_inventory(iid, {"state": state})
-            print(updated or "Not found.")
+            qty = input("Quantity to move (leave blank for the whole lot): ")
+            try:
+                updated = update_inventory(iid, {"state": state}, quantity=int(qty) if qty else None, actor="cli")
+                print(updated or "Not found.")
+            except ValueError as e:
+                print(e)
         elif choice == "8":
             iid = input("Inventory ID: ")
             deleted = delete_inventory(iid)
@@ -88,15 +123,18 @@ def main_menu():
             hwid = input("Hardware Revision ID: ")
             field = input("Field to update: ")
             value = input("New value: ")
-            updated = update_hardware_revision(hwid, {field: value})
-            print(updated or "Not found.")
+            try:
+                updated = update_hardware_revision(hwid, {field: value})
+                print(updated or "Not found.")
+            except ValueError as e:
+                print(e)
         elif choice == "12":
             hwid = input("Hardware Revision ID: ")
             deleted = delete_hardware_revision(hwid)
             print("Deleted." if deleted else "Not found.")
         elif choice == "13":
             cid = input("Component ID: ")
-            new_cost = float(input("New cost: "))
+            new_cost = ask_number("New cost: ", float)
             updated = update_component_cost(cid, new_cost)
             print(updated or "Not found.")
         elif choice == "14":
@@ -110,11 +148,11 @@ def main_menu():
         elif choice == "15":
             state = input("Filter by state (or leave blank): ")
             component_id = input("Filter by component_id (or leave blank): ")
-            items = list_inventory(state=state or None, component_id=component_id or None)
-            if items:
-                for item in items:
-                    print(item)
-            else:
+            found = False
+            for _, item in iter_inventory(state=state or None, component_id=component_id or None):
+                print(item)
+                found = True
+            if not found:
                 print("No inventory found.")
         elif choice == "16":
             hwid = input("Hardware Revision ID: ")
@@ -132,8 +170,13 @@ def main_menu():
             for entry in report:
                 print(entry)
         elif choice == "18":
-            threshold = float(input("Failure rate threshold (e.g. 0.05): "))
-            report = get_failure_rate_report(threshold)
+            threshold = ask_number("Failure rate threshold (e.g. 0.05): ", float)
+            group_by = input("Observed rates by component/vendor/manufacturer (leave blank for recorded rates): ")
+            try:
+                report = get_failure_rate_report(threshold, group_by=group_by or None)
+            except ValueError as e:
+                print(e)
+                continue
             if report:
                 for entry in report:
                     print(entry)
@@ -141,7 +184,7 @@ def main_menu():
                 print("No components above threshold.")
         elif choice == "19":
             cid = input("Component ID: ")
-            qty = int(input("Requested quantity: "))
+            qty = ask_number("Requested quantity: ")
             valid, available = validate_inventory_allocation(cid, qty)
             if valid:
                 print(f"Enough inventory available: {available}")
@@ -155,6 +198,49 @@ def main_menu():
                     print(entry)
             else:
                 print("No cost history found.")
+        elif choice == "21":
+            cid = input("Component ID: ")
+            qty = ask_number("Quantity to reserve: ")
+            try:
+                reservation = reserve_component(cid, qty)
+                print(f"Reserved: {reservation}")
+            except InsufficientStockError as e:
+                print(f"Not enough free inventory: {e.missing}")
+        elif choice == "22":
+            rid = input("Reservation ID: ")
+            released = release_reservation(rid)
+            print("Released." if released else "Not found.")
+        elif choice == "23":
+            iid = input("Inventory ID: ")
+            history = get_inventory_history(iid)
+            for event in history:
+                print(f"  {event['timestamp']}: {event['from_state']} -> {event['to_state']} "
+                      f"({event['quantity']} units, by {event['actor'] or 'unknown'})")
+            if not history:
+                print("No history found.")
+        elif choice == "24":
+            group_by = input("Group by (state/vendor/manufacturer/component) [state]: ") or "state"
+            as_of = input("As of (YYYY-MM-DD HH:MM, leave blank for now): ")
+            try:
+                report = valuation_report(as_of=datetime.fromisoformat(as_of) if as_of else None, group_by=group_by)
+            except ValueError as e:
+                print(e)
+                continue
+            for group in report["groups"]:
+                print(f"  {group[group_by]}: {group['quantity']} units, {group['value']:.2f}")
+            print(f"Total: {report['total_quantity']} units, {report['total_value']:.2f}")
+            for line in report["unpriced"]:
+                print(f"  No cost for {line['component_id']} ({line['quantity']} units)")
+        elif choice == "25":
+            cid = input("Component ID: ")
+            used = get_where_used(cid)
+            for rev in used["revisions"]:
+                kind = "directly" if rev["direct"] else "via sub-assembly"
+                print(f"  {rev['name']} ({rev['hwrev_id']}): {rev['quantity']} per build, {kind}")
+            for state, qty in used["stock"].items():
+                print(f"  {qty} units {state}")
+            if not used["revisions"] and not used["stock"]:
+                print("Not used anywhere.")
         elif choice == "0":
             print("Goodbye!")
             sys.exit(0)
@@ -235,9 +321,66 @@ def demo_cli():
     print(f"Valid: {valid}, Available: {available}")
     print("--- End of CLI Automated Demo ---\n")
 
+def bulk_cli(argv):
+    # python main.py import|export FILE [--kind components|inventory] ...
+    # python main.py snapshot DIR [--format npy|arrow|parquet]
+    import argparse
+    from bulkio import import_file, export_file, KINDS, DEFAULT_CHUNK_SIZE
+    from columnar import export_snapshot, FORMATS, TABLES
+    parser = argparse.ArgumentParser(prog="main.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+    imp = commands.add_parser("import", help="Load components or inventory from a CSV or JSONL file")
+    imp.add_argument("path")
+    imp.add_argument("--kind", choices=KINDS, help="Defaults to the file name prefix")
+    imp.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    imp.add_argument("--rejects", help="Where to write rejected rows (default: PATH.rejects.jsonl)")
+    exp = commands.add_parser("export", help="Write components or inventory to a CSV or JSONL file")
+    exp.add_argument("path")
+    exp.add_argument("--kind", choices=KINDS, help="Defaults to the file name prefix")
+    exp.add_argument("--state")
+    exp.add_argument("--component-id")
+    snap = commands.add_parser("snapshot", help="Write the stores as columnar files for analysis")
+    snap.add_argument("directory")
+    snap.add_argument("--format", choices=FORMATS, help="Defaults to arrow if pyarrow is installed, else npy")
+    snap.add_argument("--tables", nargs="+", choices=TABLES, default=TABLES)
+    args = parser.parse_args(argv)
+
+    def progress(stats):
+        if not sys.stderr.isatty():
+            return
+        print(f"\r{stats['rows']} rows, {stats['rejected']} rejected, {stats['rows_per_second']:.0f} rows/s",
+              end="", file=sys.stderr, flush=True)
+
+    try:
+        if args.command == "import":
+            stats = import_file(args.path, kind=args.kind, chunk_size=args.chunk_size,
+                                rejects_path=args.rejects, progress=progress)
+            if sys.stderr.isatty():
+                print(file=sys.stderr)
+            print(f"Imported {stats['imported']} of {stats['rows']} {stats['kind']} rows in {stats['seconds']:.2f}s "
+                  f"({stats['rows_per_second']:.0f} rows/s)")
+            if stats["rejected"]:
+                print(f"{stats['rejected']} rows rejected, see {stats['rejects_path']}")
+        elif args.command == "snapshot":
+            manifest = export_snapshot(args.directory, fmt=args.format, tables=args.tables)
+            rows = ", ".join(f"{table} {info['rows']}" for table, info in manifest["tables"].items())
+            print(f"Wrote {manifest['format']} snapshot to {args.directory} ({rows}) in {manifest['seconds']:.2f}s")
+        else:
+            stats = export_file(args.path, kind=args.kind, state=args.state, component_id=args.component_id)
+            print(f"Exported {stats['rows']} {stats['kind']} rows in {stats['seconds']:.2f}s "
+                  f"({stats['rows_per_second']:.0f} rows/s)")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        close_repository()
+    return 1 if args.command == "import" and stats["rejected"] else 0
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "--demo":
         demo_cli()
+    elif len(sys.argv) > 1 and sys.argv[1] in ("import", "export", "snapshot"):
+        sys.exit(bulk_cli(sys.argv[1:]))
     else:
         main_menu()
@@ -1,6 +1,19 @@
+import re
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model, field_validator, model_validator
+from pydantic_core import SchemaValidator
+
+_LEAD_TIME = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$", re.IGNORECASE)
+_LEAD_TIME_UNITS = {"": 1, "d": 1, "day": 1, "days": 1, "w": 7, "wk": 7, "week": 7, "weeks": 7,
+                    "m": 30, "mo": 30, "month": 30, "months": 30}
+
+def parse_lead_time(text):
+    # "5d", "2w", "3 days" -> days; None for missing or free-form text
+    match = _LEAD_TIME.match(text or "")
+    if not match or match.group(2).lower() not in _LEAD_TIME_UNITS:
+        return None
+    return float(match.group(1)) * _LEAD_TIME_UNITS[match.group(2).lower()]
 
 # Models
 def get_models():
@@ -14,6 +27,8 @@ def get_models():
         vendor_name: str
         manufacturer_name: str
         estimated_lead_time: Optional[str] = None
+        # Derived from estimated_lead_time whenever the record is written
+        estimated_lead_time_days: Optional[float] = None
         actual_lead_time: Optional[int] = 0
         order_link: Optional[str] = None
         failure_rate: Optional[float] = 0.0
@@ -55,6 +70,11 @@ def get_models():
                 raise ValueError('cost must be non-negative')
             return v
 
+        @model_validator(mode='after')
+        def parse_estimated_lead_time(self):
+            self.estimated_lead_time_days = parse_lead_time(self.estimated_lead_time)
+            return self
+
     class InventoryState(str):
         ORDERED = "ordered"
         RECEIVED = "received"
@@ -64,6 +84,17 @@ def get_models():
         IN_PRODUCTION = "in-production"
         FAILED = "failed"
 
+        # Legal state changes; any unit can fail once it has been received
+        TRANSITIONS = {
+            ORDERED: {RECEIVED},
+            RECEIVED: {SETUP, ON_HAND_READY, FAILED},
+            SETUP: {ON_HAND_READY, FAILED},
+            ON_HAND_READY: {ALLOCATED, FAILED},
+            ALLOCATED: {ON_HAND_READY, IN_PRODUCTION, FAILED},
+            IN_PRODUCTION: {FAILED},
+            FAILED: set(),
+        }
+
     class Inventory(BaseModel):
         id: Optional[str] = None
         component_id: str
@@ -113,6 +144,90 @@ def get_models():
                 raise ValueError('name cannot be empty')
             return v
 
-    return Cost, Component, InventoryState, Inventory, HardwareRevision
+        @field_validator('components')
+        def valid_lines(cls, v):
+            # Each line needs a component_id or, for a sub-assembly, an hwrev_id
+            for line in v:
+                if bool(line.get('component_id')) == bool(line.get('hwrev_id')):
+                    raise ValueError('each BOM line needs exactly one of component_id or hwrev_id')
+                quantity = line.get('quantity', 1)
+                if isinstance(quantity, str) and quantity.strip().isdigit():
+                    quantity = line['quantity'] = int(quantity)
+                if isinstance(quantity, bool) or not isinstance(quantity, int):
+                    raise ValueError('BOM line quantity must be a whole number')
+                if quantity < 1:
+                    raise ValueError('BOM line quantity must be at least 1')
+            return v
+
+    class InventoryTransition(BaseModel):
+        inventory_id: str
+        state: str
+        # Units to move; None moves the whole lot
+        quantity: Optional[int] = None
+
+        @field_validator('state')
+        def valid_state(cls, v):
+            return Inventory.valid_state(v)
+
+        @field_validator('quantity')
+        def quantity_positive(cls, v):
+            if v is not None and v < 1:
+                raise ValueError('Quantity must be at least 1')
+            return v
 
-Cost, Component, InventoryState, Inventory, HardwareRevision = get_models()
+    class Reservation(BaseModel):
+        id: Optional[str] = None
+        hwrev_id: Optional[str] = None
+        # Each line is a dict with 'inventory_id', 'component_id' and 'quantity'
+        lines: List[Dict[str, Any]] = Field(default_factory=list)
+        created_at: datetime
+        expires_at: Optional[datetime] = None
+
+    return Cost, Component, InventoryState, Inventory, HardwareRevision, InventoryTransition, Reservation
+
+Cost, Component, InventoryState, Inventory, HardwareRevision, InventoryTransition, Reservation = get_models()
+
+# Partial updates. A patch holds only the fields it changes, and each is run
+# through that field's own validators, taken from the model's compiled schema,
+# rather than revalidating the whole record. Ids, derived fields and histories
+# kept elsewhere cannot be patched.
+PATCH_EXCLUDE = {
+    Component: ("id", "estimated_lead_time_days", "costs"),
+    Inventory: ("id", "state_history"),
+    HardwareRevision: ("id",),
+}
+
+def _patch_validator(model, exclude):
+    schema, definitions = model.__pydantic_core_schema__, None
+    while schema["type"] != "model-fields":
+        if schema["type"] == "definitions":
+            definitions = schema["definitions"]
+        schema = schema["schema"]
+    fields = {}
+    for name, field in schema["fields"].items():
+        if name not in exclude:
+            # Defaults only apply to creation; a missing field is left alone
+            inner = field["schema"]["schema"] if field["schema"]["type"] == "default" else field["schema"]
+            fields[name] = {"type": "typed-dict-field", "schema": inner, "required": False}
+    patch = {"type": "typed-dict", "fields": fields, "extra_behavior": "forbid"}
+    if definitions:
+        patch = {"type": "definitions", "schema": patch, "definitions": definitions}
+    return SchemaValidator(patch)
+
+def _patch_model(model, exclude):
+    # Request body for PATCH endpoints: every patchable field, all optional
+    fields = {name: (Optional[f.annotation], None) for name, f in model.model_fields.items() if name not in exclude}
+    return create_model(f"{model.__name__}Patch", __config__=ConfigDict(extra="forbid"), **fields)
+
+_patch_validators = {model: _patch_validator(model, exclude) for model, exclude in PATCH_EXCLUDE.items()}
+ComponentPatch, InventoryPatch, HardwareRevisionPatch = (
+    _patch_model(model, exclude) for model, exclude in PATCH_EXCLUDE.items()
+)
+
+def validate_patch(model, changes):
+    # Returns the changes validated and coerced field by field; raises
+    # ValueError naming every bad or unknown field
+    try:
+        return _patch_validators[model].validate_python(changes)
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())) from None
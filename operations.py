@@ -1,159 +1,966 @@
-from typing import List, Dict
-from models import Component, Inventory, HardwareRevision, Cost
+from models import (
+    Component, Inventory, HardwareRevision, Cost, InventoryState, InventoryTransition, parse_lead_time, validate_patch
+)
+from collections import OrderedDict
+from contextlib import ExitStack
 from datetime import datetime
+from pydantic import ValidationError
+import atexit
+import hashlib
+import itertools
+import json
+from repository import MemoryRepository, SqliteRepository, LEAD_TIME_KINDS
+from journal import JournaledRepository
+from events import TransitionLog, ChangeLog
+from bom import BomIndex, lead_time_days
+from failures import FailureStats, WINDOWS, wilson_interval
+from leadtimes import LeadTimeStats, summarize
+from timeseries import downsample
+import os
+import threading
+import time
+import uuid
+
+# States that count towards available stock
+AVAILABLE_STATES = ("on-hand-ready", "allocated", "in-production")
+
+# Storage backend; set AIM_DATABASE to a file path to share state through SQLite,
+# or AIM_DATA_DIR to keep the in-memory store durable with a write-ahead log
+def _default_repository():
+    path = os.environ.get("AIM_DATABASE")
+    if path:
+        return SqliteRepository(path)
+    data_dir = os.environ.get("AIM_DATA_DIR")
+    if data_dir:
+        repo = JournaledRepository(data_dir, fsync=os.environ.get("AIM_FSYNC", "batch"))
+        repo.start_snapshotter(int(os.environ.get("AIM_SNAPSHOT_INTERVAL", "300")))
+        # Records still buffered by the "batch" fsync policy are written at exit
+        atexit.register(repo.close)
+        return repo
+    return MemoryRepository()
+
+repository = _default_repository()
+
+# Every inventory state change, including creation, is recorded here and
+# stored by the repository; loading a store rebuilds the log from it
+transition_log = TransitionLog()
+
+# Field-level diffs of every update to a component, lot or hardware revision
+change_log = ChangeLog()
+
+# Observed failure counts and ordered-to-received durations, kept current
+# from the transition log
+failure_stats = FailureStats()
+lead_time_stats = LeadTimeStats()
+transition_log.listeners.extend([failure_stats, lead_time_stats])
+
+# Sub-assembly structure and memoized rollups of the hardware revisions
+bom_index = BomIndex()
+
+def _load_transition_log():
+    # Replays the stored events into the log and its listeners. A store whose
+    # lots predate stored events is seeded once with a creation event per lot;
+    # stock before that is unknown, and is refused.
+    transition_log.attach(repository.append_transitions, shared=repository.store_versions() is not None)
+    transition_log.ingest(repository.transitions())
+    with repository.transaction():
+        # Checked again inside the transaction, so one worker seeds a shared store
+        if next(repository.transitions(), None) is None:
+            transition_log.seed(repository.inventory_rows())
+    sync_transition_log()
+
+def sync_transition_log():
+    # A log shared with other processes is caught up with the events they
+    # stored before it is read; not inside a transaction, whose events could
+    # still be rolled back
+    if transition_log.shared and not repository.in_transaction():
+        transition_log.ingest(repository.transitions(after=transition_log.seq))
+    return transition_log
+
+_load_transition_log()
+
+def get_repository():
+    return repository
 
-# In-memory stores for demonstration
-components_store = {}
-inventory_store = {}
-hardware_revision_store = {}
+def close_repository():
+    # Syncs and closes the storage backend, e.g. when a server shuts down
+    repository.close()
+
+def set_repository(repo):
+    global repository
+    repository = repo
+    # Events describe the previous repository's records
+    transition_log.clear()
+    change_log.clear()
+    failure_stats.clear()
+    lead_time_stats.clear()
+    bom_index.clear()
+    _bom_versions[:] = None, None
+    _load_transition_log()
+    clear_report_cache()
+    _changed(*_store_versions)
+    return repo
+
+# Version of each store, bumped by the CRUD functions after every change, so
+# data derived from a store (cached reports, the BOM matrix in reports.py)
+# knows when to rebuild. Versions come from one increasing counter and thus
+# never repeat, even across set_repository. They only see changes made
+# through this process; a backend shared between processes reports its own
+# through Repository.store_versions().
+_generation = itertools.count(1)
+_store_versions = {"components": 0, "inventory": 0, "hardware_revisions": 0}
+# Tells this process's versions apart from those of other runs in ETags
+_version_epoch = uuid.uuid4().hex[:8]
+
+def store_version(store):
+    # Changes whenever the store does; for a shared backend, also when another
+    # process changed it
+    return _versions_of((store,))
+
+def _changed(*stores):
+    for store in stores:
+        _store_versions[store] = next(_generation)
+
+def _versions_of(stores):
+    shared = repository.store_versions()
+    if shared is not None:
+        return ("db",) + tuple(shared[store] for store in stores)
+    return (_version_epoch,) + tuple(_store_versions[store] for store in stores)
 
 # Helper for generating unique IDs
-import uuid
 
 def _generate_id(prefix):
-    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+# Per-component locks serialize inventory changes for one component, so
+# concurrent requests on unrelated components do not contend
+_component_locks = {}
+_component_locks_guard = threading.Lock()
+
+def component_lock(component_id):
+    with _component_locks_guard:
+        lock = _component_locks.get(component_id)
+        if lock is None:
+            lock = _component_locks[component_id] = threading.RLock()
+        return lock
 
 # CRUD for Component
 def create_component(component):
     if not component.id:
         component.id = _generate_id("COMP")
-    components_store[component.id] = component
+    # Cost history lives in the repository's cost series, not on the record
+    costs, component.costs = component.costs or [], []
+    with repository.transaction():
+        repository.save_component(component)
+        for cost in costs:
+            repository.add_cost(component.id, cost.value, cost.date.timestamp())
+    _changed("components")
+    # A revision may list the part before it exists; its rollup is now stale
+    bom_index.component_changed(component.id)
     return component
 
 def get_component(component_id):
-    return components_store.get(component_id)
+    return repository.get_component(component_id)
+
+# Partial updates. patch_* validate only the fields they are given (see
+# validate_patch), work out which of them actually change, and write nothing,
+# bump no store version and log nothing when none do. They return the record
+# and {field: {"old", "new"}}, which also goes to change_log. update_* are the
+# older entry points; they return just the record and ignore an "id" key.
+def _diff(record, changes):
+    return {
+        field: {"old": getattr(record, field), "new": value}
+        for field, value in changes.items() if getattr(record, field) != value
+    }
+
+def _without_id(updates):
+    return {k: v for k, v in updates.items() if k != "id"}
+
+def patch_component(component_id, changes, actor=None):
+    changes = validate_patch(Component, changes)
+    with repository.transaction():
+        comp = repository.get_component(component_id)
+        if not comp:
+            return None
+        diff = _diff(comp, changes)
+        if not diff:
+            return {"component": comp, "changes": {}}
+        # Stored components are replaced rather than changed, so readers
+        # holding the previous version see it whole
+        comp = comp.model_copy(update={field: changes[field] for field in diff})
+        comp.estimated_lead_time_days = parse_lead_time(comp.estimated_lead_time)
+        repository.save_component(comp)
+    _changed("components")
+    if diff.keys() & {"cost", "estimated_lead_time", "actual_lead_time"}:
+        bom_index.component_changed(component_id)
+    change_log.record("component", component_id, diff, actor)
+    return {"component": comp, "changes": diff}
 
 def update_component(component_id, updates):
-    comp = components_store.get(component_id)
-    if not comp:
-        return None
-    for k, v in updates.items():
-        if hasattr(comp, k):
-            setattr(comp, k, v)
-    components_store[component_id] = comp
-    return comp
+    result = patch_component(component_id, _without_id(updates))
+    return result and result["component"]
 
-def delete_component(component_id):
-    return components_store.pop(component_id, None) is not None
+def delete_component(component_id, cascade=False):
+    # A component still used by hardware revisions or inventory is only
+    # deleted with cascade=True, which also deletes its inventory records and
+    # removes it from the BOMs that list it directly
+    if not repository.get_component(component_id):
+        return False
+    revisions = sorted(_bom().users(component_id))
+    stock = repository.stock_by_state(component_id)
+    if (revisions or stock) and not cascade:
+        uses = [f"hardware revisions {revisions}"] if revisions else []
+        if stock:
+            uses.append(f"{sum(stock.values())} units of inventory")
+        raise ValueError(f"Component {component_id} is used by {' and '.join(uses)}")
+    for item in repository.find_inventory(component_id=component_id) if stock else ():
+        delete_inventory(item.id)
+    for hwrev_id in revisions:
+        hw = repository.get_hardware_revision(hwrev_id)
+        update_hardware_revision(hwrev_id, {
+            "components": [line for line in hw.components if line.get("component_id") != component_id]
+        })
+    deleted = repository.delete_component(component_id)
+    if deleted:
+        _changed("components")
+        bom_index.component_changed(component_id)
+    return deleted
 
 def update_component_cost(component_id, new_cost):
-    comp = components_store.get(component_id)
-    if not comp:
-        return None
-    # Add to cost history
-    if hasattr(comp, 'costs') and comp.costs is not None:
-        comp.costs.append(Cost(value=new_cost, date=datetime.now()))
-    else:
-        comp.costs = [Cost(value=new_cost, date=datetime.now())]
-    comp.cost = new_cost
-    components_store[component_id] = comp
+    with component_lock(component_id), repository.transaction():
+        comp = repository.get_component(component_id)
+        if not comp:
+            return None
+        repository.add_cost(component_id, new_cost, datetime.now().timestamp())
+        comp = comp.model_copy(update={"cost": new_cost})
+        repository.save_component(comp)
+    _changed("components")
+    bom_index.component_changed(component_id)
     return comp
 
-def get_component_cost_history(component_id):
-    comp = components_store.get(component_id)
-    if not comp or not hasattr(comp, 'costs'):
-        return []
-    return comp.costs
+def reprice_component(component_id, new_cost):
+    # update_component_cost that also reports how the rolled-up cost of every
+    # revision using the component (directly or as a sub-assembly) changed
+    bom = _bom()
+    affected = sorted(bom.ancestors(bom.users(component_id)))
+    before = {hwrev_id: bom.rollup(hwrev_id, repository.get_component)["cost"] for hwrev_id in affected}
+    comp = update_component_cost(component_id, new_cost)
+    if comp is None:
+        return None
+    return {
+        "component": comp,
+        "revisions": [
+            {"hwrev_id": hwrev_id, "old_cost": before[hwrev_id],
+             "new_cost": bom.rollup(hwrev_id, repository.get_component)["cost"]}
+            for hwrev_id in affected
+        ],
+    }
+
+def get_where_used(component_id):
+    # Revisions that need the component, directly or through sub-assemblies,
+    # and the inventory holding it; found through the reverse indexes, so the
+    # cost depends on the number of users rather than on all revisions
+    bom = _bom()
+    direct = bom.users(component_id)
+    revisions = []
+    for hwrev_id in sorted(bom.ancestors(direct)):
+        hw = repository.get_hardware_revision(hwrev_id)
+        revisions.append({
+            "hwrev_id": hwrev_id,
+            "name": hw.name if hw else None,
+            "direct": hwrev_id in direct,
+            "quantity": get_leaf_requirements(hwrev_id).get(component_id, 0),
+        })
+    return {
+        "component_id": component_id,
+        "revisions": revisions,
+        "inventory": [
+            {"inventory_id": item.id, "state": item.state, "quantity": item.quantity}
+            for item in repository.find_inventory(component_id=component_id)
+        ],
+        "stock": repository.stock_by_state(component_id),
+    }
+
+def _cost_range(component_id, since=None, until=None, last=None):
+    return repository.cost_series(
+        component_id,
+        since=since.timestamp() if since is not None else None,
+        until=until.timestamp() if until is not None else None,
+        last=last,
+    )
+
+def get_component_cost_history(component_id, since=None, until=None, last=None):
+    # Cost changes within [since, until], oldest first; `last` keeps only the
+    # most recent ones
+    timestamps, values = _cost_range(component_id, since, until, last)
+    return [Cost(value=value, date=datetime.fromtimestamp(ts)) for ts, value in zip(timestamps, values)]
 
 # CRUD for Inventory
-def create_inventory(inventory):
-    items = []
-    for _ in range(inventory.quantity):
-        inv = inventory.copy()
-        inv.id = _generate_id("INV")
-        inventory_store[inv.id] = inv
-        items.append(inv)
-    return items
+# A received quantity is stored as a single lot (one Inventory record with a
+# quantity), and is only split when some of its units change independently.
+def create_inventory(inventory, actor=None):
+    if inventory.serial_number and inventory.quantity > 1:
+        raise ValueError("serial_number can only be set on a single unit")
+    if not inventory.id:
+        inventory.id = _generate_id("INV")
+    with component_lock(inventory.component_id):
+        repository.add_inventory([inventory])
+    _changed("inventory")
+    transition_log.record(inventory.id, inventory.component_id, None, inventory.state, inventory.quantity, actor)
+    return [inventory]
 
 def get_inventory(inventory_id):
-    return inventory_store.get(inventory_id)
+    return repository.get_inventory(inventory_id)
+
+def get_inventory_by_serial(serial_number):
+    return repository.get_inventory_by_serial(serial_number)
+
+def split_inventory(inventory_id, quantity):
+    # Carves `quantity` units off a lot into a new lot and returns the new lot
+    lot = repository.get_inventory(inventory_id)
+    if not lot:
+        return None
+    with component_lock(lot.component_id), repository.transaction():
+        # Re-read under the lock in case the lot changed while we waited
+        lot = repository.get_inventory(inventory_id)
+        if not lot:
+            return None
+        if quantity < 1 or quantity > lot.quantity:
+            raise ValueError(f"Cannot split {quantity} units from a lot of {lot.quantity}")
+        if quantity == lot.quantity:
+            return lot
+        part = lot.model_copy(deep=True)
+        part.id = _generate_id("INV")
+        part.quantity = quantity
+        repository.update_inventory(lot, {"quantity": lot.quantity - quantity})
+        repository.add_inventory([part])
+        _changed("inventory")
+        transition_log.record_split(lot.id, part.id, quantity)
+        return part
+
+def can_merge(lot, other):
+    # Lots of the same component and state are interchangeable units, unless
+    # either carries a serial number, a kit or sub-items
+    return lot.id != other.id and (lot.component_id, lot.state) == (other.component_id, other.state) and not any(
+        item.serial_number or item.kit_id or item.sub_items for item in (lot, other)
+    )
 
-def update_inventory(inventory_id, updates):
-    inv = inventory_store.get(inventory_id)
+def merge_inventory(source_id, target_id, actor=None):
+    # Folds the source lot into the target and deletes it, the inverse of
+    # split_inventory; returns the target lot
+    source = repository.get_inventory(source_id)
+    if not source:
+        return None
+    with component_lock(source.component_id), repository.transaction():
+        source, target = repository.get_inventory(source_id), repository.get_inventory(target_id)
+        if not source or not target:
+            return None
+        if not can_merge(source, target):
+            raise ValueError(f"Lots {source_id} and {target_id} cannot be merged")
+        before = (target.component_id, target.state, target.quantity)
+        repository.update_inventory(target, {"quantity": target.quantity + source.quantity})
+        repository.delete_inventory(source.id)
+        _changed("inventory")
+        transition_log.record(source.id, source.component_id, source.state, None, source.quantity, actor)
+        transition_log.record_change(target.id, before, (target.component_id, target.state, target.quantity), actor)
+    return target
+
+def check_transition(from_state, to_state):
+    if to_state != from_state and to_state not in InventoryState.TRANSITIONS.get(from_state, ()):
+        raise ValueError(f"Illegal state transition {from_state} -> {to_state}")
+
+def patch_inventory(inventory_id, changes, quantity=None, actor=None):
+    # Applies changes to the whole lot, or to `quantity` units split off it.
+    # Serial numbers are per unit, so setting one on a lot splits off one unit.
+    # State changes must follow InventoryState.TRANSITIONS and are logged.
+    changes = validate_patch(Inventory, changes)
+    inv = repository.get_inventory(inventory_id)
     if not inv:
         return None
-    for k, v in updates.items():
-        if hasattr(inv, k):
-            setattr(inv, k, v)
-    inventory_store[inventory_id] = inv
-    return inv
-
-def delete_inventory(inventory_id):
-    return inventory_store.pop(inventory_id, None) is not None
-
-def list_inventory(state: str = None, component_id: str = None):
-    items = list(inventory_store.values())
-    if state:
-        items = [item for item in items if item.state == state]
-    if component_id:
-        items = [item for item in items if item.component_id == component_id]
-    return items
+    with component_lock(inv.component_id), repository.transaction():
+        inv = repository.get_inventory(inventory_id)
+        if not inv:
+            return None
+        diff = _diff(inv, changes)
+        if not diff:
+            return {"inventory": inv, "changes": {}}
+        serial = changes.get("serial_number")
+        if serial:
+            owner = repository.get_inventory_by_serial(serial)
+            if owner is not None and owner.id != inv.id:
+                raise ValueError(f"serial_number {serial} is already in use")
+            if quantity is None and inv.quantity > 1:
+                quantity = 1
+        if "state" in diff:
+            check_transition(inv.state, changes["state"])
+        if quantity is not None:
+            inv = split_inventory(inventory_id, quantity)
+        before = (inv.component_id, inv.state, inv.quantity)
+        repository.update_inventory(inv, {field: changes[field] for field in diff})
+        _changed("inventory")
+        transition_log.record_change(inv.id, before, (inv.component_id, inv.state, inv.quantity), actor)
+    change_log.record("inventory", inv.id, diff, actor)
+    return {"inventory": inv, "changes": diff}
+
+def update_inventory(inventory_id, updates, quantity=None, actor=None):
+    result = patch_inventory(inventory_id, _without_id(updates), quantity=quantity, actor=actor)
+    return result and result["inventory"]
+
+def iter_inventory_units(state: str = None, component_id: str = None):
+    # Lazily expands lots into per-unit views; unit ids are "<lot id>.<n>"
+    for lot in list_inventory(state=state, component_id=component_id):
+        if lot.quantity == 1:
+            yield lot
+            continue
+        for n in range(lot.quantity):
+            yield lot.model_copy(update={"id": f"{lot.id}.{n}", "quantity": 1})
+
+def delete_inventory(inventory_id, actor=None):
+    inv = repository.get_inventory(inventory_id)
+    if not inv:
+        return False
+    with component_lock(inv.component_id):
+        deleted = repository.delete_inventory(inventory_id)
+    if deleted:
+        _changed("inventory")
+        transition_log.record(inv.id, inv.component_id, inv.state, None, inv.quantity, actor)
+    return deleted
+
+def list_inventory(state: str = None, component_id: str = None, as_of=None):
+    # With as_of (a datetime), returns the stock at that time from the
+    # transition log instead: one id-less Inventory per (component_id, state).
+    # Only that aggregate is cached; a cached listing of lots would hold a
+    # model per lot for as long as it stays in the cache.
+    if as_of is None:
+        return repository.find_inventory(state=state, component_id=component_id)
+    return _cached_report("inventory-as-of", (state, component_id, as_of),
+                          lambda: _stock_as_of(state, component_id, as_of))
+
+def _stock_as_of(state, component_id, as_of):
+    return [
+        Inventory(component_id=cid, state=st, quantity=qty)
+        for (cid, st), qty in sorted(get_stock_as_of(as_of, component_id=component_id).items())
+        if qty > 0 and (state is None or st == state)
+    ]
+
+def get_stock_as_of(as_of, component_id: str = None):
+    # Returns {(component_id, state): quantity} as it stood at `as_of`
+    return sync_transition_log().counts_as_of(as_of, component_id=component_id)
+
+def iter_inventory(state: str = None, component_id: str = None, after: str = None):
+    # Generator variant of list_inventory; yields (cursor, item) pairs where a
+    # cursor can be passed back as `after` to resume the same listing.
+    # The cursor is checked here rather than on first iteration.
+    if after and not after.isdigit():
+        raise ValueError(f"Invalid cursor {after!r}")
+    scan = repository.scan_inventory(state=state, component_id=component_id, after=int(after) if after else None)
+    return ((str(seq), item) for seq, item in scan)
+
+def page_inventory(state: str = None, component_id: str = None, limit: int = 100, after: str = None):
+    # Returns (items, next_cursor); next_cursor is None on the last page
+    items, last = [], None
+    for cursor, item in iter_inventory(state=state, component_id=component_id, after=after):
+        if len(items) == limit:
+            return items, last
+        items.append(item)
+        last = cursor
+    return items, None
+
+def get_stock_levels(component_id):
+    # Returns {state: quantity} for one component
+    return repository.stock_by_state(component_id)
+
+def _available_quantity(component_id):
+    return repository.stock([component_id], AVAILABLE_STATES)[component_id]
+
+def check_stock_ledger():
+    # Rebuilds the stock counters from the store and reports any drift
+    return [
+        {"component_id": cid, "state": state, "ledger": ledger_qty, "actual": actual_qty}
+        for (cid, state), (ledger_qty, actual_qty) in repository.check_stock().items()
+    ]
 
 # CRUD for HardwareRevision
+# Persisted (hardware_revisions, components) versions the BOM index reflects
+_bom_versions = [None, None]
+
+def _bom():
+    # The index is filled from the repository on first use. Other processes
+    # sharing the backend change it too, so it is reloaded when the persisted
+    # revisions version has moved on, and its rollups, which hold component
+    # costs and lead times, are dropped when the components version has.
+    # Versions are read before the revisions, so a change that lands in
+    # between only causes another reload.
+    shared = repository.store_versions()
+    if shared is None:
+        if not bom_index.loaded:
+            bom_index.load(repository.list_hardware_revisions())
+        return bom_index
+    revisions, components = shared["hardware_revisions"], shared["components"]
+    if not bom_index.loaded or _bom_versions[0] != revisions:
+        bom_index.reload(repository.list_hardware_revisions())
+    elif _bom_versions[1] != components:
+        bom_index.drop_rollups()
+    _bom_versions[:] = revisions, components
+    return bom_index
+
 def create_hardware_revision(hw_rev):
+    # BOM lines may name other revisions (hwrev_id) as sub-assemblies; they
+    # must exist and must not form a cycle
     if not hw_rev.id:
         hw_rev.id = _generate_id("HWREV")
-    hardware_revision_store[hw_rev.id] = hw_rev
+    _bom().check(hw_rev, repository.get_hardware_revision)
+    repository.save_hardware_revision(hw_rev)
+    bom_index.revision_changed(hw_rev)
+    _changed("hardware_revisions")
     return hw_rev
 
 def get_hardware_revision(hwrev_id):
-    return hardware_revision_store.get(hwrev_id)
+    return repository.get_hardware_revision(hwrev_id)
+
+def patch_hardware_revision(hwrev_id, changes, actor=None):
+    # BOM lines are checked for missing sub-assemblies and cycles like on create
+    changes = validate_patch(HardwareRevision, changes)
+    with repository.transaction():
+        hw = repository.get_hardware_revision(hwrev_id)
+        if not hw:
+            return None
+        diff = _diff(hw, changes)
+        if not diff:
+            return {"hardware_revision": hw, "changes": {}}
+        hw = hw.model_copy(update={field: changes[field] for field in diff})
+        _bom().check(hw, repository.get_hardware_revision)
+        repository.save_hardware_revision(hw)
+        bom_index.revision_changed(hw)
+    _changed("hardware_revisions")
+    change_log.record("hardware_revision", hwrev_id, diff, actor)
+    return {"hardware_revision": hw, "changes": diff}
 
 def update_hardware_revision(hwrev_id, updates):
-    hw = hardware_revision_store.get(hwrev_id)
-    if not hw:
-        return None
-    for k, v in updates.items():
-        if hasattr(hw, k):
-            setattr(hw, k, v)
-    hardware_revision_store[hwrev_id] = hw
-    return hw
+    result = patch_hardware_revision(hwrev_id, _without_id(updates))
+    return result and result["hardware_revision"]
+
+def get_changes(kind=None, record_id=None, limit=100):
+    # Recent field-level diffs, oldest first; kind is "component",
+    # "inventory" or "hardware_revision"
+    return change_log.entries(kind=kind, record_id=record_id, limit=limit)
 
 def delete_hardware_revision(hwrev_id):
-    return hardware_revision_store.pop(hwrev_id, None) is not None
+    parents = _bom().parents(hwrev_id)
+    if parents:
+        raise ValueError(f"Hardware revision {hwrev_id} is a sub-assembly of {sorted(parents)}")
+    deleted = repository.delete_hardware_revision(hwrev_id)
+    if deleted:
+        bom_index.revision_removed(hwrev_id)
+        _changed("hardware_revisions")
+    return deleted
+
+def explode_hardware_revision(hwrev_id):
+    # Leaf component requirements, cost and critical-path lead time of one
+    # build, with sub-assemblies expanded; memoized per revision
+    rollup = _bom().rollup(hwrev_id, repository.get_component)
+    if rollup is None:
+        return None
+    return {
+        "hwrev_id": hwrev_id,
+        "components": [{"component_id": cid, "quantity": qty} for cid, qty in sorted(rollup["leaves"].items())],
+        "cost": rollup["cost"],
+        "unpriced": list(rollup["unpriced"]),
+        "lead_time_days": rollup["lead_time_days"],
+        "critical_path": list(rollup["critical_path"]),
+    }
 
-def verify_hardware_revision_inventory(hwrev_id: str):
-    hw = hardware_revision_store.get(hwrev_id)
-    if not hw:
+def get_leaf_requirements(hwrev_id):
+    # Returns {component_id: quantity} for one build, or None if the revision is unknown
+    rollup = _bom().rollup(hwrev_id, repository.get_component)
+    return dict(rollup["leaves"]) if rollup is not None else None
+
+def verify_hardware_revision_inventory(hwrev_id: str, as_of=None):
+    # Sub-assemblies are expanded into the leaf components they need
+    return _cached_report("verify-inventory", (hwrev_id, as_of),
+                          lambda: _verify_hardware_revision_inventory(hwrev_id, as_of))
+
+def _verify_hardware_revision_inventory(hwrev_id, as_of):
+    requirements = get_leaf_requirements(hwrev_id)
+    if requirements is None:
         return None
-    # Each component in hw.components is a dict with at least 'component_id' and 'quantity' (if present)
+    if as_of is None:
+        stock = repository.stock(requirements, AVAILABLE_STATES)
+    else:
+        # Checks the current BOM against the stock at as_of
+        counts = get_stock_as_of(as_of)
+        stock = {cid: sum(counts.get((cid, st), 0) for st in AVAILABLE_STATES) for cid in requirements}
     missing = []
-    for comp in hw.components:
-        cid = comp.get('component_id')
-        required_qty = comp.get('quantity', 1)
-        available_qty = sum(item.quantity for item in inventory_store.values() if item.component_id == cid and item.state in ["on-hand-ready", "allocated", "in-production"])
+    for cid, required_qty in requirements.items():
+        available_qty = stock[cid]
         if available_qty < required_qty:
             missing.append({"component_id": cid, "required": required_qty, "available": available_qty})
     return missing
 
-def get_lead_time_report():
-    # Returns a list of (component_id, estimated_lead_time, actual_lead_time)
+SORT_ORDERS = ("asc", "desc")
+
+def get_lead_time_report(min_days: float = None, max_days: float = None, sort: str = None, top: int = None,
+                         by: str = "actual", group_by: str = None):
+    # Without arguments, every component in insertion order. Otherwise only
+    # components whose `by` lead time ("actual" or "estimated", in days) is
+    # known and within [min_days, max_days], sorted by it and cut to the
+    # first `top`; top alone lists the longest. Entries carry the parsed
+    # estimate, variance_days (actual minus estimated) and the observed
+    # ordered-to-received statistics. group_by="vendor" returns the observed
+    # statistics per vendor instead.
+    if group_by is not None:
+        if group_by != "vendor":
+            raise ValueError("group_by must be 'vendor'")
+        return _cached_report("lead-time", ("vendor",), _vendor_lead_time_report)
+    if by not in LEAD_TIME_KINDS:
+        raise ValueError(f"by must be one of {tuple(LEAD_TIME_KINDS)}")
+    if sort is not None and sort not in SORT_ORDERS:
+        raise ValueError(f"sort must be one of {SORT_ORDERS}")
+    if min_days is None and max_days is None and sort is None and top is None:
+        return _cached_report("lead-time", (), lambda: _with_observed(repository.lead_time_report()))
+    descending = sort == "desc" or (sort is None and top is not None)
+    return _cached_report("lead-time", (min_days, max_days, descending, top, by), lambda: _with_observed(
+        repository.lead_time_report(by=by, min_days=min_days, max_days=max_days, descending=descending, limit=top)))
+
+def _with_observed(entries):
+    sync_transition_log()
+    for entry in entries:
+        entry["observed"] = summarize(*lead_time_stats.merged([entry["component_id"]]))
+    return entries
+
+def _observed_by_vendor():
+    # {vendor_name: (RunningStats, QuantileSketch)} over components with receipts
+    sync_transition_log()
+    members = {}
+    for component_id in lead_time_stats.component_ids():
+        comp = repository.get_component(component_id)
+        if comp is not None:
+            members.setdefault(comp.vendor_name, []).append(component_id)
+    return {vendor: lead_time_stats.merged(ids) for vendor, ids in members.items()}
+
+def _vendor_lead_time_report():
     return [
-        {
-            "component_id": comp.id,
-            "estimated_lead_time": comp.estimated_lead_time,
-            "actual_lead_time": comp.actual_lead_time
-        }
-        for comp in components_store.values()
+        {"vendor": vendor, "observed": summarize(*stats)}
+        for vendor, stats in sorted(_observed_by_vendor().items())
     ]
 
-def get_failure_rate_report(threshold: float = 0.05):
-    # Returns components with failure_rate >= threshold
-    return [
-        {
-            "component_id": comp.id,
-            "failure_rate": comp.failure_rate
+def get_lead_time_forecast():
+    # Expected arrival of every lot still in `ordered`: order time plus the
+    # median (and 90th percentile) observed lead time of the component, else
+    # of its vendor, else the component's own lead time figure
+    return _cached_report("lead-time-forecast", (), _lead_time_forecast)
+
+def _lead_time_forecast():
+    sync_transition_log()
+    by_vendor = None
+    forecast = []
+    for lot in repository.find_inventory(state=InventoryState.ORDERED):
+        ordered_at = lead_time_stats.ordered_at(lot.id)
+        comp = repository.get_component(lot.component_id)
+        running, sketch = lead_time_stats.merged([lot.component_id])
+        basis = "component"
+        if not running.count and comp is not None:
+            if by_vendor is None:
+                by_vendor = _observed_by_vendor()
+            running, sketch = by_vendor.get(comp.vendor_name, (running, sketch))
+            basis = "vendor"
+        if running.count:
+            p50, p90 = sketch.quantile(0.5), sketch.quantile(0.9)
+        else:
+            p50 = p90 = lead_time_days(comp) if comp is not None else None
+            basis = "estimate" if p50 else None
+        known = ordered_at is not None and basis is not None
+        forecast.append({
+            "inventory_id": lot.id,
+            "component_id": lot.component_id,
+            "quantity": lot.quantity,
+            "ordered_at": datetime.fromtimestamp(ordered_at) if ordered_at is not None else None,
+            "expected_at": datetime.fromtimestamp(ordered_at + p50 * 86400) if known else None,
+            "expected_p90_at": datetime.fromtimestamp(ordered_at + p90 * 86400) if known else None,
+            "basis": basis,
+        })
+    return forecast
+
+FAILURE_GROUPS = ("component", "vendor", "manufacturer")
+
+def get_failure_rate_report(threshold: float = 0.05, top: int = None, group_by: str = None):
+    # Returns components with failure_rate >= threshold, highest first,
+    # at most `top` of them. Without group_by the rate is the hand-entered
+    # Component.failure_rate; with group_by ("component", "vendor" or
+    # "manufacturer") it is observed from inventory state changes.
+    if group_by is None:
+        return _cached_report("failure-rate", (threshold, top),
+                              lambda: repository.failure_rate_report(threshold, limit=top))
+    if group_by not in FAILURE_GROUPS:
+        raise ValueError(f"group_by must be one of {FAILURE_GROUPS}")
+    now = time.time()
+    # Windows move at midnight, so the day is part of the cache key
+    return _cached_report("observed-failure-rate", (threshold, top, group_by, int(now // 86400)),
+                          lambda: _observed_failure_rates(threshold, top, group_by, now))
+
+def _failure_entry(failed, exposed):
+    low, high = wilson_interval(failed, exposed)
+    return {"failed": failed, "exposed": exposed, "failure_rate": failed / exposed if exposed else None,
+            "ci_low": low, "ci_high": high}
+
+def _observed_failure_rates(threshold, top, group_by, now):
+    # Sums the per-component counters into groups; the cost depends on the
+    # number of components with failures or production, not on inventory
+    field = {"component": "id", "vendor": "vendor_name", "manufacturer": "manufacturer_name"}[group_by]
+    sync_transition_log()
+    groups = {}
+    for component_id, counts in failure_stats.counts(now).items():
+        comp = repository.get_component(component_id) if group_by != "component" else None
+        key = getattr(comp, field) if comp is not None else component_id
+        # [failed, exposed] all-time and per window
+        totals = groups.setdefault(key, {span: [0, 0] for span in (None, *WINDOWS)})
+        for span, (failed, exposed) in ((None, (counts["failed"], counts["exposed"])), *counts["windows"].items()):
+            totals[span][0] += failed
+            totals[span][1] += exposed
+    report = []
+    for key, totals in groups.items():
+        entry = {"component_id" if group_by == "component" else group_by: key, **_failure_entry(*totals[None])}
+        for window in WINDOWS:
+            entry[f"last_{window}_days"] = _failure_entry(*totals[window])
+        if entry["failure_rate"] is not None and entry["failure_rate"] >= (threshold or 0.0):
+            report.append(entry)
+    report.sort(key=lambda e: (-e["failure_rate"], str(next(iter(e.values())))))
+    return report[:top] if top is not None else report
+
+def get_lead_time_variance():
+    # How actual lead times compare with the estimates, over the components
+    # that have both: mean and spread of (actual - estimated) in days
+    def compute():
+        errors = [
+            entry["variance_days"] for entry in repository.lead_time_report()
+            if entry["variance_days"] is not None
+        ]
+        if not errors:
+            return {"count": 0, "mean_days": None, "mean_abs_days": None, "stddev_days": None, "late": 0}
+        mean = sum(errors) / len(errors)
+        return {
+            "count": len(errors),
+            "mean_days": mean,
+            "mean_abs_days": sum(map(abs, errors)) / len(errors),
+            "stddev_days": (sum((e - mean) ** 2 for e in errors) / len(errors)) ** 0.5,
+            "late": sum(e > 0 for e in errors),
         }
-        for comp in components_store.values() if comp.failure_rate is not None and comp.failure_rate >= threshold
-    ]
+    return _cached_report("lead-time-variance", (), compute)
+
+# Report results are cached per report and parameters together with the
+# versions of the stores they read, and reused until one of those versions
+# moves. Cached results are shared between callers and must not be modified.
+REPORT_CACHE_SIZE = 256
+_REPORT_STORES = {
+    "inventory": ("inventory",),
+    "inventory-as-of": ("inventory",),
+    "verify-inventory": ("hardware_revisions", "inventory"),
+    "lead-time": ("components", "inventory"),
+    "lead-time-variance": ("components",),
+    "lead-time-forecast": ("components", "inventory"),
+    "failure-rate": ("components",),
+    "observed-failure-rate": ("components", "inventory"),
+}
+_report_cache = OrderedDict()
+_report_cache_guard = threading.Lock()
+_report_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def _cached_report(report, params, compute):
+    # Inside a transaction the result may include writes that are rolled back,
+    # and SQLite then hands out the same version numbers again
+    if repository.in_transaction():
+        return compute()
+    key = (report, params)
+    # Read before computing, so a change made meanwhile leaves the entry stale
+    versions = _versions_of(_REPORT_STORES[report])
+    with _report_cache_guard:
+        entry = _report_cache.get(key)
+        if entry is not None and entry[0] == versions:
+            _report_cache.move_to_end(key)
+            _report_cache_stats["hits"] += 1
+            return entry[1]
+        _report_cache_stats["misses"] += 1
+    result = compute()
+    with _report_cache_guard:
+        _report_cache[key] = (versions, result)
+        _report_cache.move_to_end(key)
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+            _report_cache_stats["evictions"] += 1
+    return result
+
+def report_etag(report, *params):
+    # Derived from the store versions alone, so a client holding the current
+    # result can be answered without building or serializing the report
+    versions = _versions_of(_REPORT_STORES[report])
+    digest = hashlib.sha1(repr((report, params, versions)).encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+def report_cache_stats():
+    with _report_cache_guard:
+        return dict(_report_cache_stats, size=len(_report_cache), max_size=REPORT_CACHE_SIZE)
+
+def clear_report_cache():
+    with _report_cache_guard:
+        _report_cache.clear()
+        for counter in _report_cache_stats:
+            _report_cache_stats[counter] = 0
 
 def validate_inventory_allocation(component_id: str, requested_qty: int):
     # Returns True if enough on-hand/ready/allocated/in-production inventory exists
-    available_qty = sum(item.quantity for item in inventory_store.values() if item.component_id == component_id and item.state in ["on-hand-ready", "allocated", "in-production"])
+    available_qty = _available_quantity(component_id)
     return available_qty >= requested_qty, available_qty
 
-def get_cost_history_report(component_id: str):
-    comp = components_store.get(component_id)
-    if not comp or not hasattr(comp, 'costs'):
-        return []
-    return [{"value": c.value, "date": c.date} for c in comp.costs]
+def get_cost_history_report(component_id: str, since=None, until=None, last=None, bucket: str = None):
+    # Raw points, or min/max/avg per day, week or month when bucket is given
+    timestamps, values = _cost_range(component_id, since, until, last)
+    if bucket:
+        return downsample(timestamps, values, bucket)
+    return [{"value": value, "date": datetime.fromtimestamp(ts)} for ts, value in zip(timestamps, values)]
+
+# Batch operations
+# Each batch either applies every item or none (atomic=True), or applies the
+# valid items and reports the rest as {"index", "error"} entries. A batch sent
+# again with the same idempotency key returns the first result instead of
+# being applied twice.
+IDEMPOTENCY_CACHE_SIZE = 1024
+_idempotency_results = OrderedDict()
+_idempotency_locks = {}
+_idempotency_guard = threading.Lock()
+
+class BatchError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} item(s) failed: {errors}")
+
+def _run_idempotent(operation, idempotency_key, items, apply):
+    if not idempotency_key:
+        return apply()
+    key = (operation, idempotency_key)
+    payload = [item.model_dump() if hasattr(item, "model_dump") else item for item in items]
+    fingerprint = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    with _idempotency_guard:
+        lock = _idempotency_locks.setdefault(key, threading.Lock())
+    with lock:
+        cached = _idempotency_results.get(key)
+        if cached:
+            if cached[0] != fingerprint:
+                raise ValueError(f"Idempotency key {idempotency_key} was already used for a different batch")
+            return cached[1]
+        try:
+            result = apply()
+        except Exception:
+            with _idempotency_guard:
+                _idempotency_locks.pop(key, None)
+            raise
+        with _idempotency_guard:
+            _idempotency_results[key] = (fingerprint, result)
+            while len(_idempotency_results) > IDEMPOTENCY_CACHE_SIZE:
+                evicted, _ = _idempotency_results.popitem(last=False)
+                _idempotency_locks.pop(evicted, None)
+        return result
+
+def _validate_batch(model, items):
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            errors.append({"index": index, "error": str(e)})
+    return valid, errors
+
+def create_components_bulk(components, atomic=True, idempotency_key=None):
+    def apply():
+        valid, errors = _validate_batch(Component, components)
+        if errors and atomic:
+            raise BatchError(errors)
+        created = []
+        with repository.transaction():
+            for _, comp in valid:
+                created.append(create_component(comp))
+        return {"created": created, "errors": errors}
+    return _run_idempotent("create_components", idempotency_key, components, apply)
+
+def create_inventory_bulk(items, atomic=True, idempotency_key=None, actor=None):
+    # Valid lots are written with a single repository call
+    def apply():
+        valid, errors = _validate_batch(Inventory, items)
+        lots, serials, ids = [], set(), set()
+        for index, inv in valid:
+            serial = inv.serial_number
+            if inv.id and (inv.id in ids or repository.get_inventory(inv.id) is not None):
+                errors.append({"index": index, "error": f"Inventory {inv.id} already exists"})
+            elif serial and inv.quantity > 1:
+                errors.append({"index": index, "error": "serial_number can only be set on a single unit"})
+            elif serial and (serial in serials or repository.get_inventory_by_serial(serial)):
+                errors.append({"index": index, "error": f"serial_number {serial} is already in use"})
+            else:
+                if serial:
+                    serials.add(serial)
+                if not inv.id:
+                    inv.id = _generate_id("INV")
+                ids.add(inv.id)
+                lots.append(inv)
+        errors.sort(key=lambda e: e["index"])
+        if errors and atomic:
+            raise BatchError(errors)
+        repository.add_inventory(lots)
+        _changed("inventory")
+        for inv in lots:
+            transition_log.record(inv.id, inv.component_id, None, inv.state, inv.quantity, actor)
+        return {"created": lots, "errors": errors}
+    return _run_idempotent("create_inventory", idempotency_key, items, apply)
+
+def transition_inventory(transitions, atomic=True, idempotency_key=None, actor=None):
+    # Moves whole lots, or `quantity` units of them, to a new state
+    def apply():
+        valid, errors = _validate_batch(InventoryTransition, transitions)
+        checked, remaining, component_ids = [], {}, set()
+        for index, t in valid:
+            lot = repository.get_inventory(t.inventory_id)
+            if not lot:
+                errors.append({"index": index, "error": f"Inventory {t.inventory_id} not found"})
+                continue
+            left = remaining.get(lot.id, lot.quantity)
+            moving = t.quantity or left
+            if not left or moving > left:
+                errors.append({"index": index, "error": f"Cannot move {moving} units, {left} left in {lot.id}"})
+                continue
+            try:
+                check_transition(lot.state, t.state)
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+                continue
+            remaining[lot.id] = left - moving
+            component_ids.add(lot.component_id)
+            checked.append((index, t))
+        errors.sort(key=lambda e: e["index"])
+        if errors and atomic:
+            raise BatchError(errors)
+        updated = []
+        with ExitStack() as stack:
+            # Component locks are taken in sorted order, before the transaction
+            for cid in sorted(component_ids):
+                stack.enter_context(component_lock(cid))
+            stack.enter_context(repository.transaction())
+            for index, t in checked:
+                try:
+                    updated.append(update_inventory(t.inventory_id, {"state": t.state}, quantity=t.quantity, actor=actor))
+                except ValueError as e:
+                    if atomic:
+                        raise BatchError([{"index": index, "error": str(e)}])
+                    errors.append({"index": index, "error": str(e)})
+        return {"updated": updated, "errors": errors}
+    return _run_idempotent("transition_inventory", idempotency_key, transitions, apply)
+
+def get_inventory_history(inventory_id):
+    # State changes of one item, oldest first
+    return sync_transition_log().timeline(inventory_id)
+
+def get_transitions(component_id: str = None, since=None, until=None, limit=None):
+    # State changes, optionally for one component, within [since, until];
+    # with a limit, only the first `limit` of them
+    log = sync_transition_log()
+    if component_id:
+        return log.for_component(component_id, since=since, until=until, limit=limit)
+    return log.between(since=since, until=until, limit=limit)
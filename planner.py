@@ -0,0 +1,208 @@
+import time
+from datetime import datetime
+import numpy as np
+from operations import get_repository
+from reports import get_bom_matrix
+from reservations import reserve_hardware_revision, release_reservation, confirm_reservation, FREE_STATE, DEFAULT_TTL
+
+OBJECTIVES = ("builds", "priority")
+
+
+def _normalize_orders(orders):
+    # Orders are dicts (or (hwrev_id, quantity, due) tuples) in priority order;
+    # the first order weighs most unless it carries an explicit weight
+    normalized = []
+    for position, order in enumerate(orders):
+        if not isinstance(order, dict):
+            order = dict(zip(("hwrev_id", "quantity", "due"), order))
+        try:
+            quantity = int(order.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"Order {position}: quantity must be a whole number") from None
+        if quantity < 1:
+            raise ValueError(f"Order {position}: quantity must be at least 1")
+        due = order.get("due")
+        if isinstance(due, str):
+            due = datetime.fromisoformat(due)
+        try:
+            hwrev_id = order["hwrev_id"]
+        except KeyError as missing:
+            raise ValueError(f"Order {position}: missing field {missing}") from None
+        try:
+            weight = float(order.get("weight", len(orders) - position))
+        except (TypeError, ValueError):
+            raise ValueError(f"Order {position}: weight must be a number") from None
+        normalized.append({
+            "hwrev_id": hwrev_id,
+            "quantity": quantity,
+            "due": due,
+            "weight": weight,
+        })
+    return normalized
+
+
+class _Problem:
+    """Orders against free stock, restricted to the components they use.
+
+    Besides the dense requirement matrix, each order keeps the columns it
+    needs and their quantities, since a BOM uses a small share of all
+    components and the solver mostly looks at one order at a time.
+    """
+
+    def __init__(self, orders, matrix, stock):
+        rows = {hwrev_id: row for row, hwrev_id in enumerate(matrix.revisions)}
+        missing = [o["hwrev_id"] for o in orders if o["hwrev_id"] not in rows]
+        if missing:
+            raise ValueError(f"Unknown hardware revisions: {missing}")
+        required = matrix.required[[rows[o["hwrev_id"]] for o in orders]]
+        self.columns = np.flatnonzero(required.any(axis=0))
+        self.required = required[:, self.columns]
+        self.stock = stock[self.columns]
+        self.demand = np.array([o["quantity"] for o in orders], dtype=np.int64)
+        self.uses = [np.flatnonzero(row) for row in self.required]
+        self.needs = [row[cols] for row, cols in zip(self.required, self.uses)]
+
+    def max_builds(self, i, remaining):
+        # Builds of order i that `remaining` stock still covers, capped at demand
+        if not len(self.uses[i]):
+            return 0
+        return int(min(self.demand[i], (remaining[self.uses[i]] // self.needs[i]).min()))
+
+    def take(self, i, builds, remaining):
+        remaining[self.uses[i]] -= builds * self.needs[i]
+
+
+def _greedy(problem, sequence, builds, remaining):
+    for i in sequence:
+        extra = min(problem.max_builds(i, remaining), problem.demand[i] - builds[i])
+        if extra > 0:
+            builds[i] += extra
+            problem.take(i, extra, remaining)
+
+
+def _improve(problem, sequence, weights, builds, remaining, time_limit):
+    # Local search: give back one build of an order that competes with an
+    # unfilled order, refill the unfilled orders greedily, and keep the move
+    # whenever the weighted total goes up. Stops at a local optimum or when
+    # time_limit seconds have passed.
+    deadline = time.monotonic() + time_limit
+    uses = (problem.required > 0).astype(np.float32)
+    shares = (uses @ uses.T) > 0
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        # Which components each order is short of; an unfilled order can only
+        # gain if the freed build covers all of them
+        short = problem.required > remaining
+        short_count = short.sum(axis=1)
+        for j in reversed(sequence):
+            if not builds[j]:
+                continue
+            unfilled = shares[j] & (builds < problem.demand)
+            unfilled[j] = False
+            candidates = np.flatnonzero(unfilled)
+            if not len(candidates):
+                continue
+            cols = problem.uses[j]
+            freed = remaining[cols] + problem.needs[j]
+            block = np.ix_(candidates, cols)
+            fits = (problem.required[block] <= freed).all(axis=1) & (short[block].sum(axis=1) == short_count[candidates])
+            if not fits.any():
+                continue
+            trial, left = builds.copy(), remaining.copy()
+            trial[j] -= 1
+            problem.take(j, -1, left)
+            fits = set(candidates[fits].tolist())
+            _greedy(problem, [i for i in sequence if i in fits], trial, left)
+            if weights @ trial > weights @ builds + 1e-9:
+                changed = np.flatnonzero(left != remaining)
+                now_short = problem.required[:, changed] > left[changed]
+                short_count += now_short.sum(axis=1) - short[:, changed].sum(axis=1)
+                short[:, changed] = now_short
+                builds[:], remaining[:] = trial, left
+                improved = True
+            if time.monotonic() >= deadline:
+                return
+
+
+def plan_builds(orders, objective="builds", time_limit=0.5):
+    # Allocates free stock across competing build orders. "builds" maximizes
+    # the number of builds, "priority" the builds weighted by order priority.
+    # Returns the planned builds per order, the components that limit each
+    # short order, and the stock shortfall for fulfilling every order.
+    # time_limit bounds the local improvement after the greedy pass.
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {OBJECTIVES}")
+    orders = _normalize_orders(orders)
+    matrix = get_bom_matrix()
+    stock_by_id = get_repository().stock(matrix.component_ids, [FREE_STATE])
+    stock = np.fromiter((stock_by_id[cid] for cid in matrix.component_ids), dtype=np.int64, count=len(matrix.component_ids))
+    problem = _Problem(orders, matrix, stock)
+
+    if objective == "builds":
+        weights = np.ones(len(orders))
+        # Cheapest builds first, measured by the share of scarce stock they use
+        scarcity = (problem.required / np.maximum(problem.stock, 1)).sum(axis=1)
+        sequence = sorted(range(len(orders)), key=lambda i: (scarcity[i], orders[i]["due"] or datetime.max, i))
+    else:
+        weights = np.array([o["weight"] for o in orders])
+        sequence = sorted(range(len(orders)), key=lambda i: (-weights[i], orders[i]["due"] or datetime.max, i))
+    builds = np.zeros(len(orders), dtype=np.int64)
+    remaining = problem.stock.copy()
+    _greedy(problem, sequence, builds, remaining)
+    _improve(problem, sequence, weights, builds, remaining, time_limit)
+
+    component_ids = [matrix.component_ids[c] for c in problem.columns]
+    allocations = []
+    for i, order in enumerate(orders):
+        limiting = []
+        if builds[i] < order["quantity"]:
+            # Components that stop one more build of this order
+            short = np.flatnonzero(problem.required[i] > remaining)
+            limiting = [
+                {"component_id": component_ids[c], "required": int(problem.required[i, c]), "available": int(remaining[c])}
+                for c in short
+            ]
+        allocations.append({
+            "hwrev_id": order["hwrev_id"],
+            "requested": order["quantity"],
+            "planned": int(builds[i]),
+            "due": order["due"],
+            "limiting": limiting,
+        })
+    total_required = problem.demand @ problem.required
+    shortfalls = [
+        {"component_id": component_ids[c], "required": int(total_required[c]), "available": int(problem.stock[c]),
+         "missing": int(total_required[c] - problem.stock[c])}
+        for c in np.flatnonzero(total_required > problem.stock)
+    ]
+    return {
+        "objective": objective,
+        "value": float(weights @ builds),
+        "builds": int(builds.sum()),
+        "allocations": allocations,
+        "shortfalls": shortfalls,
+    }
+
+
+def commit_plan(plan, ttl=DEFAULT_TTL, confirm=False):
+    # Reserves the planned builds of every order with reserve_hardware_revision.
+    # If stock changed and an order can no longer be reserved, the orders
+    # already reserved are released and InsufficientStockError propagates.
+    reservations = []
+    try:
+        for allocation in plan["allocations"]:
+            if not allocation["planned"]:
+                continue
+            reservation = reserve_hardware_revision(allocation["hwrev_id"], builds=allocation["planned"], ttl=ttl)
+            if reservation is None:
+                raise ValueError(f"Hardware revision {allocation['hwrev_id']} not found")
+            reservations.append(reservation)
+    except Exception:
+        for reservation in reservations:
+            release_reservation(reservation.id)
+        raise
+    if confirm:
+        for reservation in reservations:
+            confirm_reservation(reservation.id)
+    return reservations
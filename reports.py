@@ -0,0 +1,151 @@
+import threading
+import numpy as np
+from operations import (
+    get_repository, get_stock_as_of, store_version, get_leaf_requirements, AVAILABLE_STATES
+)
+
+VALUATION_GROUPS = ("state", "vendor", "manufacturer", "component")
+_GROUP_FIELDS = {"vendor": "vendor_name", "manufacturer": "manufacturer_name", "component": "id"}
+
+
+def _factorize(keys):
+    # Maps each key to a small int code; returns (codes array, unique keys)
+    codes = {}
+    array = np.fromiter((codes.setdefault(key, len(codes)) for key in keys), dtype=np.int64)
+    return array, list(codes)
+
+
+def valuation_report(as_of=None, group_by="state"):
+    # Stock quantity times the unit cost in effect, per state, vendor,
+    # manufacturer or component, now or at a past datetime. The current value
+    # uses Component.cost; a past one uses the latest cost point at or before
+    # as_of. Stock without a known price is listed under "unpriced".
+    if group_by not in VALUATION_GROUPS:
+        raise ValueError(f"group_by must be one of {VALUATION_GROUPS}")
+    repository = get_repository()
+    counts = repository.stock_counts() if as_of is None else get_stock_as_of(as_of)
+    components = repository.list_components()
+    index = {comp.id: i for i, comp in enumerate(components)}
+
+    # Unit price per component, NaN where unknown
+    if as_of is None:
+        # Component.cost always holds the latest cost point
+        price = lambda c: c.cost
+    else:
+        history = repository.costs_at(as_of.timestamp())
+        ever_priced = repository.costs_at()
+        # Components without any cost history fall back to their current cost
+        price = lambda c: history.get(c.id) if c.id in ever_priced else c.cost
+    prices = np.fromiter(
+        (np.nan if p is None else p for p in map(price, components)), dtype=np.float64, count=len(components)
+    )
+    prices = np.append(prices, np.nan)  # slot for stock of unknown components
+
+    keys = list(counts)
+    quantities = np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+    rows = np.fromiter((index.get(cid, -1) for cid, _ in keys), dtype=np.int64, count=len(keys))
+    values = quantities * prices[rows]
+    priced = ~np.isnan(values)
+
+    if group_by == "state":
+        codes, groups = _factorize(state for _, state in keys)
+    else:
+        field = _GROUP_FIELDS[group_by]
+        by_component, groups = _factorize([getattr(c, field) for c in components] + [None])
+        codes = by_component[rows]
+    group_quantity = np.bincount(codes, weights=quantities, minlength=len(groups))
+    group_value = np.bincount(codes[priced], weights=values[priced], minlength=len(groups))
+
+    unpriced = {}
+    for i in np.flatnonzero(~priced):
+        cid = keys[i][0]
+        unpriced[cid] = unpriced.get(cid, 0) + int(quantities[i])
+    return {
+        "as_of": as_of,
+        "group_by": group_by,
+        "total_quantity": int(quantities.sum()),
+        "total_value": float(values[priced].sum()),
+        "groups": sorted(
+            (
+                {group_by: key, "quantity": int(group_quantity[i]), "value": float(group_value[i])}
+                for i, key in enumerate(groups) if group_quantity[i]
+            ),
+            key=lambda g: -g["value"],
+        ),
+        "unpriced": [{"component_id": cid, "quantity": qty} for cid, qty in unpriced.items()],
+    }
+
+
+class BomMatrix:
+    """Required quantity of every component (columns) per hardware revision (rows).
+
+    Built from (hwrev_id, name, {component_id: quantity}) rows, with
+    sub-assemblies already expanded into leaf components.
+    """
+
+    def __init__(self, revisions):
+        self.revisions = [hwrev_id for hwrev_id, _, _ in revisions]
+        self.names = [name for _, name, _ in revisions]
+        columns = {}
+        cells = [
+            (row, columns.setdefault(cid, len(columns)), qty)
+            for row, (_, _, leaves) in enumerate(revisions) for cid, qty in leaves.items()
+        ]
+        self.component_ids = list(columns)
+        self.required = np.zeros((len(self.revisions), len(self.component_ids)), dtype=np.int64)
+        if cells:
+            rows, cols, quantities = (np.array(v, dtype=np.int64) for v in zip(*cells))
+            self.required[rows, cols] = quantities
+
+    def buildable(self, stock):
+        # stock is an array aligned with component_ids; returns (builds,
+        # limiting column) per revision, both -1 for revisions without a BOM
+        if not self.component_ids:
+            none = np.full(len(self.revisions), -1, dtype=np.int64)
+            return none, none
+        needed = self.required > 0
+        per_component = np.where(needed, stock // np.where(needed, self.required, 1), np.iinfo(np.int64).max)
+        limiting = per_component.argmin(axis=1)
+        builds = per_component[np.arange(len(self.revisions)), limiting]
+        has_bom = needed.any(axis=1)
+        return np.where(has_bom, builds, -1), np.where(has_bom, limiting, -1)
+
+
+_bom_cache = {"version": None, "matrix": None}
+_bom_lock = threading.Lock()
+
+
+def get_bom_matrix():
+    # Rebuilt only after a hardware revision has changed, here or in another
+    # process sharing the store
+    with _bom_lock:
+        version = store_version("hardware_revisions")
+        if _bom_cache["version"] != version:
+            _bom_cache["matrix"] = BomMatrix([
+                (hw.id, hw.name, get_leaf_requirements(hw.id) or {})
+                for hw in get_repository().list_hardware_revisions()
+            ])
+            _bom_cache["version"] = version
+        return _bom_cache["matrix"]
+
+
+def buildable_report(states=AVAILABLE_STATES):
+    # How many units of every hardware revision current stock covers, and the
+    # component that runs out first; one stock query for all revisions
+    matrix = get_bom_matrix()
+    stock_by_id = get_repository().stock(matrix.component_ids, states)
+    stock = np.fromiter((stock_by_id[cid] for cid in matrix.component_ids), dtype=np.int64, count=len(matrix.component_ids))
+    builds, limiting = matrix.buildable(stock)
+    report = []
+    for row, hwrev_id in enumerate(matrix.revisions):
+        col = int(limiting[row])
+        entry = {"hwrev_id": hwrev_id, "name": matrix.names[row], "buildable": None, "limiting_component_id": None}
+        if col >= 0:
+            entry.update(
+                buildable=int(builds[row]),
+                limiting_component_id=matrix.component_ids[col],
+                required=int(matrix.required[row, col]),
+                available=int(stock[col]),
+            )
+        report.append(entry)
+    return report
@@ -0,0 +1,678 @@
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from models import Component, Inventory, HardwareRevision, parse_lead_time
+from store import InventoryStore, InventoryRecord, SortedIndex
+from timeseries import CostSeries
+
+# Lead time kinds that reports can filter and sort on, with their columns
+LEAD_TIME_KINDS = {"actual": "actual_lead_time", "estimated": "estimated_lead_time_days"}
+
+
+def _lead_time_entry(component_id, estimated, estimated_days, actual):
+    # An actual lead time of 0 means it is not known yet
+    return {
+        "component_id": component_id,
+        "estimated_lead_time": estimated,
+        "estimated_lead_time_days": estimated_days,
+        "actual_lead_time": actual,
+        "variance_days": actual - estimated_days if actual and estimated_days is not None else None,
+    }
+
+
+class Repository:
+    """Storage interface behind the CRUD functions in operations.py.
+
+    Component and hardware revision records are saved whole; inventory records
+    are changed field by field through update_inventory so backends can keep
+    their indexes and stock counts current. Multi-step changes should run
+    inside transaction().
+    """
+
+    def transaction(self):
+        raise NotImplementedError
+
+    def in_transaction(self):
+        # True while this thread has uncommitted writes that may be rolled back
+        return False
+
+    def close(self):
+        # Flushes and releases what the backend holds open; it may be used
+        # again afterwards
+        pass
+
+    def store_versions(self):
+        # {store: version} for backends shared between processes, bumped by
+        # the backend on every write; None leaves change tracking to operations.py
+        return None
+
+    # Components
+    def get_component(self, component_id):
+        raise NotImplementedError
+
+    def save_component(self, component):
+        raise NotImplementedError
+
+    def delete_component(self, component_id):
+        raise NotImplementedError
+
+    def list_components(self):
+        raise NotImplementedError
+
+    def lead_time_report(self, by=None, min_days=None, max_days=None, descending=False, limit=None):
+        # Every component in insertion order; with `by` (a LEAD_TIME_KINDS
+        # key) only those whose lead time of that kind is known and within
+        # [min_days, max_days], sorted by it and cut to `limit`
+        raise NotImplementedError
+
+    def failure_rate_report(self, threshold, limit=None):
+        # Components with failure_rate >= threshold, highest first
+        raise NotImplementedError
+
+    # Cost history, kept apart from component records
+    def add_cost(self, component_id, value, timestamp):
+        raise NotImplementedError
+
+    def cost_series(self, component_id, since=None, until=None, last=None):
+        # Returns (timestamps, values) sorted by time; timestamps are epoch seconds
+        raise NotImplementedError
+
+    def costs_at(self, timestamp=None):
+        # Returns {component_id: value of the latest cost point at or before
+        # `timestamp`} for every component with such a point
+        raise NotImplementedError
+
+    # Inventory
+    def get_inventory(self, inventory_id):
+        raise NotImplementedError
+
+    def get_inventory_by_serial(self, serial_number):
+        raise NotImplementedError
+
+    def add_inventory(self, items):
+        raise NotImplementedError
+
+    def update_inventory(self, item, changes):
+        raise NotImplementedError
+
+    def delete_inventory(self, inventory_id):
+        raise NotImplementedError
+
+    def find_inventory(self, state=None, component_id=None):
+        raise NotImplementedError
+
+    def scan_inventory(self, state=None, component_id=None, after=None):
+        # Lazily yields (cursor, item) in a stable order; `after` resumes from
+        # a cursor returned by an earlier scan with the same filters
+        raise NotImplementedError
+
+    def stock(self, component_ids, states=None):
+        # Returns {component_id: quantity} summed over the given states
+        raise NotImplementedError
+
+    def stock_by_state(self, component_id):
+        raise NotImplementedError
+
+    def stock_counts(self):
+        # Returns {(component_id, state): quantity} across all inventory
+        raise NotImplementedError
+
+    def check_stock(self):
+        # Returns {(component_id, state): (counted, actual)} for any drift
+        raise NotImplementedError
+
+    # Plain tuples for columnar export, read without building models
+    def component_rows(self):
+        # Yields (id, vendor_name, manufacturer_name, cost, failure_rate,
+        # actual_lead_time, estimated_lead_time_days) in insertion order
+        raise NotImplementedError
+
+    def inventory_rows(self):
+        # Yields (id, component_id, state, quantity) in insertion order
+        raise NotImplementedError
+
+    def cost_rows(self):
+        # Yields (component_id, timestamp, value), each component's points in time order
+        raise NotImplementedError
+
+    # Inventory transition events, as rows of events.TransitionLog
+    def append_transitions(self, rows):
+        # Stores rows after those already stored. The in-memory store keeps
+        # no copy: the process's transition log is the only one.
+        pass
+
+    def transitions(self, after=0):
+        # Yields (seq, *row) for the stored rows after `after`, in stored order
+        return iter(())
+
+    # Hardware revisions
+    def get_hardware_revision(self, hwrev_id):
+        raise NotImplementedError
+
+    def save_hardware_revision(self, hw):
+        raise NotImplementedError
+
+    def delete_hardware_revision(self, hwrev_id):
+        raise NotImplementedError
+
+    def list_hardware_revisions(self):
+        raise NotImplementedError
+
+
+class MemoryRepository(Repository):
+    """In-process dicts; inventory lives in an indexed InventoryStore.
+
+    Writes to the dicts hold a guard, and readers that iterate a dict copy it
+    under the same guard first, so a listing or report built while another
+    thread writes never sees a dict change size under it.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self.components = {}
+        self.costs = {}
+        self.inventory = InventoryStore()
+        self.hardware_revisions = {}
+        # Components by failure rate and by known lead times
+        self.component_indexes = {field: SortedIndex() for field in ("failure_rate", *LEAD_TIME_KINDS.values())}
+
+    def transaction(self):
+        # Callers already serialize writers with component locks
+        return nullcontext()
+
+    def get_component(self, component_id):
+        return self.components.get(component_id)
+
+    def save_component(self, component):
+        with self._guard:
+            self.components[component.id] = component
+        indexes = self.component_indexes
+        indexes["failure_rate"].set(component.id, component.failure_rate)
+        indexes["actual_lead_time"].set(component.id, component.actual_lead_time or None)
+        indexes["estimated_lead_time_days"].set(component.id, component.estimated_lead_time_days)
+        return component
+
+    def delete_component(self, component_id):
+        for index in self.component_indexes.values():
+            index.discard(component_id)
+        with self._guard:
+            self.costs.pop(component_id, None)
+            return self.components.pop(component_id, None) is not None
+
+    def list_components(self):
+        with self._guard:
+            return list(self.components.values())
+
+    def lead_time_report(self, by=None, min_days=None, max_days=None, descending=False, limit=None):
+        if by is None:
+            components = self.list_components()
+        else:
+            ranked = self.component_indexes[LEAD_TIME_KINDS[by]].range(min_days, max_days, descending, limit)
+            # A component deleted since the index was read is left out
+            found = (self.components.get(cid) for cid, _ in ranked)
+            components = [comp for comp in found if comp is not None]
+        return [
+            _lead_time_entry(comp.id, comp.estimated_lead_time, comp.estimated_lead_time_days, comp.actual_lead_time)
+            for comp in components
+        ]
+
+    def failure_rate_report(self, threshold, limit=None):
+        ranked = self.component_indexes["failure_rate"].range(threshold, None, descending=True, limit=limit)
+        return [{"component_id": cid, "failure_rate": rate} for cid, rate in ranked]
+
+    def add_cost(self, component_id, value, timestamp):
+        with self._guard:
+            series = self.costs.get(component_id)
+            if series is None:
+                series = self.costs[component_id] = CostSeries()
+        series.append(timestamp, value)
+
+    def cost_series(self, component_id, since=None, until=None, last=None):
+        series = self.costs.get(component_id)
+        if series is None:
+            return [], []
+        return series.range(since, until, last)
+
+    def _cost_series(self):
+        with self._guard:
+            return list(self.costs.items())
+
+    def costs_at(self, timestamp=None):
+        values = ((cid, series.value_at(timestamp)) for cid, series in self._cost_series())
+        return {cid: value for cid, value in values if value is not None}
+
+    # Inventory is stored as InventoryRecords; models are built on the way out
+    def get_inventory(self, inventory_id):
+        record = self.inventory.get(inventory_id)
+        return record.to_model() if record is not None else None
+
+    def get_inventory_by_serial(self, serial_number):
+        record = self.inventory.get_by_serial(serial_number)
+        return record.to_model() if record is not None else None
+
+    def add_inventory(self, items):
+        self.inventory.add_many([InventoryRecord.from_item(item) for item in items])
+        return items
+
+    def update_inventory(self, item, changes):
+        record = self.inventory.get(item.id)
+        if record is None:
+            raise ValueError(f"Inventory {item.id} not found")
+        self.inventory.update(record, changes)
+        # Stored records are replaced, never changed; a model is the caller's copy
+        if item is not record:
+            for k, v in changes.items():
+                setattr(item, k, v)
+        return item
+
+    def delete_inventory(self, inventory_id):
+        return self.inventory.remove(inventory_id) is not None
+
+    def find_inventory(self, state=None, component_id=None):
+        return [record.to_model() for record in self.inventory.find(state=state, component_id=component_id)]
+
+    def scan_inventory(self, state=None, component_id=None, after=None):
+        scan = self.inventory.scan(state=state, component_id=component_id, after=after)
+        return ((seq, record.to_model()) for seq, record in scan)
+
+    def stock(self, component_ids, states=None):
+        return {cid: self.inventory.ledger.quantity(cid, states) for cid in component_ids}
+
+    def stock_by_state(self, component_id):
+        return self.inventory.ledger.by_state(component_id)
+
+    def stock_counts(self):
+        return self.inventory.counts()
+
+    def check_stock(self):
+        return self.inventory.check_ledger()
+
+    def component_rows(self):
+        for comp in self.list_components():
+            yield (comp.id, comp.vendor_name, comp.manufacturer_name, comp.cost, comp.failure_rate,
+                   comp.actual_lead_time, comp.estimated_lead_time_days)
+
+    def inventory_rows(self):
+        for _, item in self.inventory.scan():
+            yield item.id, item.component_id, item.state, item.quantity
+
+    def cost_rows(self):
+        for cid, series in self._cost_series():
+            timestamps, values = series.range()
+            for ts, value in zip(timestamps, values):
+                yield cid, ts, value
+
+    def get_hardware_revision(self, hwrev_id):
+        return self.hardware_revisions.get(hwrev_id)
+
+    def save_hardware_revision(self, hw):
+        with self._guard:
+            self.hardware_revisions[hw.id] = hw
+        return hw
+
+    def delete_hardware_revision(self, hwrev_id):
+        with self._guard:
+            return self.hardware_revisions.pop(hwrev_id, None) is not None
+
+    def list_hardware_revisions(self):
+        with self._guard:
+            return list(self.hardware_revisions.values())
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS components (
+    id TEXT PRIMARY KEY,
+    estimated_lead_time TEXT,
+    actual_lead_time INTEGER,
+    failure_rate REAL,
+    data TEXT NOT NULL,
+    estimated_lead_time_days REAL
+);
+CREATE TABLE IF NOT EXISTS costs (
+    component_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS costs_component_ts ON costs (component_id, ts);
+CREATE TABLE IF NOT EXISTS inventory (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    component_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    serial_number TEXT UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inventory_component_state ON inventory (component_id, state);
+CREATE INDEX IF NOT EXISTS inventory_state ON inventory (state);
+CREATE TABLE IF NOT EXISTS hardware_revisions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    ts REAL NOT NULL,
+    item_id TEXT NOT NULL,
+    component_id TEXT,
+    from_state TEXT,
+    to_state TEXT,
+    quantity INTEGER NOT NULL,
+    actor TEXT,
+    parent_id TEXT
+);
+CREATE TABLE IF NOT EXISTS store_versions (
+    store TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_versions VALUES ('components', 0), ('inventory', 0), ('hardware_revisions', 0);
+"""
+# Triggers bump a store's version on every write to its tables, so every
+# process sees every other process's changes. Transition events count as
+# inventory, as reports derived from them are cached against it.
+_VERSIONED_TABLES = {"components": "components", "costs": "components", "inventory": "inventory",
+                     "transitions": "inventory", "hardware_revisions": "hardware_revisions"}
+_SCHEMA += "".join(
+    f"CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table} "
+    f"BEGIN UPDATE store_versions SET version = version + 1 WHERE store = '{store}'; END;\n"
+    for table, store in _VERSIONED_TABLES.items() for event in ("INSERT", "UPDATE", "DELETE")
+)
+
+
+class SqliteRepository(Repository):
+    """SQLite storage in WAL mode, shareable by several processes on one box.
+
+    Each thread gets its own connection. Queries are parameterized so the
+    connection's statement cache reuses the prepared statements. Records are
+    stored as model JSON plus the columns that are filtered or aggregated on.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+        self._migrate()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, serializing writers across processes
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def in_transaction(self):
+        return self._conn().in_transaction
+
+    def _migrate(self):
+        # Databases created before estimated lead times were parsed get the
+        # column and have it filled from the stored text
+        conn = self._conn()
+        with self.transaction():
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(components)")}
+            if "estimated_lead_time_days" not in columns:
+                conn.execute("ALTER TABLE components ADD COLUMN estimated_lead_time_days REAL")
+                rows = conn.execute("SELECT id, estimated_lead_time FROM components").fetchall()
+                conn.executemany("UPDATE components SET estimated_lead_time_days = ? WHERE id = ?",
+                                 [(parse_lead_time(text), cid) for cid, text in rows])
+            # Report queries sort by value, then id; these indexes deliver that order
+            conn.execute("DROP INDEX IF EXISTS components_failure_rate")
+            for column in ("failure_rate", *LEAD_TIME_KINDS.values()):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS components_{column}_id ON components ({column}, id)")
+
+    def store_versions(self):
+        return dict(self._conn().execute("SELECT store, version FROM store_versions"))
+
+    def get_component(self, component_id):
+        row = self._conn().execute("SELECT data FROM components WHERE id = ?", (component_id,)).fetchone()
+        return Component.model_validate_json(row[0]) if row else None
+
+    def save_component(self, component):
+        self._conn().execute(
+            "INSERT INTO components (id, estimated_lead_time, estimated_lead_time_days, actual_lead_time, failure_rate, data) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET estimated_lead_time = excluded.estimated_lead_time, "
+            "estimated_lead_time_days = excluded.estimated_lead_time_days, "
+            "actual_lead_time = excluded.actual_lead_time, failure_rate = excluded.failure_rate, data = excluded.data",
+            (component.id, component.estimated_lead_time, component.estimated_lead_time_days, component.actual_lead_time,
+             component.failure_rate, component.model_dump_json()),
+        )
+        return component
+
+    def delete_component(self, component_id):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM costs WHERE component_id = ?", (component_id,))
+            return conn.execute("DELETE FROM components WHERE id = ?", (component_id,)).rowcount > 0
+
+    def list_components(self):
+        rows = self._conn().execute("SELECT data FROM components ORDER BY rowid")
+        return [Component.model_validate_json(data) for (data,) in rows]
+
+    def lead_time_report(self, by=None, min_days=None, max_days=None, descending=False, limit=None):
+        sql = "SELECT id, estimated_lead_time, estimated_lead_time_days, actual_lead_time FROM components"
+        if by is None:
+            rows = self._conn().execute(sql + " ORDER BY rowid")
+        else:
+            column = LEAD_TIME_KINDS[by]
+            direction = "DESC" if descending else "ASC"
+            # Same bounds and tie order as the in-memory indexes; answered from the column's index
+            rows = self._conn().execute(
+                f"{sql} WHERE {column} > ? AND {column} >= ? AND {column} <= ? "
+                f"ORDER BY {column} {direction}, id {direction} LIMIT ?",
+                (0 if by == "actual" else float("-inf"),
+                 float("-inf") if min_days is None else min_days,
+                 float("inf") if max_days is None else max_days,
+                 -1 if limit is None else limit),
+            )
+        return [_lead_time_entry(*row) for row in rows]
+
+    def failure_rate_report(self, threshold, limit=None):
+        rows = self._conn().execute(
+            "SELECT id, failure_rate FROM components WHERE failure_rate >= ? "
+            "ORDER BY failure_rate DESC, id DESC LIMIT ?",
+            (float("-inf") if threshold is None else threshold, -1 if limit is None else limit),
+        )
+        return [{"component_id": cid, "failure_rate": rate} for cid, rate in rows]
+
+    def add_cost(self, component_id, value, timestamp):
+        self._conn().execute("INSERT INTO costs (component_id, ts, value) VALUES (?, ?, ?)", (component_id, timestamp, value))
+
+    def cost_series(self, component_id, since=None, until=None, last=None):
+        sql, params = "SELECT ts, value FROM costs WHERE component_id = ?", [component_id]
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            params.append(until)
+        if last is not None:
+            # Newest first through the index, then back into time order
+            rows = self._conn().execute(sql + " ORDER BY ts DESC, rowid DESC LIMIT ?", params + [last]).fetchall()[::-1]
+        else:
+            rows = self._conn().execute(sql + " ORDER BY ts, rowid", params).fetchall()
+        return [ts for ts, _ in rows], [value for _, value in rows]
+
+    def costs_at(self, timestamp=None):
+        # SQLite returns the bare value column from the row holding MAX(ts)
+        sql, params = "SELECT component_id, value, MAX(ts) FROM costs", []
+        if timestamp is not None:
+            sql += " WHERE ts <= ?"
+            params.append(timestamp)
+        return {cid: value for cid, value, _ in self._conn().execute(sql + " GROUP BY component_id", params)}
+
+    def _inventory_row(self, item):
+        return (item.id, item.component_id, item.state, item.quantity, item.serial_number, item.model_dump_json())
+
+    def get_inventory(self, inventory_id):
+        row = self._conn().execute("SELECT data FROM inventory WHERE id = ?", (inventory_id,)).fetchone()
+        return Inventory.model_validate_json(row[0]) if row else None
+
+    def get_inventory_by_serial(self, serial_number):
+        row = self._conn().execute(
+            "SELECT data FROM inventory WHERE serial_number = ?", (serial_number,)
+        ).fetchone()
+        return Inventory.model_validate_json(row[0]) if row else None
+
+    def add_inventory(self, items):
+        try:
+            with self.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO inventory (id, component_id, state, quantity, serial_number, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [self._inventory_row(item) for item in items],
+                )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Inventory conflicts with an existing id or serial_number: {e}")
+        return items
+
+    def update_inventory(self, item, changes):
+        for k, v in changes.items():
+            setattr(item, k, v)
+        row = self._inventory_row(item)
+        try:
+            self._conn().execute(
+                "UPDATE inventory SET component_id = ?, state = ?, quantity = ?, serial_number = ?, data = ? "
+                "WHERE id = ?",
+                row[1:] + row[:1],
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"serial_number {item.serial_number} is already in use")
+        return item
+
+    def delete_inventory(self, inventory_id):
+        return self._conn().execute("DELETE FROM inventory WHERE id = ?", (inventory_id,)).rowcount > 0
+
+    @staticmethod
+    def _inventory_filter(state, component_id):
+        clauses, params = [], []
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if component_id:
+            clauses.append("component_id = ?")
+            params.append(component_id)
+        return clauses, params
+
+    def find_inventory(self, state=None, component_id=None):
+        clauses, params = self._inventory_filter(state, component_id)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._conn().execute(f"SELECT data FROM inventory {where}ORDER BY seq", params)
+        return [Inventory.model_validate_json(data) for (data,) in rows]
+
+    def scan_inventory(self, state=None, component_id=None, after=None, page_size=500):
+        # Reads in keyset-paginated pages, each on the calling thread's own
+        # connection, so the generator can be resumed from any thread
+        clauses, params = self._inventory_filter(state, component_id)
+        sql = f"SELECT seq, data FROM inventory WHERE {' AND '.join(clauses + ['seq > ?'])} ORDER BY seq LIMIT ?"
+        after = after or 0
+        while True:
+            rows = self._conn().execute(sql, params + [after, page_size]).fetchall()
+            for seq, data in rows:
+                yield seq, Inventory.model_validate_json(data)
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def stock(self, component_ids, states=None):
+        component_ids = list(component_ids)
+        totals = dict.fromkeys(component_ids, 0)
+        if not component_ids:
+            return totals
+        sql = f"SELECT component_id, SUM(quantity) FROM inventory WHERE component_id IN ({','.join('?' * len(component_ids))})"
+        params = list(component_ids)
+        if states is not None:
+            sql += f" AND state IN ({','.join('?' * len(states))})"
+            params.extend(states)
+        for cid, qty in self._conn().execute(sql + " GROUP BY component_id", params):
+            totals[cid] = qty
+        return totals
+
+    def stock_by_state(self, component_id):
+        rows = self._conn().execute(
+            "SELECT state, SUM(quantity) FROM inventory WHERE component_id = ? GROUP BY state", (component_id,)
+        )
+        return dict(rows.fetchall())
+
+    def stock_counts(self):
+        rows = self._conn().execute("SELECT component_id, state, SUM(quantity) FROM inventory GROUP BY component_id, state")
+        return {(cid, state): qty for cid, state, qty in rows}
+
+    def check_stock(self):
+        # Stock is aggregated from the rows on every read, so it cannot drift
+        return {}
+
+    def component_rows(self):
+        # Fields not kept in columns are read from the JSON without parsing the model
+        yield from self._conn().execute(
+            "SELECT id, json_extract(data, '$.vendor_name'), json_extract(data, '$.manufacturer_name'), "
+            "json_extract(data, '$.cost'), failure_rate, actual_lead_time, estimated_lead_time_days "
+            "FROM components ORDER BY rowid"
+        )
+
+    def inventory_rows(self):
+        yield from self._conn().execute("SELECT id, component_id, state, quantity FROM inventory ORDER BY seq")
+
+    def cost_rows(self):
+        yield from self._conn().execute("SELECT component_id, ts, value FROM costs ORDER BY component_id, ts, rowid")
+
+    def get_hardware_revision(self, hwrev_id):
+        row = self._conn().execute("SELECT data FROM hardware_revisions WHERE id = ?", (hwrev_id,)).fetchone()
+        return HardwareRevision.model_validate_json(row[0]) if row else None
+
+    def save_hardware_revision(self, hw):
+        self._conn().execute(
+            "INSERT INTO hardware_revisions (id, data) VALUES (?, ?) ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+            (hw.id, hw.model_dump_json()),
+        )
+        return hw
+
+    def delete_hardware_revision(self, hwrev_id):
+        return self._conn().execute("DELETE FROM hardware_revisions WHERE id = ?", (hwrev_id,)).rowcount > 0
+
+    def list_hardware_revisions(self):
+        rows = self._conn().execute("SELECT data FROM hardware_revisions ORDER BY rowid")
+        return [HardwareRevision.model_validate_json(data) for (data,) in rows]
+
+    def append_transitions(self, rows):
+        # Inserted in the caller's transaction, if any; SQLite serializes
+        # writers, so seq follows commit order across processes
+        self._conn().executemany(
+            "INSERT INTO transitions (kind, ts, item_id, component_id, from_state, to_state, quantity, actor, "
+            "parent_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def transitions(self, after=0):
+        yield from self._conn().execute(
+            "SELECT seq, kind, ts, item_id, component_id, from_state, to_state, quantity, actor, parent_id "
+            "FROM transitions WHERE seq > ? ORDER BY seq", (after,)
+        )
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
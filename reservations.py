@@ -0,0 +1,143 @@
+import heapq
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from models import Reservation
+from operations import (
+    get_repository, component_lock, list_inventory, get_inventory, update_inventory,
+    get_leaf_requirements, can_merge, merge_inventory, _generate_id
+)
+
+# Reserving moves free units into the allocated state; releasing moves them back
+FREE_STATE = "on-hand-ready"
+RESERVED_STATE = "allocated"
+DEFAULT_TTL = 15 * 60  # seconds
+
+reservations_store = {}
+_expiry_heap = []  # (expires_at, reservation_id), cleaned up lazily
+_registry_lock = threading.Lock()
+
+
+class InsufficientStockError(ValueError):
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Insufficient stock: {missing}")
+
+
+def _claim(component_id, quantity):
+    # Moves `quantity` free units to the reserved state; the caller holds the component lock
+    lines = []
+    remaining = quantity
+    for lot in list_inventory(state=FREE_STATE, component_id=component_id):
+        take = min(lot.quantity, remaining)
+        part = update_inventory(lot.id, {"state": RESERVED_STATE}, quantity=take)
+        lines.append({"inventory_id": part.id, "component_id": component_id, "quantity": take})
+        remaining -= take
+        if not remaining:
+            break
+    return lines
+
+
+def reserve_inventory(requirements, ttl=DEFAULT_TTL, hwrev_id=None):
+    # Atomically claims {component_id: quantity}; either every line is reserved or none is
+    expire_reservations()
+    repository = get_repository()
+    with ExitStack() as stack:
+        # Locks are always taken in sorted order so multi-component claims cannot deadlock
+        for cid in sorted(requirements):
+            stack.enter_context(component_lock(cid))
+        stack.enter_context(repository.transaction())
+        stock = repository.stock(requirements, [FREE_STATE])
+        missing = []
+        for cid, qty in requirements.items():
+            free = stock[cid]
+            if free < qty:
+                missing.append({"component_id": cid, "required": qty, "available": free})
+        if missing:
+            raise InsufficientStockError(missing)
+        lines = []
+        for cid, qty in requirements.items():
+            lines.extend(_claim(cid, qty))
+    now = datetime.now()
+    reservation = Reservation(
+        id=_generate_id("RES"),
+        hwrev_id=hwrev_id,
+        lines=lines,
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl) if ttl else None,
+    )
+    with _registry_lock:
+        reservations_store[reservation.id] = reservation
+        if reservation.expires_at:
+            heapq.heappush(_expiry_heap, (reservation.expires_at, reservation.id))
+    return reservation
+
+
+def reserve_component(component_id, quantity, ttl=DEFAULT_TTL):
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    return reserve_inventory({component_id: quantity}, ttl=ttl)
+
+
+def reserve_hardware_revision(hwrev_id, builds=1, ttl=DEFAULT_TTL):
+    # Reserves the leaf components of `builds` units, sub-assemblies included
+    leaves = get_leaf_requirements(hwrev_id)
+    if leaves is None:
+        return None
+    if builds < 1:
+        raise ValueError("builds must be at least 1")
+    requirements = {cid: qty * builds for cid, qty in leaves.items()}
+    return reserve_inventory(requirements, ttl=ttl, hwrev_id=hwrev_id)
+
+
+def get_reservation(reservation_id):
+    return reservations_store.get(reservation_id)
+
+
+def list_reservations():
+    return list(reservations_store.values())
+
+
+def _release_lines(lines):
+    # Released units go back into a free lot when there is one to take them,
+    # so reserve/release cycles do not leave stock split into many small lots
+    for line in lines:
+        with component_lock(line["component_id"]):
+            inv = get_inventory(line["inventory_id"])
+            if inv and inv.state == RESERVED_STATE:
+                inv = update_inventory(inv.id, {"state": FREE_STATE})
+                target = next((lot for lot in list_inventory(state=FREE_STATE, component_id=inv.component_id)
+                               if can_merge(inv, lot)), None)
+                if target is not None:
+                    merge_inventory(inv.id, target.id)
+
+
+def release_reservation(reservation_id):
+    # Returns the reserved units to free stock
+    with _registry_lock:
+        reservation = reservations_store.pop(reservation_id, None)
+    if not reservation:
+        return False
+    _release_lines(reservation.lines)
+    return True
+
+
+def confirm_reservation(reservation_id):
+    # Keeps the units allocated for good; the reservation no longer expires
+    with _registry_lock:
+        return reservations_store.pop(reservation_id, None)
+
+
+def expire_reservations(now=None):
+    # Releases every reservation whose TTL has passed; returns how many were released
+    now = now or datetime.now()
+    expired = []
+    with _registry_lock:
+        while _expiry_heap and _expiry_heap[0][0] <= now:
+            expires_at, reservation_id = heapq.heappop(_expiry_heap)
+            reservation = reservations_store.get(reservation_id)
+            if reservation and reservation.expires_at == expires_at:
+                expired.append(reservations_store.pop(reservation_id))
+    for reservation in expired:
+        _release_lines(reservation.lines)
+    return len(expired)
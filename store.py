@@ -0,0 +1,384 @@
+import bisect
+import operator
+import sys
+import threading
+from models import Inventory
+
+INVENTORY_FIELDS = tuple(Inventory.model_fields)
+# Fields holding lists, stored as None while empty
+_LIST_FIELDS = ("state_history", "sub_items")
+
+
+class InventoryRecord:
+    """The stored form of an Inventory lot.
+
+    A slotted object holds the fields directly, without the per-instance
+    dict and validation state of a Pydantic model, so a lot costs about a
+    third of the memory. Component ids and states are interned and empty
+    lists are kept as None. Records are built from models that were already
+    validated and turned back into models (without revalidating) only when
+    they leave the repository.
+    """
+
+    __slots__ = INVENTORY_FIELDS
+
+    def __init__(self, *values):
+        for name, value in zip(INVENTORY_FIELDS, values):
+            setattr(self, name, value)
+
+    def __setattr__(self, name, value):
+        if name in ("component_id", "state") and value is not None:
+            value = sys.intern(value)
+        elif name in _LIST_FIELDS and not value:
+            value = None
+        object.__setattr__(self, name, value)
+
+    def copy(self):
+        return InventoryRecord(*_get_fields(self))
+
+    @classmethod
+    def from_item(cls, item):
+        if isinstance(item, cls):
+            return item
+        return cls(*(getattr(item, name) for name in INVENTORY_FIELDS))
+
+    def to_model(self):
+        # What Inventory.model_construct does, minus its per-call overhead
+        values = dict(zip(INVENTORY_FIELDS, _get_fields(self)))
+        for name in _LIST_FIELDS:
+            values[name] = list(values[name] or ())
+        item = _new_inventory(Inventory)
+        _set(item, "__dict__", values)
+        _set(item, "__pydantic_fields_set__", set(INVENTORY_FIELDS))
+        _set(item, "__pydantic_extra__", None)
+        _set(item, "__pydantic_private__", None)
+        return item
+
+
+_get_fields = operator.attrgetter(*INVENTORY_FIELDS)
+_new_inventory = Inventory.__new__
+_set = object.__setattr__
+
+
+class StockLedger:
+    """Running inventory quantity per (component_id, state).
+
+    Counters are adjusted incrementally by InventoryStore, so availability
+    checks read a handful of counters instead of summing inventory records.
+    """
+
+    def __init__(self):
+        self._counts = {}
+
+    @classmethod
+    def from_items(cls, items):
+        # Rebuilds the counters from scratch, for consistency checks
+        ledger = cls()
+        for item in items:
+            ledger.adjust(item.component_id, item.state, item.quantity)
+        return ledger
+
+    def adjust(self, component_id, state, delta):
+        states = self._counts.setdefault(component_id, {})
+        qty = states.get(state, 0) + delta
+        if qty:
+            states[state] = qty
+        else:
+            states.pop(state, None)
+            if not states:
+                del self._counts[component_id]
+
+    def quantity(self, component_id, states=None):
+        counts = self._counts.get(component_id, {})
+        if states is None:
+            return sum(counts.values())
+        return sum(counts.get(state, 0) for state in states)
+
+    def by_state(self, component_id):
+        return dict(self._counts.get(component_id, {}))
+
+    def counts(self):
+        return {
+            (component_id, state): qty
+            for component_id, states in self._counts.items()
+            for state, qty in states.items()
+        }
+
+    def diff(self, other):
+        # Returns {(component_id, state): (self_qty, other_qty)} for mismatches
+        mine, theirs = self.counts(), other.counts()
+        return {
+            key: (mine.get(key, 0), theirs.get(key, 0))
+            for key in mine.keys() | theirs.keys()
+            if mine.get(key, 0) != theirs.get(key, 0)
+        }
+
+
+class SortedIndex:
+    """Record ids ordered by a numeric key, for range and top-K queries.
+
+    (key, id) pairs are kept in a sorted list maintained with bisect, next to
+    an id -> key dict so a record's old position can be found when its key
+    changes. A range query is two binary searches and a slice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, item_id, key):
+        # A None key removes the record from the index
+        with self._lock:
+            old = self._keys.pop(item_id, None)
+            if old is not None:
+                del self._entries[bisect.bisect_left(self._entries, (old, item_id))]
+            if key is not None:
+                bisect.insort(self._entries, (key, item_id))
+                self._keys[item_id] = key
+
+    def discard(self, item_id):
+        self.set(item_id, None)
+
+    def range(self, low=None, high=None, descending=False, limit=None):
+        # (id, key) pairs with low <= key <= high, in key order (ties by id)
+        with self._lock:
+            return self._range(low, high, descending, limit)
+
+    def _range(self, low, high, descending, limit):
+        entries = self._entries
+        lo = bisect.bisect_left(entries, low, key=lambda e: e[0]) if low is not None else 0
+        hi = bisect.bisect_right(entries, high, key=lambda e: e[0]) if high is not None else len(entries)
+        if limit is not None:
+            if descending:
+                lo = max(lo, hi - limit)
+            else:
+                hi = min(hi, lo + limit)
+        selected = entries[lo:hi]
+        if descending:
+            selected.reverse()
+        return [(item_id, key) for key, item_id in selected]
+
+
+class _Bucket:
+    """Records in the order they entered an index bucket.
+
+    Besides the id -> (seq, record) dict, the bucket keeps an append-only list
+    of entry sequence numbers, which is sorted by construction, so a cursor
+    (the last seq a reader saw) can be resumed with a binary search. Removed
+    entries stay in the list until compaction and are skipped when scanning.
+    """
+
+    __slots__ = ("entries", "seqs", "ids")
+
+    def __init__(self):
+        self.entries = {}
+        self.seqs = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, seq, item):
+        self.entries[item.id] = (seq, item)
+        self.seqs.append(seq)
+        self.ids.append(item.id)
+
+    def replace(self, item):
+        # Swaps in a new version of a record, keeping its place
+        seq, _ = self.entries[item.id]
+        self.entries[item.id] = (seq, item)
+
+    def remove(self, item_id):
+        self.entries.pop(item_id, None)
+        if len(self.seqs) > 2 * len(self.entries) + 64:
+            live = [(seq, item_id) for seq, item_id in zip(self.seqs, self.ids)
+                    if self.entries.get(item_id, (None,))[0] == seq]
+            # New lists, so scans already running keep their own copies
+            self.seqs = [seq for seq, _ in live]
+            self.ids = [item_id for _, item_id in live]
+
+    def values(self):
+        return [item for _, item in self.entries.values()]
+
+    def scan(self, after=None):
+        # Yields (seq, record) for live entries after the cursor, lock-free
+        seqs, ids, entries = self.seqs, self.ids, self.entries
+        i = bisect.bisect_right(seqs, after) if after is not None else 0
+        while i < len(seqs):
+            entry = entries.get(ids[i])
+            if entry is not None and entry[0] == seqs[i]:
+                yield entry
+            i += 1
+
+
+class InventoryStore:
+    """InventoryRecords keyed by id, with secondary indexes.
+
+    Records are indexed by component_id, by state and by (component_id, state),
+    and serial numbers are unique. Index buckets keep the order in which
+    records entered them and can be scanned from a cursor, which gives stable
+    pagination. All changes to indexed fields must go through
+    add/update/remove so the indexes and the stock ledger stay in sync. An
+    internal lock keeps the index structures consistent under concurrent
+    writers; callers still need their own locking for read-modify-write
+    sequences spanning several calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ledger = StockLedger()
+        self._items = {}
+        self._buckets = {("all",): _Bucket()}
+        self._by_serial = {}
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item_id):
+        return item_id in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def get(self, item_id, default=None):
+        return self._items.get(item_id, default)
+
+    def values(self):
+        # A list, so callers can iterate while other threads write
+        with self._lock:
+            return list(self._items.values())
+
+    def get_by_serial(self, serial_number):
+        return self._by_serial.get(serial_number)
+
+    @staticmethod
+    def _bucket_key(state=None, component_id=None):
+        if state and component_id:
+            return ("component_state", component_id, state)
+        if state:
+            return ("state", state)
+        if component_id:
+            return ("component", component_id)
+        return ("all",)
+
+    def find(self, state=None, component_id=None):
+        # Returns the matching records without scanning the whole store
+        with self._lock:
+            bucket = self._buckets.get(self._bucket_key(state, component_id))
+            return bucket.values() if bucket is not None else []
+
+    def scan(self, state=None, component_id=None, after=None):
+        # Lazily yields (cursor, record) pairs in a stable order, resuming
+        # after a cursor returned by an earlier scan with the same filters
+        bucket = self._buckets.get(self._bucket_key(state, component_id))
+        if bucket is None:
+            return iter(())
+        return bucket.scan(after)
+
+    def counts(self):
+        # {(component_id, state): quantity}, read under the lock the ledger is changed under
+        with self._lock:
+            return self.ledger.counts()
+
+    def check_ledger(self):
+        # Rebuilds the stock counters from the records and diffs them
+        with self._lock:
+            return self.ledger.diff(StockLedger.from_items(self._items.values()))
+
+    def add(self, item):
+        return self.add_many([item])[0]
+
+    def add_many(self, items):
+        # Adds a batch under one lock acquisition; rejects the batch on conflicts
+        with self._lock:
+            ids = {item.id for item in items}
+            if len(ids) < len(items) or any(item_id in self._items for item_id in ids):
+                raise ValueError("Inventory ids must be unique")
+            serials = [item.serial_number for item in items if item.serial_number]
+            if len(set(serials)) < len(serials):
+                raise ValueError("serial_number values must be unique")
+            for item in items:
+                self._check_serial(item.id, item.serial_number)
+            for item in items:
+                self._items[item.id] = item
+                for key in self._keys(item):
+                    self._enter(key, item)
+                if item.serial_number:
+                    self._by_serial[item.serial_number] = item
+                self.ledger.adjust(item.component_id, item.state, item.quantity)
+        return items
+
+    def update(self, item, changes):
+        # Replaces a stored record with a changed copy instead of changing it
+        # in place, so a reader holding the old record never sees it half
+        # updated. Records keep their place in buckets whose key is unchanged.
+        with self._lock:
+            if "serial_number" in changes:
+                self._check_serial(item.id, changes["serial_number"])
+            updated = item.copy()
+            for k, v in changes.items():
+                setattr(updated, k, v)
+            self.ledger.adjust(item.component_id, item.state, -item.quantity)
+            self.ledger.adjust(updated.component_id, updated.state, updated.quantity)
+            self._items[item.id] = updated
+            old_keys, new_keys = self._keys(item), self._keys(updated)
+            for key in old_keys:
+                if key in new_keys:
+                    self._buckets[key].replace(updated)
+                else:
+                    self._leave(key, item.id)
+            for key in new_keys:
+                if key not in old_keys:
+                    self._enter(key, updated)
+            if item.serial_number and self._by_serial.get(item.serial_number) is item:
+                del self._by_serial[item.serial_number]
+            if updated.serial_number:
+                self._by_serial[updated.serial_number] = updated
+        return updated
+
+    def remove(self, item_id):
+        with self._lock:
+            item = self._items.pop(item_id, None)
+            if item is not None:
+                for key in self._keys(item):
+                    self._leave(key, item_id)
+                if item.serial_number and self._by_serial.get(item.serial_number) is item:
+                    del self._by_serial[item.serial_number]
+                self.ledger.adjust(item.component_id, item.state, -item.quantity)
+        return item
+
+    def clear(self):
+        self.__init__()
+
+    def _check_serial(self, item_id, serial_number):
+        owner = self._by_serial.get(serial_number) if serial_number else None
+        if owner is not None and owner.id != item_id:
+            raise ValueError(f"serial_number {serial_number} is already in use")
+
+    @staticmethod
+    def _keys(item):
+        return (
+            ("all",),
+            ("component", item.component_id),
+            ("state", item.state),
+            ("component_state", item.component_id, item.state),
+        )
+
+    def _enter(self, key, item):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        self._seq += 1
+        bucket.add(self._seq, item)
+
+    def _leave(self, key, item_id):
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.remove(item_id)
+            if not bucket and key != ("all",):
+                del self._buckets[key]
@@ -0,0 +1,144 @@
+import pytest
+from models import Component, HardwareRevision, Inventory
+from repository import SqliteRepository
+from operations import (
+    create_component, update_component, update_component_cost, delete_component,
+    create_hardware_revision, update_hardware_revision, delete_hardware_revision,
+    explode_hardware_revision, verify_hardware_revision_inventory, bom_index,
+    get_leaf_requirements, get_where_used, reprice_component, create_inventory, list_inventory,
+    get_repository,
+)
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+def _component(name, cost, lead_time):
+    return create_component(Component(vendor_name="V", manufacturer_name="M", name=name, cost=cost,
+                                      estimated_lead_time=lead_time))
+
+
+def _revision(name, *lines):
+    return create_hardware_revision(HardwareRevision(name=name, components=list(lines)))
+
+
+def test_explode_nested_bom():
+    cpu = _component("cpu", 100.0, "2w")
+    ram = _component("ram", 10.0, "3d")
+    screw = _component("screw", None, "1d")
+    board = _revision("board", {"component_id": cpu.id, "quantity": 1}, {"component_id": ram.id, "quantity": 4})
+    chassis = _revision("chassis", {"component_id": screw.id, "quantity": 8})
+    server = _revision("server", {"hwrev_id": board.id, "quantity": 2}, {"hwrev_id": chassis.id},
+                       {"component_id": ram.id, "quantity": 2})
+    exploded = explode_hardware_revision(server.id)
+    assert exploded["components"] == sorted([
+        {"component_id": cpu.id, "quantity": 2}, {"component_id": ram.id, "quantity": 10},
+        {"component_id": screw.id, "quantity": 8},
+    ], key=lambda line: line["component_id"])
+    assert exploded["cost"] == 2 * (100.0 + 4 * 10.0) + 2 * 10.0
+    assert exploded["unpriced"] == [screw.id]
+    assert exploded["lead_time_days"] == 14.0
+    assert exploded["critical_path"] == [server.id, board.id, cpu.id]
+    # Leaf requirements also drive inventory verification
+    assert {m["component_id"]: m["required"] for m in verify_hardware_revision_inventory(server.id)} == {
+        cpu.id: 2, ram.id: 10, screw.id: 8
+    }
+    assert explode_hardware_revision("missing") is None
+
+
+def test_rollups_are_invalidated_incrementally():
+    cpu = _component("cpu", 100.0, "5d")
+    fan = _component("fan", 5.0, "1d")
+    board = _revision("board", {"component_id": cpu.id})
+    cooler = _revision("cooler", {"component_id": fan.id, "quantity": 2})
+    server = _revision("server", {"hwrev_id": board.id}, {"hwrev_id": cooler.id})
+    explode_hardware_revision(server.id)
+    cooler_rollup = bom_index._rollups[cooler.id]
+    assert update_component_cost(cpu.id, 150.0)
+    # Only the revisions above the component are recomputed
+    assert bom_index._rollups[cooler.id] is cooler_rollup
+    assert board.id not in bom_index._rollups and server.id not in bom_index._rollups
+    assert explode_hardware_revision(server.id)["cost"] == 160.0
+    update_component(fan.id, {"actual_lead_time": 30})
+    assert explode_hardware_revision(server.id)["critical_path"] == [server.id, cooler.id, fan.id]
+    update_hardware_revision(cooler.id, {"components": [{"component_id": fan.id, "quantity": 4}]})
+    assert explode_hardware_revision(server.id)["cost"] == 170.0
+    # Still used by the cooler, so only a cascading delete removes it
+    with pytest.raises(ValueError):
+        delete_component(fan.id)
+    assert delete_component(fan.id, cascade=True)
+    assert fan.id not in get_leaf_requirements(server.id)
+    assert explode_hardware_revision(server.id)["unpriced"] == []
+
+
+def test_creating_a_listed_component_refreshes_rollups():
+    board = _revision("board", {"component_id": "CX", "quantity": 2})
+    exploded = explode_hardware_revision(board.id)
+    assert (exploded["cost"], exploded["unpriced"]) == (0.0, ["CX"])
+    create_component(Component(id="CX", vendor_name="V", manufacturer_name="M", cost=5.0))
+    exploded = explode_hardware_revision(board.id)
+    assert (exploded["cost"], exploded["unpriced"]) == (10.0, [])
+
+
+def test_subassembly_references_are_checked():
+    cpu = _component("cpu", 1.0, None)
+    board = _revision("board", {"component_id": cpu.id})
+    server = _revision("server", {"hwrev_id": board.id})
+    with pytest.raises(ValueError):
+        _revision("bad", {"hwrev_id": "missing"})
+    with pytest.raises(ValueError):
+        _revision("bad", {"component_id": cpu.id, "hwrev_id": board.id})
+    with pytest.raises(ValueError):
+        update_hardware_revision(board.id, {"components": [{"hwrev_id": server.id}]})
+    with pytest.raises(ValueError):
+        update_hardware_revision(board.id, {"components": [{"hwrev_id": board.id}]})
+    with pytest.raises(ValueError):
+        delete_hardware_revision(board.id)
+    for quantity in (None, "two", 1.5, True, 0):
+        with pytest.raises(ValueError):
+            _revision("bad", {"component_id": cpu.id, "quantity": quantity})
+    assert _revision("str-qty", {"component_id": cpu.id, "quantity": "2"}).components[0]["quantity"] == 2
+    assert delete_hardware_revision(server.id)
+    assert delete_hardware_revision(board.id)
+
+
+def test_where_used_and_cost_impact():
+    fan = _component("fan", 5.0, None)
+    other = _component("other", 1.0, None)
+    cooler = _revision("cooler", {"component_id": fan.id, "quantity": 2})
+    server = _revision("server", {"hwrev_id": cooler.id, "quantity": 3})
+    _revision("unrelated", {"component_id": other.id})
+    create_inventory(Inventory(component_id=fan.id, state="on-hand-ready", quantity=4))
+    used = get_where_used(fan.id)
+    assert [(r["hwrev_id"], r["direct"], r["quantity"]) for r in used["revisions"]] == sorted(
+        [(cooler.id, True, 2), (server.id, False, 6)])
+    assert used["stock"] == {"on-hand-ready": 4}
+    impact = reprice_component(fan.id, 7.0)
+    assert impact["component"].cost == 7.0
+    assert {r["hwrev_id"]: (r["old_cost"], r["new_cost"]) for r in impact["revisions"]} == {
+        cooler.id: (10.0, 14.0), server.id: (30.0, 42.0)}
+    assert reprice_component("missing", 1.0) is None
+    # A cascading delete removes the inventory and the BOM lines too
+    assert delete_component(fan.id, cascade=True)
+    assert list_inventory(component_id=fan.id) == []
+    assert get_leaf_requirements(server.id) == {}
+    assert get_where_used(fan.id)["revisions"] == []
+
+
+def test_index_follows_other_processes_on_a_shared_store(backend):
+    if backend != "sqlite":
+        pytest.skip("only SQLite is shared between processes")
+    fan = _component("fan", 5.0, "1w")
+    board = _revision("board", {"component_id": fan.id, "quantity": 2})
+    assert explode_hardware_revision(board.id)["cost"] == 10.0
+    # Another worker adds a revision, edits one and reprices a component
+    other = SqliteRepository(get_repository().path)
+    other.save_hardware_revision(HardwareRevision(id="HW-OTHER", name="other", components=[
+        {"component_id": fan.id, "quantity": 1}]))
+    other.save_hardware_revision(HardwareRevision(id=board.id, name="board", components=[
+        {"component_id": fan.id, "quantity": 3}]))
+    other.save_component(fan.model_copy(update={"cost": 6.0}))
+    other.close()
+    assert verify_hardware_revision_inventory("HW-OTHER") == [
+        {"component_id": fan.id, "required": 1, "available": 0}]
+    assert explode_hardware_revision(board.id)["cost"] == 18.0
+    assert {rev["hwrev_id"] for rev in get_where_used(fan.id)["revisions"]} == {board.id, "HW-OTHER"}
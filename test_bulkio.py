@@ -0,0 +1,66 @@
+import json
+import pytest
+from bulkio import import_file, export_file, infer_kind
+from operations import get_component, get_inventory, iter_inventory, get_repository
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+def test_infer_kind():
+    assert infer_kind("data/components-2024.csv") == "components"
+    assert infer_kind("INVENTORY.jsonl") == "inventory"
+    with pytest.raises(ValueError):
+        infer_kind("parts.csv")
+
+
+def test_import_csv_with_rejects(tmp_path):
+    path = tmp_path / "components.csv"
+    path.write_text(
+        "id,vendor_name,manufacturer_name,estimated_lead_time,failure_rate\n"
+        "bio-c1,VendorA,ManuA,2w,0.01\n"
+        "bio-c2,VendorB,ManuB,,-1\n"
+        "bio-c3,VendorA,ManuC,5d,\n"
+    )
+    stats = import_file(str(path), chunk_size=2)
+    assert (stats["rows"], stats["imported"], stats["rejected"]) == (3, 2, 1)
+    assert get_component("bio-c1").estimated_lead_time_days == 14
+    assert get_component("bio-c3").failure_rate == 0.0
+    assert get_component("bio-c2") is None
+    rejects = [json.loads(line) for line in open(stats["rejects_path"])]
+    assert len(rejects) == 1
+    assert rejects[0]["line"] == 3 and rejects[0]["row"]["id"] == "bio-c2"
+
+
+def test_import_jsonl_rejects_bad_lines_and_duplicates(tmp_path):
+    path = tmp_path / "inventory.jsonl"
+    path.write_text(
+        '{"id": "bio-i1", "component_id": "bio-c1", "state": "received", "quantity": 3}\n'
+        "not json\n"
+        "\n"
+        '{"id": "bio-i1", "component_id": "bio-c1", "state": "received"}\n'
+        '{"component_id": "bio-c1", "state": "nowhere"}\n'
+        '{"component_id": "bio-c1", "state": "ordered", "quantity": 2}\n'
+    )
+    stats = import_file(str(path), rejects_path=str(tmp_path / "bad.jsonl"))
+    assert (stats["rows"], stats["imported"], stats["rejected"]) == (5, 2, 3)
+    assert get_inventory("bio-i1").quantity == 3
+    assert sorted(lot.state for _, lot in iter_inventory(component_id="bio-c1")) == ["ordered", "received"]
+    assert [json.loads(line)["line"] for line in open(tmp_path / "bad.jsonl")] == [2, 4, 5]
+
+
+def test_export_round_trip(tmp_path):
+    source = tmp_path / "components.jsonl"
+    source.write_text(
+        '{"id": "bio-c1", "vendor_name": "VendorA", "manufacturer_name": "ManuA", "cost": 2.5}\n'
+        '{"id": "bio-c2", "vendor_name": "VendorB", "manufacturer_name": "ManuB", "notes": "a, \\"b\\""}\n'
+    )
+    assert import_file(str(source))["rejected"] == 0
+    for name in ("components.csv", "components-out.jsonl"):
+        out = tmp_path / name
+        assert export_file(str(out))["rows"] == len(get_repository().list_components())
+        for comp in get_repository().list_components():
+            get_repository().delete_component(comp.id)
+        stats = import_file(str(out))
+        assert stats["rejected"] == 0
+        assert get_component("bio-c1").cost == 2.5
+        assert get_component("bio-c2").notes == 'a, "b"'
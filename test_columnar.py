@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from columnar import export_snapshot, load_table, load_dictionary, load_manifest
+from models import Component, Inventory
+from operations import (
+    create_component, create_inventory, transition_inventory, update_component_cost, get_repository
+)
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+def _decode(directory, table, column):
+    dictionary = load_dictionary(directory, load_manifest(directory)["tables"][table]["columns"][column])
+    return [None if code < 0 else str(dictionary[code]) for code in load_table(directory, table)[column]]
+
+
+def test_npy_snapshot_round_trip(tmp_path):
+    comp = create_component(Component(id="col-c1", vendor_name="VendorA", manufacturer_name="ManuA",
+                                      estimated_lead_time="2w", cost=1.5))
+    create_component(Component(id="col-c2", vendor_name="VendorA", manufacturer_name="ManuB"))
+    update_component_cost(comp.id, 2.5)
+    lot = create_inventory(Inventory(component_id="col-c1", state="ordered", quantity=4))[0]
+    create_inventory(Inventory(component_id="col-c2", state="received", quantity=2))
+    transition_inventory([{"inventory_id": lot.id, "state": "received", "quantity": 1}])
+
+    directory = str(tmp_path / "snap")
+    manifest = export_snapshot(directory, fmt="npy")
+    assert manifest["tables"]["components"]["rows"] == 2
+
+    components = load_table(directory, "components")
+    assert isinstance(components["cost"], np.memmap)
+    assert _decode(directory, "components", "component_id") == ["col-c1", "col-c2"]
+    assert _decode(directory, "components", "vendor_name") == ["VendorA", "VendorA"]
+    assert components["cost"][0] == 2.5 and np.isnan(components["cost"][1])
+    assert components["estimated_lead_time_days"][0] == 14
+
+    inventory = load_table(directory, "inventory")
+    stock = {}
+    for cid, state, qty in zip(_decode(directory, "inventory", "component_id"),
+                               _decode(directory, "inventory", "state"), inventory["quantity"]):
+        stock[cid, state] = stock.get((cid, state), 0) + int(qty)
+    assert stock == get_repository().stock_counts()
+
+    costs = load_table(directory, "costs")
+    points = [v for cid, v in zip(_decode(directory, "costs", "component_id"), costs["cost"]) if cid == "col-c1"]
+    assert points[-1] == 2.5
+
+    transitions = load_table(directory, "transitions")
+    moves = list(zip(_decode(directory, "transitions", "from_state"), _decode(directory, "transitions", "to_state"),
+                     transitions["quantity"]))
+    assert (None, "ordered", 4) in moves and ("ordered", "received", 1) in moves
+    assert np.all(np.diff(transitions["timestamp"]) >= 0)
+    # One dictionary per kind of value: the same component has the same code everywhere
+    assert set(inventory["component_id"]) <= set(components["component_id"])
+
+
+def test_snapshot_format_checks(tmp_path):
+    with pytest.raises(ValueError):
+        export_snapshot(str(tmp_path), fmt="csv")
+    with pytest.raises(ValueError):
+        export_snapshot(str(tmp_path), fmt="npy", tables=["parts"])
+
+
+def test_arrow_snapshot(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    create_component(Component(id="col-c1", vendor_name="VendorA", manufacturer_name="ManuA"))
+    create_inventory(Inventory(component_id="col-c1", state="received", quantity=3))
+    directory = str(tmp_path / "snap")
+    export_snapshot(directory, fmt="arrow")
+    table = load_table(directory, "inventory")
+    assert pa.types.is_dictionary(table.schema.field("state").type)
+    assert table.column("state").to_pylist() == ["received"]
+    assert table.column("quantity").to_pylist() == [3]
@@ -0,0 +1,67 @@
+import random
+import time
+from events import TransitionLog
+
+
+def _replay(events, until):
+    counts = {}
+    for ts, cid, old, new, qty in events:
+        if ts > until:
+            break
+        for state, delta in ((old, -qty), (new, qty)):
+            if state:
+                counts[(cid, state)] = counts.get((cid, state), 0) + delta
+    return {key: qty for key, qty in counts.items() if qty}
+
+
+def test_counts_as_of_matches_full_replay():
+    log = TransitionLog(checkpoint_every=16)
+    rng = random.Random(7)
+    events = []
+    for n in range(500):
+        cid = f"comp-{rng.randrange(5)}"
+        old, new = rng.choice([(None, "ordered"), ("ordered", "received"), ("received", "failed"), ("received", None)])
+        qty = rng.randrange(1, 4)
+        log.record(f"INV-{n}", cid, old, new, qty, timestamp=float(n))
+        events.append((float(n), cid, old, new, qty))
+    for until in (-1.0, 0.0, 15.0, 16.0, 17.5, 250.0, 499.0, 1000.0):
+        expected = _replay(events, until)
+        assert log.counts_as_of(until) == expected
+        assert log.counts_as_of(until, component_id="comp-3") == {
+            key: qty for key, qty in expected.items() if key[0] == "comp-3"
+        }
+    assert log.counts_as_of(1000.0, component_id="unknown") == {}
+
+
+def test_record_change():
+    log = TransitionLog()
+    log.record("INV-1", "comp-a", None, "received", 5, timestamp=1.0)
+    log.record_change("INV-1", ("comp-a", "received", 5), ("comp-a", "setup", 3))
+    log.record_change("INV-1", ("comp-a", "setup", 3), ("comp-b", "setup", 3))
+    assert log.counts_as_of(time.time() + 1) == {("comp-b", "setup"): 3}
+    assert [(e["from_state"], e["to_state"], e["quantity"]) for e in log.timeline("INV-1")] == [
+        (None, "received", 5), ("received", "setup", 5), ("setup", None, 2), ("setup", None, 3), (None, "setup", 3)
+    ]
+
+
+def test_counts_as_of_is_fast_on_a_year_of_events():
+    log = TransitionLog()
+    start = time.time() - 365 * 86400
+    for n in range(200_000):
+        log.record(f"INV-{n % 20000}", f"comp-{n % 50}", None if n < 20000 else "received", "received", 1,
+                   timestamp=start + n * 150)
+    began = time.perf_counter()
+    for day in range(0, 365, 30):
+        log.counts_as_of(start + day * 86400 + 4095 * 150)
+    assert (time.perf_counter() - began) / 13 < 0.1
+
+
+def test_checkpoints_stay_small_with_many_keys():
+    log = TransitionLog(checkpoint_every=16)
+    for n in range(20000):
+        log.record(f"INV-{n}", f"comp-{n % 5000}", None, ("received", "setup")[n % 2], 1, timestamp=float(n))
+    # Each checkpoint covers at least as many events as it has keys
+    packed = sum(len(keys) + len(quantities) for keys, quantities in log._checkpoints) * 8
+    assert packed <= 16 * len(log)
+    assert log.counts_as_of(9999.0)[("comp-1", "setup")] == 2
+    assert log.counts_as_of(9999.0, component_id="comp-2") == {("comp-2", "received"): 2}
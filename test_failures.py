@@ -0,0 +1,72 @@
+import pytest
+from events import TransitionLog
+from failures import FailureStats, wilson_interval
+from models import Inventory
+from operations import get_repository, set_repository, create_inventory, get_failure_rate_report
+from repository import SqliteRepository
+
+DAY = 86400.0
+
+
+def test_counts_failures_against_exposed_units():
+    stats = FailureStats()
+    stats.on_event("I1", "C1", "allocated", "in-production", 10, 0.0)
+    stats.on_event("I1", "C1", "in-production", "failed", 2, 0.0)
+    # Failing before production also exposes the unit
+    stats.on_event("I1", "C1", "received", "failed", 1, 0.0)
+    stats.on_event("I1", "C1", "received", "setup", 5, 0.0)
+    counts = stats.counts(0.0)["C1"]
+    assert (counts["failed"], counts["exposed"]) == (3, 11)
+
+
+def test_rolling_windows_drop_old_days():
+    stats = FailureStats()
+    stats.on_event("I1", "C1", "allocated", "in-production", 4, 0.0)
+    stats.on_event("I1", "C1", "in-production", "failed", 1, 0.0)
+    stats.on_event("I1", "C1", "allocated", "in-production", 6, 40 * DAY)
+    assert stats.counts(40 * DAY)["C1"]["windows"] == {30: (0, 6), 90: (1, 10)}
+    assert stats.counts(100 * DAY)["C1"]["windows"] == {30: (0, 0), 90: (0, 6)}
+    assert stats.counts(500 * DAY)["C1"]["windows"] == {30: (0, 0), 90: (0, 0)}
+    # All-time counts are kept
+    assert stats.counts(500 * DAY)["C1"]["exposed"] == 10
+    stats.on_event("I1", "C1", "allocated", "in-production", 1, 501 * DAY)
+    assert stats.counts(501 * DAY)["C1"]["windows"] == {30: (0, 1), 90: (0, 1)}
+
+
+def test_windows_match_a_full_recount():
+    stats = FailureStats()
+    events = [(day * 7 % 200, day % 3 + 1) for day in range(300)]
+    for n, (day, qty) in enumerate(sorted(events)):
+        stats.on_event("I1", "C1", "allocated", "in-production", qty, day * DAY + n)
+    now = 199
+    windows = stats.counts(now * DAY)["C1"]["windows"]
+    for window in (30, 90):
+        assert windows[window][1] == sum(qty for day, qty in events if now - window < day <= now)
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (None, None)
+    low, high = wilson_interval(5, 100)
+    assert low < 0.05 < high
+    assert wilson_interval(0, 10)[0] == 0.0
+    assert wilson_interval(10, 10)[1] == pytest.approx(1.0)
+
+
+def test_counters_follow_other_workers_and_restarts(tmp_path):
+    path = str(tmp_path / "aim.db")
+    previous = get_repository()
+    set_repository(SqliteRepository(path))
+    try:
+        (lot,) = create_inventory(Inventory(component_id="C1", state="in-production", quantity=10))
+        # Another worker records failures in the shared store
+        other_log = TransitionLog()
+        other_log.attach(SqliteRepository(path).append_transitions, shared=True)
+        other_log.record(lot.id, "C1", "in-production", "failed", 2)
+        (entry,) = get_failure_rate_report(0.0, group_by="component")
+        assert (entry["failed"], entry["exposed"]) == (2, 10)
+        # A restarted worker rebuilds the counters from the stored events
+        set_repository(SqliteRepository(path))
+        (entry,) = get_failure_rate_report(0.0, group_by="component")
+        assert (entry["failed"], entry["exposed"], entry["last_30_days"]["failed"]) == (2, 10, 2)
+    finally:
+        set_repository(previous)
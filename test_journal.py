@@ -0,0 +1,181 @@
+import os
+from models import Component, Inventory, HardwareRevision
+from journal import JournaledRepository, WriteAheadLog
+
+
+def _state(repo):
+    return (
+        sorted((c.id, c.cost) for c in repo.list_components()),
+        sorted((i.id, i.state, i.quantity) for i in repo.find_inventory()),
+        sorted((hw.id, hw.name) for hw in repo.list_hardware_revisions()),
+        sorted((cid, tuple(map(list, repo.cost_series(cid)))) for cid in repo.costs),
+    )
+
+
+def _populate(repo, start, count):
+    for n in range(start, start + count):
+        repo.save_component(Component(id=f"C{n}", vendor_name="V", manufacturer_name="M", cost=n))
+        repo.add_cost(f"C{n}", float(n), 1000.0 + n)
+        repo.add_inventory([Inventory(id=f"I{n}", component_id=f"C{n}", state="received", quantity=n + 1)])
+    item = repo.get_inventory(f"I{start}")
+    repo.update_inventory(item, {"state": "setup"})
+    repo.delete_component(f"C{start + 1}")
+    repo.save_hardware_revision(HardwareRevision(id=f"HW{start}", name="Rev"))
+
+
+def test_replay_restores_stores(tmp_path):
+    repo = JournaledRepository(str(tmp_path), fsync="always")
+    _populate(repo, 0, 5)
+    expected = _state(repo)
+    repo.close()
+    reopened = JournaledRepository(str(tmp_path))
+    assert _state(reopened) == expected
+    assert reopened.stock_by_state("C0") == {"setup": 1}
+    reopened.close()
+
+
+def test_snapshot_then_log_tail(tmp_path):
+    repo = JournaledRepository(str(tmp_path), fsync="batch")
+    _populate(repo, 0, 5)
+    repo.snapshot()
+    _populate(repo, 10, 5)
+    expected = _state(repo)
+    repo.close()
+    files = sorted(os.listdir(tmp_path))
+    assert len([f for f in files if f.startswith("snapshot-")]) == 1
+    reopened = JournaledRepository(str(tmp_path))
+    assert _state(reopened) == expected
+    assert reopened.lsn == repo.lsn
+    reopened.close()
+
+
+def test_close_is_repeatable_and_writes_reopen_the_log(tmp_path):
+    repo = JournaledRepository(str(tmp_path), fsync="batch", batch_interval=60)
+    _populate(repo, 0, 3)
+    repo.close()
+    repo.close()
+    # A server restarted in the same process keeps writing to the segment
+    repo.save_component(Component(id="LATE", vendor_name="V", manufacturer_name="M"))
+    expected = _state(repo)
+    repo.close()
+    reopened = JournaledRepository(str(tmp_path))
+    assert _state(reopened) == expected
+    reopened.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    repo = JournaledRepository(str(tmp_path), fsync="always")
+    _populate(repo, 0, 3)
+    expected = _state(repo)
+    segment = repo._wal.path
+    repo.close()
+    with open(segment, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+    reopened = JournaledRepository(str(tmp_path))
+    assert _state(reopened) == expected
+    reopened.save_component(Component(id="C99", vendor_name="V", manufacturer_name="M"))
+    reopened.close()
+    recovered = JournaledRepository(str(tmp_path))
+    assert recovered.get_component("C99") is not None
+    recovered.close()
+
+
+def test_wal_read_stops_at_corrupt_frame(tmp_path):
+    path = str(tmp_path / "wal.log")
+    wal = WriteAheadLog(path, fsync="off")
+    for n in range(3):
+        wal.append((n, "op"))
+    wal.close()
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+    assert [r[0] for r in WriteAheadLog.read(path)] == [0, 1]
+
+
+def test_transition_history_survives_restarts(tmp_path):
+    from datetime import datetime
+    from operations import (
+        get_repository, set_repository, get_stock_as_of, create_inventory, transition_inventory,
+        get_inventory_history, get_transitions,
+    )
+    previous = get_repository()
+    repo = set_repository(JournaledRepository(str(tmp_path), fsync="batch"))
+    try:
+        (lot,) = create_inventory(Inventory(component_id="C1", state="received", quantity=10))
+        transition_inventory([{"inventory_id": lot.id, "state": "setup", "quantity": 4}])
+        before_restart = datetime.now()
+        expected = get_stock_as_of(before_restart)
+        for _ in range(2):
+            repo.close()
+            repo = set_repository(JournaledRepository(str(tmp_path)))
+            assert get_stock_as_of(before_restart) == expected == {("C1", "received"): 6, ("C1", "setup"): 4}
+        transition_inventory([{"inventory_id": lot.id, "state": "setup"}])
+        assert [(e["to_state"], e["quantity"]) for e in get_inventory_history(lot.id)] == [
+            ("received", 10), ("setup", 6)]
+        # The lot split off before the restarts still starts with its parent's history
+        part = next(e["inventory_id"] for e in get_transitions() if e["inventory_id"] != lot.id)
+        assert [(e["to_state"], e["quantity"]) for e in get_inventory_history(part)] == [
+            ("received", 10), ("setup", 4)]
+        assert get_stock_as_of(before_restart) == expected
+    finally:
+        set_repository(previous)
+        repo.close()
+
+
+def test_reloaded_store_seeds_the_transition_log(tmp_path):
+    import pytest
+    from datetime import datetime
+    from operations import get_repository, set_repository, get_stock_as_of, transition_inventory
+    from reports import valuation_report
+    previous = get_repository()
+    repo = set_repository(JournaledRepository(str(tmp_path), fsync="always"))
+    # Lots written straight to the store, as before events were stored
+    repo.save_component(Component(id="C1", vendor_name="V", manufacturer_name="M", cost=2.0))
+    repo.add_inventory([Inventory(id="I1", component_id="C1", state="received", quantity=10)])
+    before_restart = datetime.now()
+    repo.close()
+    try:
+        repo = set_repository(JournaledRepository(str(tmp_path)))
+        transition_inventory([{"inventory_id": "I1", "state": "setup"}])
+        assert get_stock_as_of(datetime.now()) == {("C1", "setup"): 10}
+        assert valuation_report(as_of=datetime.now())["total_value"] == 20.0
+        # History before the lots were seeded is not known, also after a restart
+        repo.close()
+        repo = set_repository(JournaledRepository(str(tmp_path)))
+        assert get_stock_as_of(datetime.now()) == {("C1", "setup"): 10}
+        with pytest.raises(ValueError):
+            get_stock_as_of(before_restart)
+        with pytest.raises(ValueError):
+            valuation_report(as_of=before_restart)
+    finally:
+        set_repository(previous)
+        repo.close()
+
+
+def test_snapshot_dumps_records_without_holding_the_write_lock(tmp_path, monkeypatch):
+    import threading
+    repo = JournaledRepository(str(tmp_path), fsync="off")
+    _populate(repo, 0, 3)
+    started, written = threading.Event(), threading.Event()
+    dump_row = JournaledRepository._inventory_row
+
+    def write_late():
+        repo.add_inventory([Inventory(id="LATE", component_id="C0", state="received", quantity=1)])
+        written.set()
+
+    def row(item):
+        # The first row dumped for the snapshot waits for a write to land
+        if not started.is_set():
+            started.set()
+            threading.Thread(target=write_late).start()
+            assert written.wait(5)
+        return dump_row(item)
+
+    monkeypatch.setattr(JournaledRepository, "_inventory_row", staticmethod(row))
+    repo.snapshot()
+    repo.close()
+    reopened = JournaledRepository(str(tmp_path))
+    # Written after the capture, so it comes back from the new log segment
+    assert reopened.get_inventory("LATE") is not None
+    assert len(reopened.find_inventory()) == 4
+    reopened.close()
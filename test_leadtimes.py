@@ -0,0 +1,111 @@
+import math
+import random
+import pytest
+from leadtimes import RunningStats, QuantileSketch, LeadTimeStats, summarize
+from events import TransitionLog
+from journal import JournaledRepository
+from repository import SqliteRepository
+from models import Component, Inventory
+from operations import (
+    get_repository, set_repository, create_component, create_inventory, update_inventory, get_lead_time_forecast,
+    get_lead_time_report,
+)
+
+DAY = 86400.0
+
+
+def test_running_stats_merge_matches_single_pass():
+    values = [random.Random(n).uniform(1, 30) for n in range(1000)]
+    whole, left, right = RunningStats(), RunningStats(), RunningStats()
+    for n, value in enumerate(values):
+        whole.add(value)
+        (left if n % 3 else right).add(value)
+    left.merge(right)
+    mean = sum(values) / len(values)
+    assert left.count == whole.count == 1000
+    assert left.mean == pytest.approx(mean) and whole.mean == pytest.approx(mean)
+    stddev = (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+    assert left.stddev == pytest.approx(stddev) and whole.stddev == pytest.approx(stddev)
+
+
+def test_quantile_sketch_relative_error():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(2, 0.8) for _ in range(20000))
+    sketch = QuantileSketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[math.ceil(q * len(values)) - 1]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+    assert len(sketch.buckets) < 1000
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_lead_times_follow_splits():
+    stats = LeadTimeStats()
+    stats.on_event("LOT", "C1", None, "ordered", 10, 0.0)
+    # Three units arrive early on a lot split off the order
+    stats.on_split("LOT", "PART", 3)
+    stats.on_event("PART", "C1", "ordered", "received", 3, 4 * DAY)
+    stats.on_event("LOT", "C1", "ordered", "received", 7, 10 * DAY)
+    summary = summarize(*stats.merged(["C1"]))
+    assert summary["count"] == 2 and summary["mean_days"] == pytest.approx(7.0)
+    assert summary["p50_days"] == pytest.approx(4.0, rel=0.01)
+    assert summary["p99_days"] == pytest.approx(10.0, rel=0.01)
+    assert summarize(*stats.merged(["C2"])) is None
+
+
+def test_removed_ordered_lots_are_forgotten():
+    stats = LeadTimeStats()
+    stats.on_event("LOT", "C1", None, "ordered", 10, 0.0)
+    stats.on_event("GONE", "C1", None, "ordered", 5, 0.0)
+    # Reducing a lot keeps its order time; deleting one drops it
+    stats.on_event("LOT", "C1", "ordered", None, 4, DAY)
+    stats.on_event("GONE", "C1", "ordered", None, 5, DAY)
+    assert stats.ordered_at("LOT") == 0.0
+    assert stats.ordered_at("GONE") is None
+    stats.on_split("LOT", "PART", 2)
+    stats.on_event("PART", "C1", "ordered", None, 2, DAY)
+    stats.on_event("LOT", "C1", "ordered", None, 4, DAY)
+    assert stats._ordered_at == {}
+
+
+def test_orders_placed_before_a_restart_are_timed(tmp_path):
+    previous = get_repository()
+    repo = set_repository(JournaledRepository(str(tmp_path)))
+    try:
+        create_component(Component(id="C1", vendor_name="V", manufacturer_name="M", estimated_lead_time="1w"))
+        (early,) = create_inventory(Inventory(component_id="C1", state="ordered", quantity=5))
+        (late,) = create_inventory(Inventory(component_id="C1", state="ordered", quantity=5))
+        update_inventory(early.id, {"state": "received"})
+        repo.close()
+        repo = set_repository(JournaledRepository(str(tmp_path)))
+        # The receipt before the restart counts, and the open order keeps its time
+        (entry,) = get_lead_time_report()
+        assert entry["observed"]["count"] == 1
+        (forecast,) = get_lead_time_forecast()
+        assert forecast["inventory_id"] == late.id and forecast["basis"] == "component"
+        assert forecast["ordered_at"] is not None
+        update_inventory(late.id, {"state": "received"})
+        (entry,) = get_lead_time_report()
+        assert entry["observed"]["count"] == 2
+    finally:
+        set_repository(previous)
+        repo.close()
+
+
+def test_receipts_recorded_by_other_workers_are_timed(tmp_path):
+    path = str(tmp_path / "aim.db")
+    previous = get_repository()
+    set_repository(SqliteRepository(path))
+    try:
+        create_component(Component(id="C1", vendor_name="V", manufacturer_name="M"))
+        (lot,) = create_inventory(Inventory(component_id="C1", state="ordered", quantity=5))
+        assert get_lead_time_report()[0]["observed"] is None
+        other_log = TransitionLog()
+        other_log.attach(SqliteRepository(path).append_transitions, shared=True)
+        other_log.record(lot.id, "C1", "ordered", "received", 5)
+        (entry,) = get_lead_time_report()
+        assert entry["observed"]["count"] == 1
+    finally:
+        set_repository(previous)
@@ -1,14 +1,23 @@
 import pytest
+from datetime import datetime, timedelta
 from models import Component, Inventory, HardwareRevision
 from operations import (
     create_component, get_component, update_component, delete_component,
     create_inventory, get_inventory, update_inventory, delete_inventory,
+    split_inventory, iter_inventory_units, get_inventory_by_serial, check_stock_ledger,
+    get_stock_levels, get_repository,
+    create_components_bulk, create_inventory_bulk, transition_inventory, BatchError,
+    iter_inventory, page_inventory, get_inventory_history, get_transitions, get_stock_as_of,
     create_hardware_revision, get_hardware_revision, update_hardware_revision, delete_hardware_revision,
     update_component_cost, get_component_cost_history,
     list_inventory, verify_hardware_revision_inventory,
-    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report
+    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report,
+    report_etag, report_cache_stats, get_lead_time_variance, get_lead_time_forecast,
+    patch_component, patch_inventory, patch_hardware_revision, get_changes, store_version
 )
 
+pytestmark = pytest.mark.usefixtures("backend")
+
 def test_component_crud():
     comp = Component(vendor_name="VendorA", manufacturer_name="ManuA")
     created = create_component(comp)
@@ -24,7 +33,8 @@ def test_component_crud():
 def test_inventory_crud():
     inv = Inventory(component_id="comp1", state="ordered", quantity=2)
     items = create_inventory(inv)
-    assert len(items) == 2
+    assert len(items) == 1
+    assert items[0].quantity == 2
     for item in items:
         assert item.id is not None
         fetched = get_inventory(item.id)
@@ -35,6 +45,61 @@ def test_inventory_crud():
         assert deleted is True
         assert get_inventory(item.id) is None
 
+def test_inventory_lots():
+    lot = create_inventory(Inventory(component_id="comp-lot", state="received", quantity=50000))[0]
+    assert len(list_inventory(component_id="comp-lot")) == 1
+    # Moving part of a lot splits it
+    moved = update_inventory(lot.id, {"state": "setup"}, quantity=2000)
+    assert moved.id != lot.id and moved.quantity == 2000 and moved.state == "setup"
+    assert get_inventory(lot.id).quantity == 48000
+    # Serial numbers are per unit
+    serialized = update_inventory(moved.id, {"serial_number": "SN-1"})
+    assert serialized.quantity == 1 and get_inventory(moved.id).quantity == 1999
+    # Splitting the whole lot returns the lot itself
+    assert split_inventory(serialized.id, 1).id == serialized.id
+    with pytest.raises(ValueError):
+        split_inventory(lot.id, 48001)
+    # Lazy per-unit view
+    units = iter_inventory_units(component_id="comp-lot", state="setup")
+    first = next(units)
+    assert first.quantity == 1 and first.id == f"{moved.id}.0"
+    assert sum(1 for _ in iter_inventory_units(component_id="comp-lot")) == 50000
+    with pytest.raises(ValueError):
+        create_inventory(Inventory(component_id="comp-lot", state="received", quantity=2, serial_number="SN-2"))
+    for item in list_inventory(component_id="comp-lot"):
+        delete_inventory(item.id)
+
+def test_inventory_indexes():
+    lot = create_inventory(Inventory(component_id="comp-idx", state="received", quantity=3))[0]
+    unit = update_inventory(lot.id, {"state": "setup", "serial_number": "SN-IDX-1"})
+    assert [i.id for i in list_inventory(state="setup", component_id="comp-idx")] == [unit.id]
+    assert [i.id for i in list_inventory(state="received", component_id="comp-idx")] == [lot.id]
+    assert get_inventory_by_serial("SN-IDX-1").id == unit.id
+    with pytest.raises(ValueError):
+        update_inventory(lot.id, {"serial_number": "SN-IDX-1"})
+    delete_inventory(unit.id)
+    assert get_inventory_by_serial("SN-IDX-1") is None
+    assert list_inventory(state="setup", component_id="comp-idx") == []
+    delete_inventory(lot.id)
+    assert list_inventory(component_id="comp-idx") == []
+
+def test_stock_ledger(backend):
+    lot = create_inventory(Inventory(component_id="comp-ledger", state="received", quantity=10))[0]
+    ready = update_inventory(lot.id, {"state": "on-hand-ready"}, quantity=4)
+    assert get_stock_levels("comp-ledger") == {"received": 6, "on-hand-ready": 4}
+    assert validate_inventory_allocation("comp-ledger", 4) == (True, 4)
+    delete_inventory(ready.id)
+    assert validate_inventory_allocation("comp-ledger", 1) == (False, 0)
+    assert check_stock_ledger() == []
+    if backend in ("memory", "journal"):
+        # Drift introduced behind the store's back is reported
+        ledger = get_repository().inventory.ledger
+        ledger.adjust("comp-ledger", "received", 1)
+        assert check_stock_ledger() == [{"component_id": "comp-ledger", "state": "received", "ledger": 7, "actual": 6}]
+        ledger.adjust("comp-ledger", "received", -1)
+    delete_inventory(lot.id)
+    assert get_stock_levels("comp-ledger") == {}
+
 def test_hardware_revision_crud():
     hw = HardwareRevision(name="RevA")
     created = create_hardware_revision(hw)
@@ -59,9 +124,35 @@ def test_component_cost_history():
     assert history[0].value == 100.0
     assert history[1].value == 150.0
     assert history[2].value == 200.0
+    # The record itself no longer carries the history
+    assert get_component(created.id).costs == []
+    assert [c.value for c in get_component_cost_history(created.id, last=2)] == [150.0, 200.0]
+    assert get_component_cost_history(created.id, since=history[1].date, until=history[1].date)[0].value == 150.0
+    assert get_component_cost_history(created.id, until=history[0].date - timedelta(seconds=1)) == []
+    (week,) = get_cost_history_report(created.id, bucket="week")
+    assert (week["min"], week["max"], week["avg"], week["count"]) == (100.0, 200.0, 150.0, 3)
     # Clean up
+    delete_component(created.id, cascade=True)
+    assert get_component_cost_history(created.id) == []
+
+def test_component_cost_history_from_create():
+    past = datetime(2024, 1, 31, 12)
+    created = create_component(Component(vendor_name="VendorA", manufacturer_name="ManuA", costs=[
+        {"value": 5.0, "date": past}, {"value": 7.0, "date": past + timedelta(days=1)},
+    ]))
+    assert created.costs == []
+    report = get_cost_history_report(created.id, bucket="month")
+    assert [(b["start"], b["count"]) for b in report] == [(datetime(2024, 1, 1), 1), (datetime(2024, 2, 1), 1)]
     delete_component(created.id)
 
+def test_delete_component_names_only_what_blocks_it():
+    comp = create_component(Component(vendor_name="VendorA", manufacturer_name="ManuA"))
+    create_inventory(Inventory(component_id=comp.id, state="on-hand-ready", quantity=3))
+    with pytest.raises(ValueError) as blocked:
+        delete_component(comp.id)
+    assert str(blocked.value) == f"Component {comp.id} is used by 3 units of inventory"
+    assert delete_component(comp.id, cascade=True)
+
 def test_component_validation():
     import pytest
     from pydantic import ValidationError
@@ -120,7 +211,7 @@ def test_list_inventory():
     filtered_by_comp = list_inventory(component_id=created.id)
     assert all(item.component_id == created.id for item in filtered_by_comp)
     # Clean up
-    delete_component(created.id)
+    delete_component(created.id, cascade=True)
 
 def test_verify_hardware_revision_inventory():
     comp = Component(vendor_name="VendorA", manufacturer_name="ManuA")
@@ -137,7 +228,7 @@ def test_verify_hardware_revision_inventory():
     result2 = verify_hardware_revision_inventory(created_hw2.id)
     assert result2 and result2[0]["required"] == 10
     # Clean up
-    delete_component(created.id)
+    delete_component(created.id, cascade=True)
     delete_hardware_revision(created_hw.id)
     delete_hardware_revision(created_hw2.id)
 
@@ -163,4 +254,272 @@ def test_lead_time_and_failure_rate_and_allocation_and_cost_history():
     cost_hist = get_cost_history_report(created.id)
     assert len(cost_hist) == 2
     # Clean up
-    delete_component(created.id)
+    delete_component(created.id, cascade=True)
+
+def test_bulk_components_and_inventory():
+    good = {"vendor_name": "V", "manufacturer_name": "M", "name": "Bulk"}
+    bad = {"vendor_name": "", "manufacturer_name": "M"}
+    with pytest.raises(BatchError) as exc:
+        create_components_bulk([good, bad])
+    assert [e["index"] for e in exc.value.errors] == [1]
+    result = create_components_bulk([good, bad, good], atomic=False)
+    assert len(result["created"]) == 2 and [e["index"] for e in result["errors"]] == [1]
+    cid = result["created"][0].id
+    lots = [{"component_id": cid, "state": "received", "quantity": 400}] * 3
+    lots.append({"component_id": cid, "state": "received", "quantity": 2, "serial_number": "SN-BULK"})
+    with pytest.raises(BatchError):
+        create_inventory_bulk(lots)
+    assert list_inventory(component_id=cid) == []
+    result = create_inventory_bulk(lots, atomic=False)
+    assert len(result["created"]) == 3 and result["errors"][0]["index"] == 3
+    assert get_stock_levels(cid) == {"received": 1200}
+    # Ids already stored or repeated in the batch fail on their own
+    lots = [{"id": "I1", "component_id": cid, "state": "received", "quantity": 1}]
+    create_inventory_bulk(lots)
+    lots += [dict(lots[0], id="I2"), dict(lots[0], id="I3"), dict(lots[0], id="I3")]
+    result = create_inventory_bulk(lots, atomic=False)
+    assert [lot.id for lot in result["created"]] == ["I2", "I3"]
+    assert result["errors"] == [{"index": 0, "error": "Inventory I1 already exists"},
+                                {"index": 3, "error": "Inventory I3 already exists"}]
+    for lot in list_inventory(component_id=cid):
+        delete_inventory(lot.id)
+
+def test_bulk_transitions():
+    lot = create_inventory(Inventory(component_id="comp-trans", state="received", quantity=2000))[0]
+    moves = [
+        {"inventory_id": lot.id, "state": "setup", "quantity": 500},
+        {"inventory_id": lot.id, "state": "failed", "quantity": 1600},
+        {"inventory_id": "missing", "state": "setup"},
+    ]
+    with pytest.raises(BatchError) as exc:
+        transition_inventory(moves)
+    assert [e["index"] for e in exc.value.errors] == [1, 2]
+    assert get_stock_levels("comp-trans") == {"received": 2000}
+    result = transition_inventory(moves, atomic=False)
+    assert len(result["updated"]) == 1 and len(result["errors"]) == 2
+    # The rest of the lot moves when no quantity is given
+    transition_inventory([{"inventory_id": lot.id, "state": "setup"}])
+    assert get_stock_levels("comp-trans") == {"setup": 2000}
+    for item in list_inventory(component_id="comp-trans"):
+        delete_inventory(item.id)
+
+def test_bulk_idempotency_key():
+    lot = create_inventory(Inventory(component_id="comp-idem", state="received", quantity=10))[0]
+    moves = [{"inventory_id": lot.id, "state": "setup", "quantity": 3}]
+    key = f"batch-{lot.id}"
+    first = transition_inventory(moves, idempotency_key=key)
+    retried = transition_inventory(moves, idempotency_key=key)
+    assert retried is first
+    assert get_stock_levels("comp-idem") == {"received": 7, "setup": 3}
+    with pytest.raises(ValueError):
+        transition_inventory([{"inventory_id": lot.id, "state": "setup", "quantity": 4}], idempotency_key=key)
+    for item in list_inventory(component_id="comp-idem"):
+        delete_inventory(item.id)
+
+def test_inventory_pagination(backend):
+    lots = [create_inventory(Inventory(component_id="comp-page", state="received", quantity=n + 1))[0] for n in range(7)]
+    seen, cursor = [], None
+    while True:
+        page, cursor = page_inventory(component_id="comp-page", limit=3, after=cursor)
+        seen.extend(item.id for item in page)
+        if cursor is None:
+            break
+        # Changes to records already paged past do not shift later pages
+        update_inventory(page[0].id, {"quantity": 99})
+    assert seen == [lot.id for lot in lots]
+    # A lot entering the filtered set is appended after the cursor
+    for lot in lots[1:4]:
+        update_inventory(lot.id, {"state": "setup"})
+    first_page, cursor = page_inventory(state="setup", component_id="comp-page", limit=2)
+    update_inventory(lots[0].id, {"state": "setup"})
+    rest = [item.id for _, item in iter_inventory(state="setup", component_id="comp-page", after=cursor)]
+    if backend == "sqlite":
+        # SQLite orders by insertion, so the lot keeps its original position
+        assert rest == [lots[3].id]
+    else:
+        assert rest == [lots[3].id, lots[0].id]
+    for lot in lots:
+        delete_inventory(lot.id)
+
+def test_transition_log():
+    from datetime import datetime, timedelta
+    start = datetime.now()
+    lot = create_inventory(Inventory(component_id="comp-events", state="ordered", quantity=10), actor="buyer")[0]
+    update_inventory(lot.id, {"state": "received"}, actor="dock")
+    part = update_inventory(lot.id, {"state": "setup"}, quantity=4, actor="tech")
+    with pytest.raises(ValueError):
+        update_inventory(part.id, {"state": "ordered"})
+    with pytest.raises(ValueError):
+        update_inventory(lot.id, {"state": "in-production"}, quantity=1)
+    assert get_inventory(lot.id).quantity == 6
+    timeline = get_inventory_history(part.id)
+    assert [(e["from_state"], e["to_state"], e["quantity"]) for e in timeline] == [
+        (None, "ordered", 10), ("ordered", "received", 10), ("received", "setup", 4)
+    ]
+    assert [e["actor"] for e in timeline] == ["buyer", "dock", "tech"]
+    assert len(get_inventory_history(lot.id)) == 2
+    recent = get_transitions(component_id="comp-events", since=start - timedelta(days=7))
+    assert len(recent) == 3
+    assert get_transitions(component_id="comp-events", since=datetime.now() + timedelta(seconds=1)) == []
+    for item in list_inventory(component_id="comp-events"):
+        delete_inventory(item.id)
+
+def test_inventory_as_of():
+    import time
+    from datetime import datetime
+    lot = create_inventory(Inventory(component_id="comp-asof", state="on-hand-ready", quantity=5))[0]
+    hw = create_hardware_revision(HardwareRevision(name="asof", components=[{"component_id": "comp-asof", "quantity": 5}]))
+    time.sleep(0.01)
+    before = datetime.now()
+    time.sleep(0.01)
+    update_inventory(lot.id, {"state": "failed"}, quantity=2)
+    update_inventory(lot.id, {"quantity": 4})
+    assert get_stock_as_of(before, component_id="comp-asof") == {("comp-asof", "on-hand-ready"): 5}
+    assert get_stock_as_of(datetime.now(), component_id="comp-asof") == {
+        ("comp-asof", "on-hand-ready"): 4, ("comp-asof", "failed"): 2
+    }
+    past = list_inventory(component_id="comp-asof", as_of=before)
+    assert [(i.id, i.state, i.quantity) for i in past] == [(None, "on-hand-ready", 5)]
+    assert list_inventory(state="failed", component_id="comp-asof", as_of=before) == []
+    assert verify_hardware_revision_inventory(hw.id, as_of=before) == []
+    assert verify_hardware_revision_inventory(hw.id)[0]["available"] == 4
+    delete_inventory(lot.id)
+    assert get_stock_as_of(datetime.now(), component_id="comp-asof") == {("comp-asof", "failed"): 2}
+
+def test_report_cache_invalidated_by_store_versions():
+    comp = create_component(Component(vendor_name="V", manufacturer_name="M", failure_rate=0.5))
+    hw = create_hardware_revision(HardwareRevision(name="Cached", components=[{"component_id": comp.id, "quantity": 2}]))
+    report = get_failure_rate_report(0.1)
+    etag = report_etag("failure-rate", 0.1)
+    hits = report_cache_stats()["hits"]
+    assert get_failure_rate_report(0.1) is report
+    assert report_cache_stats()["hits"] == hits + 1
+    # Inventory changes leave component reports cached but not verification
+    assert verify_hardware_revision_inventory(hw.id)[0]["available"] == 0
+    create_inventory(Inventory(component_id=comp.id, state="on-hand-ready", quantity=2))
+    assert get_failure_rate_report(0.1) is report
+    assert report_etag("failure-rate", 0.1) == etag
+    assert verify_hardware_revision_inventory(hw.id) == []
+    update_component(comp.id, {"failure_rate": 0.0})
+    assert report_etag("failure-rate", 0.1) != etag
+    assert all(entry["component_id"] != comp.id for entry in get_failure_rate_report(0.1))
+    # Listings of lots are built every time; only aggregates are cached
+    assert list_inventory(component_id=comp.id) is not list_inventory(component_id=comp.id)
+    now = datetime.now()
+    assert list_inventory(component_id=comp.id, as_of=now) is list_inventory(component_id=comp.id, as_of=now)
+    delete_component(comp.id, cascade=True)
+    delete_hardware_revision(hw.id)
+
+def test_lead_time_and_failure_rate_queries():
+    specs = [("5d", 7, 0.1), ("2w", 10, 0.3), ("soon", 0, 0.05), ("1 month", 40, 0.2)]
+    comps = [
+        create_component(Component(vendor_name="V", manufacturer_name="M", estimated_lead_time=est,
+                                   actual_lead_time=actual, failure_rate=rate))
+        for est, actual, rate in specs
+    ]
+    assert [c.estimated_lead_time_days for c in comps] == [5.0, 14.0, None, 30.0]
+    ids = [c.id for c in comps]
+    assert [e["component_id"] for e in get_lead_time_report(min_days=8, sort="desc")] == [ids[3], ids[1]]
+    assert [e["component_id"] for e in get_lead_time_report(max_days=10)] == [ids[0], ids[1]]
+    assert [e["component_id"] for e in get_lead_time_report(top=1, by="estimated")] == [ids[3]]
+    assert get_lead_time_report(top=1)[0]["variance_days"] == 10.0
+    assert [e["component_id"] for e in get_failure_rate_report(0.1, top=2)] == [ids[1], ids[3]]
+    assert len(get_lead_time_report()) == 4
+    variance = get_lead_time_variance()
+    assert variance["count"] == 3 and variance["late"] == 2 and variance["mean_days"] == pytest.approx(8 / 3)
+    # Updates move components within the indexes
+    update_component(ids[0], {"estimated_lead_time": "3w", "failure_rate": 0.9})
+    assert get_lead_time_report(top=1, by="estimated")[0]["component_id"] == ids[3]
+    assert get_lead_time_report(min_days=21, max_days=21, by="estimated")[0]["variance_days"] == -14.0
+    assert get_failure_rate_report(top=1)[0]["component_id"] == ids[0]
+    with pytest.raises(ValueError):
+        get_lead_time_report(sort="sideways")
+    for comp in comps:
+        delete_component(comp.id)
+    assert get_failure_rate_report(0.0) == []
+
+def test_observed_failure_rates_from_transitions():
+    comps = [create_component(Component(vendor_name=vendor, manufacturer_name="M")) for vendor in ("VA", "VA", "VB")]
+    for comp, failing in zip(comps, (1, 3, 0)):
+        (lot,) = create_inventory(Inventory(component_id=comp.id, state="on-hand-ready", quantity=4))
+        update_inventory(lot.id, {"state": "allocated"})
+        update_inventory(lot.id, {"state": "in-production"})
+        if failing:
+            update_inventory(lot.id, {"state": "failed"}, quantity=failing)
+    by_component = {e["component_id"]: e for e in get_failure_rate_report(0.0, group_by="component")}
+    assert (by_component[comps[1].id]["failed"], by_component[comps[1].id]["exposed"]) == (3, 4)
+    assert by_component[comps[0].id]["last_30_days"]["failure_rate"] == 0.25
+    by_vendor = get_failure_rate_report(0.0, group_by="vendor")
+    assert [(e["vendor"], e["failed"], e["exposed"]) for e in by_vendor] == [("VA", 4, 8), ("VB", 0, 4)]
+    assert by_vendor[0]["ci_low"] < 0.5 < by_vendor[0]["ci_high"]
+    assert [e["vendor"] for e in get_failure_rate_report(0.1, group_by="vendor")] == ["VA"]
+    with pytest.raises(ValueError):
+        get_failure_rate_report(group_by="colour")
+    for comp in comps:
+        delete_component(comp.id, cascade=True)
+
+def test_observed_lead_times_and_forecast():
+    fast = create_component(Component(vendor_name="VA", manufacturer_name="M"))
+    sibling = create_component(Component(vendor_name="VA", manufacturer_name="M"))
+    other = create_component(Component(vendor_name="VB", manufacturer_name="M", estimated_lead_time="2w"))
+    (order,) = create_inventory(Inventory(component_id=fast.id, state="ordered", quantity=5))
+    # Two units arrive first, split off the order
+    update_inventory(order.id, {"state": "received"}, quantity=2)
+    update_inventory(order.id, {"state": "received"})
+    observed = {e["component_id"]: e["observed"] for e in get_lead_time_report()}
+    assert observed[fast.id]["count"] == 2 and observed[fast.id]["p90_days"] >= 0
+    assert observed[other.id] is None
+    assert [e["vendor"] for e in get_lead_time_report(group_by="vendor")] == ["VA"]
+    open_orders = [
+        create_inventory(Inventory(component_id=comp.id, state="ordered"))[0]
+        for comp in (fast, sibling, other)
+    ]
+    forecast = {f["inventory_id"]: f for f in get_lead_time_forecast()}
+    assert [forecast[lot.id]["basis"] for lot in open_orders] == ["component", "vendor", "estimate"]
+    expected = forecast[open_orders[2].id]
+    assert abs(expected["expected_at"] - expected["ordered_at"] - timedelta(days=14)) < timedelta(seconds=1)
+    for comp in (fast, sibling, other):
+        delete_component(comp.id, cascade=True)
+
+def test_patch_validates_changed_fields_and_skips_no_ops():
+    comp = create_component(Component(vendor_name="VA", manufacturer_name="M", estimated_lead_time="1w"))
+    # Values are coerced and checked by the field's own validators
+    result = patch_component(comp.id, {"cost": "2.5", "estimated_lead_time": "3w"}, actor="ann")
+    assert result["changes"] == {"cost": {"old": None, "new": 2.5},
+                                 "estimated_lead_time": {"old": "1w", "new": "3w"}}
+    assert get_component(comp.id).estimated_lead_time_days == 21
+    for bad in ({"cost": "abc"}, {"vendor_name": " "}, {"order_link": "ftp://x"}, {"colour": "red"},
+                {"estimated_lead_time_days": 3}):
+        with pytest.raises(ValueError):
+            patch_component(comp.id, bad)
+    with pytest.raises(ValueError):
+        update_component(comp.id, {"cost": -1})
+    version = store_version("components")
+    assert patch_component(comp.id, {"cost": 2.5, "vendor_name": "VA"})["changes"] == {}
+    assert store_version("components") == version
+    assert patch_component("missing", {"cost": 1}) is None
+
+    (lot,) = create_inventory(Inventory(component_id=comp.id, state="received", quantity=5))
+    events = len(get_transitions(component_id=comp.id))
+    assert patch_inventory(lot.id, {"state": "received"}, quantity=2)["changes"] == {}
+    assert get_inventory(lot.id).quantity == 5
+    assert len(get_transitions(component_id=comp.id)) == events
+    with pytest.raises(ValueError):
+        patch_inventory(lot.id, {"quantity": 0})
+    moved = patch_inventory(lot.id, {"state": "setup"}, quantity=2, actor="bob")
+    assert moved["inventory"].id != lot.id and moved["changes"] == {"state": {"old": "received", "new": "setup"}}
+
+    hw = create_hardware_revision(HardwareRevision(name="Board", components=[{"component_id": comp.id, "quantity": 1}]))
+    with pytest.raises(ValueError):
+        patch_hardware_revision(hw.id, {"components": [{"quantity": 1}]})
+    assert patch_hardware_revision(hw.id, {"name": "Board"})["changes"] == {}
+    assert patch_hardware_revision(hw.id, {"name": "Board B"})["hardware_revision"].name == "Board B"
+
+    assert [(c["kind"], c["actor"]) for c in get_changes()] == [
+        ("component", "ann"), ("inventory", "bob"), ("hardware_revision", None)
+    ]
+    assert [c["changes"] for c in get_changes(kind="hardware_revision", record_id=hw.id)] == [
+        {"name": {"old": "Board", "new": "Board B"}}
+    ]
+    delete_hardware_revision(hw.id)
+    delete_component(comp.id, cascade=True)
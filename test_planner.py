@@ -0,0 +1,75 @@
+import pytest
+from models import Inventory, HardwareRevision
+from operations import create_inventory, create_hardware_revision, get_stock_levels, update_inventory
+from planner import plan_builds, commit_plan
+from reservations import InsufficientStockError, get_reservation, release_reservation
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+def _revision(name, **bom):
+    return create_hardware_revision(HardwareRevision(
+        name=name, components=[{"component_id": cid, "quantity": qty} for cid, qty in bom.items()]
+    ))
+
+
+def _planned(plan):
+    return [a["planned"] for a in plan["allocations"]]
+
+
+def test_plan_maximizes_builds_and_reports_shortfalls():
+    create_inventory(Inventory(component_id="cpu", state="on-hand-ready", quantity=4))
+    create_inventory(Inventory(component_id="ram", state="on-hand-ready", quantity=10))
+    server = _revision("server", cpu=2, ram=1)
+    node = _revision("node", cpu=1)
+    plan = plan_builds([(server.id, 2), (node.id, 2)])
+    # Two servers use every CPU; one server plus two nodes is more builds
+    assert _planned(plan) == [1, 2]
+    assert plan["builds"] == 3
+    assert plan["allocations"][0]["limiting"] == [{"component_id": "cpu", "required": 2, "available": 0}]
+    assert plan["shortfalls"] == [{"component_id": "cpu", "required": 6, "available": 4, "missing": 2}]
+    assert _planned(plan_builds([(server.id, 2), (node.id, 2)], objective="priority")) == [2, 0]
+    with pytest.raises(ValueError):
+        plan_builds([("missing", 1)])
+    with pytest.raises(ValueError, match="Order 1: missing field 'hwrev_id'"):
+        plan_builds([(server.id, 1), {"quantity": 1}])
+    with pytest.raises(ValueError, match="Order 0: quantity must be a whole number"):
+        plan_builds([{"hwrev_id": server.id, "quantity": "two"}])
+    with pytest.raises(ValueError, match="Order 0: weight must be a number"):
+        plan_builds([{"hwrev_id": server.id, "weight": "high"}])
+    assert _planned(plan_builds([{"hwrev_id": node.id, "quantity": "2"}])) == [2]
+
+
+def test_local_improvement_beats_greedy():
+    create_inventory(Inventory(component_id="c1", state="on-hand-ready", quantity=1))
+    create_inventory(Inventory(component_id="c2", state="on-hand-ready", quantity=1))
+    both = _revision("both", c1=1, c2=1)
+    first = _revision("first", c1=1)
+    second = _revision("second", c2=1)
+    orders = [
+        {"hwrev_id": both.id, "quantity": 1, "weight": 3},
+        {"hwrev_id": first.id, "quantity": 1, "weight": 2},
+        {"hwrev_id": second.id, "quantity": 1, "weight": 2},
+    ]
+    plan = plan_builds(orders, objective="priority")
+    assert _planned(plan) == [0, 1, 1]
+    assert plan["value"] == 4.0
+
+
+def test_commit_plan_reserves_builds():
+    create_inventory(Inventory(component_id="cpu", state="on-hand-ready", quantity=5))
+    ram = create_inventory(Inventory(component_id="ram", state="on-hand-ready", quantity=1))[0]
+    server = _revision("server", cpu=2)
+    desktop = _revision("desktop", ram=1)
+    plan = plan_builds([(server.id, 3), (desktop.id, 1)])
+    assert _planned(plan) == [2, 1]
+    reservations = commit_plan(plan)
+    assert [get_reservation(r.id).hwrev_id for r in reservations] == [server.id, desktop.id]
+    assert get_stock_levels("cpu") == {"on-hand-ready": 1, "allocated": 4}
+    for reservation in reservations:
+        release_reservation(reservation.id)
+    # Stock changed since planning: the server builds reserved first are released again
+    update_inventory(ram.id, {"state": "failed"})
+    with pytest.raises(InsufficientStockError):
+        commit_plan(plan)
+    assert get_stock_levels("cpu") == {"on-hand-ready": 5}
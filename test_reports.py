@@ -0,0 +1,103 @@
+import time
+from datetime import datetime
+import pytest
+from models import Component, Inventory, HardwareRevision
+from operations import (
+    create_component, create_inventory, update_component_cost, update_inventory, get_repository,
+    create_hardware_revision, update_hardware_revision, delete_hardware_revision
+)
+from reports import valuation_report, buildable_report, get_bom_matrix
+from planner import plan_builds
+from repository import SqliteRepository
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+
+def _group(report, key):
+    return next(g for g in report["groups"] if g[report["group_by"]] == key)
+
+
+def test_valuation_now_and_as_of():
+    cpu = create_component(Component(vendor_name="Intel", manufacturer_name="Intel", cost=10.0))
+    ram = create_component(Component(vendor_name="Corsair", manufacturer_name="Samsung"))
+    update_component_cost(ram.id, 2.0)
+    lot = create_inventory(Inventory(component_id=cpu.id, state="on-hand-ready", quantity=4))[0]
+    create_inventory(Inventory(component_id=ram.id, state="on-hand-ready", quantity=10))
+    create_inventory(Inventory(component_id="unknown", state="received", quantity=3))
+    time.sleep(0.01)
+    before = datetime.now()
+    time.sleep(0.01)
+    update_component_cost(ram.id, 5.0)
+    update_inventory(lot.id, {"state": "allocated"}, quantity=1)
+
+    now = valuation_report()
+    assert now["total_value"] == 4 * 10.0 + 10 * 5.0
+    assert now["total_quantity"] == 17
+    assert now["unpriced"] == [{"component_id": "unknown", "quantity": 3}]
+    assert _group(now, "allocated") == {"state": "allocated", "quantity": 1, "value": 10.0}
+    assert _group(valuation_report(group_by="vendor"), "Corsair")["value"] == 50.0
+    assert _group(valuation_report(group_by="manufacturer"), "Samsung")["quantity"] == 10
+
+    past = valuation_report(as_of=before)
+    assert past["total_value"] == 4 * 10.0 + 10 * 2.0
+    assert [g["state"] for g in past["groups"]] == ["on-hand-ready", "received"]
+    with pytest.raises(ValueError):
+        valuation_report(group_by="color")
+
+
+def test_valuation_of_100k_components(backend):
+    if backend != "memory":
+        pytest.skip("timing is only meaningful for the in-memory store")
+    repo = get_repository()
+    for i in range(100_000):
+        comp = Component.model_construct(id=f"C{i}", vendor_name=f"V{i % 50}", manufacturer_name="M", cost=1.0, costs=[])
+        repo.components[comp.id] = comp
+        repo.inventory.ledger.adjust(comp.id, "on-hand-ready", 2)
+    started = time.perf_counter()
+    report = valuation_report(group_by="vendor")
+    assert time.perf_counter() - started < 1.0
+    assert report["total_value"] == 200_000.0
+    assert len(report["groups"]) == 50
+
+
+def test_buildable_report():
+    create_inventory(Inventory(component_id="cpu", state="on-hand-ready", quantity=9))
+    create_inventory(Inventory(component_id="ram", state="on-hand-ready", quantity=20))
+    create_inventory(Inventory(component_id="ram", state="failed", quantity=50))
+    server = create_hardware_revision(HardwareRevision(name="server", components=[
+        {"component_id": "cpu", "quantity": 2}, {"component_id": "ram", "quantity": 4},
+    ]))
+    # Repeated lines add up: 3 + 3 ram per build
+    desktop = create_hardware_revision(HardwareRevision(name="desktop", components=[
+        {"component_id": "cpu", "quantity": 1}, {"component_id": "ram", "quantity": 3}, {"component_id": "ram", "quantity": 3},
+    ]))
+    empty = create_hardware_revision(HardwareRevision(name="empty"))
+    report = {entry["hwrev_id"]: entry for entry in buildable_report()}
+    assert report[server.id] == {
+        "hwrev_id": server.id, "name": "server", "buildable": 4, "limiting_component_id": "cpu",
+        "required": 2, "available": 9,
+    }
+    assert (report[desktop.id]["buildable"], report[desktop.id]["limiting_component_id"]) == (3, "ram")
+    assert report[empty.id]["buildable"] is None
+
+    matrix = get_bom_matrix()
+    assert get_bom_matrix() is matrix
+    update_hardware_revision(empty.id, {"components": [{"component_id": "gpu", "quantity": 1}]})
+    assert get_bom_matrix() is not matrix
+    report = {entry["hwrev_id"]: entry for entry in buildable_report()}
+    assert (report[empty.id]["buildable"], report[empty.id]["limiting_component_id"]) == (0, "gpu")
+    delete_hardware_revision(desktop.id)
+    assert desktop.id not in {entry["hwrev_id"] for entry in buildable_report()}
+
+
+def test_bom_matrix_sees_revisions_from_other_processes(backend):
+    if backend != "sqlite":
+        pytest.skip("only SQLite is shared between processes")
+    create_inventory(Inventory(component_id="fan", state="on-hand-ready", quantity=4))
+    get_bom_matrix()
+    other = SqliteRepository(get_repository().path)
+    other.save_hardware_revision(HardwareRevision(id="HW-OTHER", name="other", components=[
+        {"component_id": "fan", "quantity": 2}]))
+    other.close()
+    assert get_bom_matrix().revisions == ["HW-OTHER"]
+    assert plan_builds([("HW-OTHER", 3)])["builds"] == 2
@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+from models import Component, Inventory
+from repository import SqliteRepository, MemoryRepository
+from store import InventoryRecord
+
+
+def test_sqlite_state_is_shared_between_repositories(tmp_path):
+    # Two repositories on one file behave like two worker processes
+    path = str(tmp_path / "shared.db")
+    first, second = SqliteRepository(path), SqliteRepository(path)
+    first.save_component(Component(id="COMP-1", vendor_name="V", manufacturer_name="M", failure_rate=0.2))
+    first.add_inventory([
+        Inventory(id=f"INV-{n}", component_id="COMP-1", state="on-hand-ready", quantity=5) for n in range(3)
+    ])
+    assert second.get_component("COMP-1").vendor_name == "V"
+    assert second.stock(["COMP-1", "COMP-2"], ["on-hand-ready"]) == {"COMP-1": 15, "COMP-2": 0}
+    assert second.failure_rate_report(0.1) == [{"component_id": "COMP-1", "failure_rate": 0.2}]
+    item = second.get_inventory("INV-0")
+    second.update_inventory(item, {"state": "allocated"})
+    assert first.stock_by_state("COMP-1") == {"on-hand-ready": 10, "allocated": 5}
+    first.close()
+    reopened = SqliteRepository(path)
+    assert [i.id for i in reopened.find_inventory(component_id="COMP-1")] == ["INV-0", "INV-1", "INV-2"]
+
+
+def test_sqlite_transaction_rolls_back(tmp_path):
+    repo = SqliteRepository(str(tmp_path / "rollback.db"))
+    try:
+        with repo.transaction():
+            repo.add_inventory([Inventory(id="INV-1", component_id="C", state="ordered", quantity=2)])
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert repo.get_inventory("INV-1") is None
+
+
+def test_sqlite_store_versions_track_writes_from_other_connections(tmp_path):
+    path = str(tmp_path / "versions.db")
+    first, second = SqliteRepository(path), SqliteRepository(path)
+    before = first.store_versions()
+    second.save_component(Component(id="COMP-1", vendor_name="V", manufacturer_name="M"))
+    after = first.store_versions()
+    assert after["components"] > before["components"]
+    assert after["inventory"] == before["inventory"]
+    second.add_inventory([Inventory(id="INV-1", component_id="COMP-1", state="ordered")])
+    assert first.store_versions()["inventory"] > after["inventory"]
+
+
+def test_sqlite_migration_parses_existing_lead_times(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE components (id TEXT PRIMARY KEY, estimated_lead_time TEXT, actual_lead_time INTEGER,
+                                 failure_rate REAL, data TEXT NOT NULL);
+        CREATE INDEX components_failure_rate ON components (failure_rate);
+    """)
+    old = Component(id="COMP-1", vendor_name="V", manufacturer_name="M", estimated_lead_time="2w")
+    conn.execute("INSERT INTO components VALUES (?, ?, ?, ?, ?)", ("COMP-1", "2w", 0, 0.0, old.model_dump_json()))
+    conn.commit()
+    conn.close()
+    repo = SqliteRepository(path)
+    entries = repo.lead_time_report(by="estimated", min_days=10)
+    assert [(e["component_id"], e["estimated_lead_time_days"]) for e in entries] == [("COMP-1", 14.0)]
+
+
+def test_memory_store_keeps_slotted_records():
+    repo = MemoryRepository()
+    lot = Inventory(id="INV-1", component_id="COMP-1", state="received", quantity=4, sub_items=["INV-0"])
+    repo.add_inventory([lot])
+    record = repo.inventory.get("INV-1")
+    assert isinstance(record, InventoryRecord) and not hasattr(record, "__dict__")
+    assert record.state_history is None
+    # Reads hand out models equal to what was stored, but not the record itself
+    fetched = repo.get_inventory("INV-1")
+    assert fetched == lot and fetched is not lot
+    fetched.quantity = 99
+    assert repo.get_inventory("INV-1").quantity == 4
+    repo.update_inventory(fetched, {"state": "setup", "quantity": 3})
+    assert (fetched.state, fetched.quantity) == ("setup", 3)
+    # Updates replace the stored record; one already handed out stays as it was
+    assert (record.state, record.quantity) == ("received", 4)
+    assert repo.inventory.get("INV-1") is not record
+    assert repo.stock_by_state("COMP-1") == {"setup": 3}
+    assert [item.sub_items for item in repo.find_inventory(state="setup")] == [["INV-0"]]
+
+
+def test_memory_readers_iterate_copies_while_writing():
+    repo = MemoryRepository()
+    done = threading.Event()
+
+    def write():
+        for n in range(3000):
+            repo.save_component(Component(id=f"C{n}", vendor_name="V", manufacturer_name="M",
+                                          estimated_lead_time="1w"))
+            repo.add_cost(f"C{n}", 1.0, float(n))
+            repo.add_inventory([Inventory(id=f"INV-{n}", component_id=f"C{n}", state="received", quantity=1)])
+        done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    while not done.is_set():
+        repo.lead_time_report()
+        repo.costs_at()
+        repo.stock_counts()
+        sum(1 for _ in repo.inventory.values())
+    writer.join()
+    assert len(repo.lead_time_report()) == 3000 and len(repo.stock_counts()) == 3000
+
+
+def test_reports_read_inside_a_rolled_back_transaction_are_not_cached(tmp_path):
+    from operations import get_repository, set_repository, create_component, get_lead_time_report
+    previous = get_repository()
+    repo = set_repository(SqliteRepository(str(tmp_path / "aim.db")))
+    try:
+        try:
+            with repo.transaction():
+                create_component(Component(id="A", vendor_name="V", manufacturer_name="M"))
+                assert [e["component_id"] for e in get_lead_time_report()] == ["A"]
+                raise RuntimeError("roll back")
+        except RuntimeError:
+            pass
+        # Reaches the version number the rolled-back write had used
+        create_component(Component(id="B", vendor_name="V", manufacturer_name="M"))
+        assert [e["component_id"] for e in get_lead_time_report()] == ["B"]
+    finally:
+        set_repository(previous)
+
+
+def test_transition_log_is_shared_between_workers(tmp_path):
+    import pytest
+    from datetime import datetime
+    from events import TransitionLog
+    from operations import get_repository, set_repository, get_stock_as_of, create_inventory, get_transitions
+    path = str(tmp_path / "events.db")
+    previous = get_repository()
+    set_repository(SqliteRepository(path))
+    try:
+        # The other worker's log stores its events in the same table
+        other = SqliteRepository(path)
+        other_log = TransitionLog()
+        other_log.attach(other.append_transitions, shared=True)
+        (lot,) = create_inventory(Inventory(component_id="C1", state="received", quantity=10))
+        other_log.record(lot.id, "C1", "received", "setup", 10, actor="other")
+        create_inventory(Inventory(component_id="C1", state="received", quantity=1))
+        assert get_stock_as_of(datetime.now()) == {("C1", "setup"): 10, ("C1", "received"): 1}
+        assert [e["actor"] for e in get_transitions(component_id="C1")] == [None, "other", None]
+        # Events stored inside an open transaction wait for its outcome
+        with pytest.raises(RuntimeError):
+            with other.transaction():
+                other_log.record(lot.id, "C1", "setup", "failed", 10)
+                raise RuntimeError
+        assert len(get_transitions()) == 3
+        # A worker started later replays them all
+        set_repository(SqliteRepository(path))
+        assert get_stock_as_of(datetime.now()) == {("C1", "setup"): 10, ("C1", "received"): 1}
+    finally:
+        set_repository(previous)
@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from models import Inventory, HardwareRevision
+from operations import (
+    create_inventory, delete_inventory, list_inventory, create_hardware_revision,
+    delete_hardware_revision, check_stock_ledger, get_stock_levels
+)
+from reservations import (
+    reserve_component, reserve_hardware_revision, release_reservation, confirm_reservation,
+    expire_reservations, get_reservation, InsufficientStockError
+)
+
+pytestmark = pytest.mark.usefixtures("backend")
+
+def _cleanup(*component_ids):
+    for cid in component_ids:
+        for item in list_inventory(component_id=cid):
+            delete_inventory(item.id)
+
+def test_reserve_and_release():
+    create_inventory(Inventory(component_id="res-a", state="on-hand-ready", quantity=10))
+    reservation = reserve_component("res-a", 4)
+    assert sum(line["quantity"] for line in reservation.lines) == 4
+    assert get_stock_levels("res-a") == {"on-hand-ready": 6, "allocated": 4}
+    with pytest.raises(InsufficientStockError) as exc:
+        reserve_component("res-a", 7)
+    assert exc.value.missing == [{"component_id": "res-a", "required": 7, "available": 6}]
+    assert release_reservation(reservation.id) is True
+    assert release_reservation(reservation.id) is False
+    assert get_stock_levels("res-a") == {"on-hand-ready": 10}
+    # Confirmed reservations keep their units allocated
+    confirmed = confirm_reservation(reserve_component("res-a", 3).id)
+    assert get_reservation(confirmed.id) is None
+    assert get_stock_levels("res-a") == {"on-hand-ready": 7, "allocated": 3}
+    _cleanup("res-a")
+
+def test_released_units_merge_back_into_free_lots():
+    lot = create_inventory(Inventory(component_id="res-m", state="on-hand-ready", quantity=100))[0]
+    for _ in range(100):
+        release_reservation(reserve_component("res-m", 1).id)
+    lots = list_inventory(component_id="res-m")
+    assert [(item.id, item.state, item.quantity) for item in lots] == [(lot.id, "on-hand-ready", 100)]
+    # A lot with a serial number keeps its identity
+    serial = create_inventory(Inventory(component_id="res-m", state="on-hand-ready", serial_number="SN-M"))[0]
+    reservation = reserve_component("res-m", 101)
+    release_reservation(reservation.id)
+    assert sorted(item.quantity for item in list_inventory(component_id="res-m")) == [1, 100]
+    assert get_stock_levels("res-m") == {"on-hand-ready": 101}
+    assert check_stock_ledger() == []
+    _cleanup("res-m")
+
+def test_reservation_expiry():
+    create_inventory(Inventory(component_id="res-b", state="on-hand-ready", quantity=5))
+    reservation = reserve_component("res-b", 5, ttl=60)
+    assert expire_reservations() == 0
+    assert expire_reservations(now=datetime.now() + timedelta(seconds=61)) == 1
+    assert get_reservation(reservation.id) is None
+    assert get_stock_levels("res-b") == {"on-hand-ready": 5}
+    _cleanup("res-b")
+
+def test_reserve_hardware_revision_is_all_or_nothing():
+    create_inventory(Inventory(component_id="res-c", state="on-hand-ready", quantity=4))
+    create_inventory(Inventory(component_id="res-d", state="on-hand-ready", quantity=1))
+    hw = create_hardware_revision(HardwareRevision(name="ResRev", components=[
+        {"component_id": "res-c", "quantity": 2},
+        {"component_id": "res-d", "quantity": 1},
+    ]))
+    with pytest.raises(InsufficientStockError):
+        reserve_hardware_revision(hw.id, builds=2)
+    assert get_stock_levels("res-c") == {"on-hand-ready": 4}
+    reservation = reserve_hardware_revision(hw.id, builds=1)
+    assert reservation.hwrev_id == hw.id
+    assert get_stock_levels("res-d") == {"allocated": 1}
+    assert reserve_hardware_revision("missing") is None
+    release_reservation(reservation.id)
+    delete_hardware_revision(hw.id)
+    _cleanup("res-c", "res-d")
+
+def test_concurrent_reservations_never_over_allocate():
+    for _ in range(10):
+        create_inventory(Inventory(component_id="res-hot", state="on-hand-ready", quantity=10))
+    successes, failures = [], []
+    start = threading.Barrier(50)
+
+    def worker():
+        start.wait()
+        for _ in range(10):
+            try:
+                successes.append(reserve_component("res-hot", 1))
+            except InsufficientStockError:
+                failures.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(successes) == 100 and len(failures) == 400
+    assert get_stock_levels("res-hot") == {"allocated": 100}
+    claimed = [line["inventory_id"] for r in successes for line in r.lines]
+    assert len(set(claimed)) == 100
+    assert check_stock_ledger() == []
+    for r in successes:
+        release_reservation(r.id)
+    assert get_stock_levels("res-hot") == {"on-hand-ready": 100}
+    _cleanup("res-hot")
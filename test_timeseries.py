@@ -0,0 +1,34 @@
+from datetime import datetime
+import pytest
+from timeseries import CostSeries, downsample
+
+
+def _ts(*args):
+    return datetime(*args).timestamp()
+
+
+def test_cost_series_ranges():
+    series = CostSeries()
+    for day, value in ((1, 10.0), (2, 11.0), (4, 13.0), (3, 12.0)):
+        series.append(_ts(2024, 5, day), value)
+    assert list(series.values) == [10.0, 11.0, 12.0, 13.0]
+    timestamps, values = series.range(since=_ts(2024, 5, 2), until=_ts(2024, 5, 3))
+    assert list(values) == [11.0, 12.0]
+    assert list(series.range(last=3)[1]) == [11.0, 12.0, 13.0]
+    assert list(series.range(until=_ts(2024, 5, 3), last=1)[1]) == [12.0]
+    assert list(series.range(since=_ts(2024, 6, 1))[1]) == []
+
+
+def test_downsample():
+    points = [(_ts(2024, 1, 29, 9), 4.0), (_ts(2024, 1, 29, 17), 6.0), (_ts(2024, 1, 31), 5.0), (_ts(2024, 2, 5), 1.0)]
+    timestamps, values = zip(*points)
+    days = downsample(timestamps, values, "day")
+    assert [(b["start"].day, b["min"], b["max"], b["avg"]) for b in days] == [
+        (29, 4.0, 6.0, 5.0), (31, 5.0, 5.0, 5.0), (5, 1.0, 1.0, 1.0)
+    ]
+    weeks = downsample(timestamps, values, "week")
+    assert [(b["start"], b["count"]) for b in weeks] == [(datetime(2024, 1, 29), 3), (datetime(2024, 2, 5), 1)]
+    months = downsample(timestamps, values, "month")
+    assert [(b["start"], b["count"]) for b in months] == [(datetime(2024, 1, 1), 3), (datetime(2024, 2, 1), 1)]
+    with pytest.raises(ValueError):
+        downsample(timestamps, values, "year")
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from writer import CommandQueue
+from web import app
+
+
+def test_commands_apply_in_order_in_batches():
+    applied, threads = [], set()
+
+    def command(n):
+        threads.add(threading.get_ident())
+        applied.append(n)
+        return n * 2
+
+    async def run():
+        queue = CommandQueue(max_batch=16)
+        results = await asyncio.gather(*(queue.submit(command, n) for n in range(100)))
+        stats = queue.stats()
+        await queue.stop()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    assert applied == list(range(100)) and results == [n * 2 for n in range(100)]
+    # Everything waiting is applied together, off the event loop thread
+    assert stats["applied"] == 100 and stats["batches"] < 100 and stats["queued"] == 0
+    assert threads and threading.get_ident() not in threads
+
+
+def test_failing_command_only_fails_its_caller():
+    def command(n):
+        if n == 2:
+            raise ValueError("bad")
+        return n
+
+    async def run():
+        queue = CommandQueue()
+        results = await asyncio.gather(*(queue.submit(command, n) for n in range(4)), return_exceptions=True)
+        await queue.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results[:2] == [0, 1] and results[3] == 3
+    assert isinstance(results[2], ValueError)
+
+
+@pytest.mark.usefixtures("backend")
+def test_api_writes_go_through_the_queue():
+    with TestClient(app) as client:
+        assert client.post("/components/", json={"id": "W-1", "vendor_name": "V", "manufacturer_name": "M"}).status_code == 200
+        patched = client.patch("/components/W-1", json={"vendor_name": "V2"}, headers={"X-Actor": "ann"}).json()
+        assert patched["changes"] == {"vendor_name": {"old": "V", "new": "V2"}}
+        assert client.patch("/components/W-1", json={"id": "W-2"}).status_code == 422
+        assert client.patch("/components/nope", json={"vendor_name": "V"}).status_code == 404
+        assert client.get("/components/W-1").json()["vendor_name"] == "V2"
+        assert client.get("/writer/stats").json()["applied"] >= 3
+
+    async def concurrent():
+        # Concurrent creates and moves of the same component all land
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            created = await asyncio.gather(*(
+                client.post("/inventory/", json={"component_id": "W-1", "state": "received", "quantity": 2})
+                for _ in range(20)
+            ))
+            ids = [r.json()[0]["id"] for r in created]
+            moved = await asyncio.gather(*(
+                client.post("/inventory/transitions", json=[{"inventory_id": i, "state": "on-hand-ready", "quantity": 1}])
+                for i in ids
+            ))
+            assert all(r.status_code == 200 for r in moved)
+            return (await client.get("/inventory/", params={"component_id": "W-1"})).json()
+
+    lots = asyncio.run(concurrent())
+    stock = {}
+    for lot in lots:
+        stock[lot["state"]] = stock.get(lot["state"], 0) + lot["quantity"]
+    assert stock == {"received": 20, "on-hand-ready": 20}
+    with TestClient(app) as client:
+        # Transition listings are bounded
+        events = client.get("/inventory/transitions", params={"component_id": "W-1", "limit": 5}).json()
+        assert len(events) == 5 and all(e["to_state"] == "received" for e in events)
+        assert client.get("/inventory/transitions", params={"limit": 100000}).status_code == 422
@@ -0,0 +1,83 @@
+import bisect
+from array import array
+from datetime import datetime, timedelta
+
+BUCKETS = ("day", "week", "month")
+
+
+class CostSeries:
+    """One component's cost history as parallel arrays of epoch seconds and values.
+
+    Points are kept sorted by time (appends are almost always in order), so
+    since/until ranges and the last N points are binary searches and slices.
+    """
+
+    __slots__ = ("timestamps", "values")
+
+    def __init__(self, timestamps=(), values=()):
+        self.timestamps = array("d", timestamps)
+        self.values = array("d", values)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, timestamp, value):
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+        else:
+            i = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(i, timestamp)
+            self.values.insert(i, value)
+
+    def value_at(self, timestamp=None):
+        # The value in effect at `timestamp` (the latest point at or before
+        # it), or None if the series starts later
+        i = bisect.bisect_right(self.timestamps, timestamp) if timestamp is not None else len(self.timestamps)
+        return self.values[i - 1] if i else None
+
+    def range(self, since=None, until=None, last=None):
+        # Returns (timestamps, values) within [since, until], keeping only the
+        # last `last` points of that range if given
+        lo = bisect.bisect_left(self.timestamps, since) if since is not None else 0
+        hi = bisect.bisect_right(self.timestamps, until) if until is not None else len(self.timestamps)
+        if last is not None:
+            lo = max(lo, hi - last)
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+
+def _bucket_start(ts, bucket):
+    day = datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def downsample(timestamps, values, bucket):
+    # Groups sorted points into calendar days, weeks (starting Monday) or
+    # months and returns min/max/avg per non-empty bucket
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {BUCKETS}")
+    result = []
+    end = None
+    for ts, value in zip(timestamps, values):
+        if end is None or ts >= end:
+            start = _bucket_start(ts, bucket)
+            if bucket == "day":
+                end_dt = start + timedelta(days=1)
+            elif bucket == "week":
+                end_dt = start + timedelta(days=7)
+            else:
+                end_dt = (start + timedelta(days=32)).replace(day=1)
+            end = end_dt.timestamp()
+            current = {"start": start, "min": value, "max": value, "avg": 0.0, "count": 0}
+            result.append(current)
+        current["min"] = min(current["min"], value)
+        current["max"] = max(current["max"], value)
+        current["avg"] += value
+        current["count"] += 1
+    for entry in result:
+        entry["avg"] /= entry["count"]
+    return result
@@ -1,134 +1,489 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from models import Component, Inventory, HardwareRevision
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from models import (
+    Component, Inventory, HardwareRevision, Reservation, ComponentPatch, InventoryPatch, HardwareRevisionPatch
+)
 from operations import (
     create_component, get_component, update_component, delete_component,
-    create_inventory, get_inventory, update_inventory, delete_inventory,
+    create_inventory, get_inventory, update_inventory, delete_inventory, get_inventory_by_serial,
     create_hardware_revision, get_hardware_revision, update_hardware_revision, delete_hardware_revision,
     update_component_cost, get_component_cost_history, list_inventory, verify_hardware_revision_inventory,
-    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report
+    get_lead_time_report, get_failure_rate_report, validate_inventory_allocation, get_cost_history_report,
+    create_components_bulk, create_inventory_bulk, transition_inventory, BatchError,
+    iter_inventory, page_inventory, get_inventory_history, get_transitions, explode_hardware_revision,
+    get_where_used, reprice_component, report_etag, report_cache_stats, get_lead_time_variance,
+    get_lead_time_forecast, patch_component, patch_inventory, patch_hardware_revision, get_changes,
+    close_repository
+)
+from reports import valuation_report, buildable_report
+from planner import plan_builds, commit_plan
+from reservations import (
+    reserve_component, reserve_hardware_revision, get_reservation, release_reservation,
+    confirm_reservation, InsufficientStockError, DEFAULT_TTL
 )
-from typing import Any
-from fastapi.responses import JSONResponse
+from writer import writer
+from contextlib import asynccontextmanager
+from typing import Optional
+from datetime import datetime
+import time
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Handlers run on the event loop. Every change goes through the single-writer
+# queue (writer.py), which applies changes in arrival order; everything that
+# reads the repository (which may be SQLite I/O) runs in the thread pool, so
+# the loop only parses requests and awaits results.
+@asynccontextmanager
+async def lifespan(app):
+    writer.start()
+    yield
+    await writer.stop()
+    await run_in_threadpool(close_repository)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "AIM Inventory Management API. Visit /docs for Swagger UI."}
 
 @app.post("/components/", response_model=Component)
-def api_create_component(component: Component):
-    return create_component(component)
+async def api_create_component(component: Component):
+    return await writer.submit(create_component, component)
+
+async def _run_batch(batch, items, atomic, idempotency_key):
+    try:
+        return await writer.submit(batch, items, atomic=atomic, idempotency_key=idempotency_key)
+    except BatchError as e:
+        raise HTTPException(status_code=422, detail={"errors": e.errors})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# Batch bodies are lists of raw objects so each item can be validated and
+# reported on separately when atomic=false
+@app.post("/components/bulk")
+async def api_create_components_bulk(items: list[dict], atomic: bool = True, idempotency_key: Optional[str] = Header(None)):
+    return await _run_batch(create_components_bulk, items, atomic, idempotency_key)
 
 @app.get("/components/{component_id}", response_model=Component)
-def api_get_component(component_id: str):
-    comp = get_component(component_id)
+async def api_get_component(component_id: str, include_costs: bool = False):
+    comp = await run_in_threadpool(get_component, component_id)
     if not comp:
         raise HTTPException(status_code=404, detail="Component not found")
+    # The cost history is only embedded on request; see /cost-history
+    if include_costs:
+        costs = await run_in_threadpool(get_component_cost_history, component_id)
+        return comp.model_copy(update={"costs": costs})
     return comp
 
 @app.put("/components/{component_id}", response_model=Component)
-def api_update_component(component_id: str, updates: dict):
-    updated = update_component(component_id, updates)
+async def api_update_component(component_id: str, updates: dict):
+    try:
+        updated = await writer.submit(update_component, component_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Component not found")
     return updated
 
+# PATCH bodies hold only the fields to change; the response carries the
+# record and the fields that actually changed, with old and new values
+async def _patched(patch, not_found, *args, **kwargs):
+    try:
+        result = await writer.submit(patch, *args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return result
+
+@app.patch("/components/{component_id}")
+async def api_patch_component(component_id: str, patch: ComponentPatch, x_actor: Optional[str] = Header(None)):
+    return await _patched(patch_component, "Component not found", component_id,
+                    patch.model_dump(exclude_unset=True), actor=x_actor)
+
 @app.delete("/components/{component_id}")
-def api_delete_component(component_id: str):
-    deleted = delete_component(component_id)
+async def api_delete_component(component_id: str, cascade: bool = False):
+    # Without cascade, a component still in a BOM or in stock is a conflict
+    try:
+        deleted = await writer.submit(delete_component, component_id, cascade=cascade)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not deleted:
         raise HTTPException(status_code=404, detail="Component not found")
     return {"status": "deleted"}
 
+# Callers identify themselves with an X-Actor header; it is stored with the
+# state changes they make
 @app.post("/inventory/", response_model=list[Inventory])
-def api_create_inventory(inventory: Inventory):
-    return create_inventory(inventory)
+async def api_create_inventory(inventory: Inventory, x_actor: Optional[str] = Header(None)):
+    try:
+        return await writer.submit(create_inventory, inventory, actor=x_actor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/inventory/bulk")
+async def api_create_inventory_bulk(items: list[dict], atomic: bool = True, idempotency_key: Optional[str] = Header(None)):
+    return await _run_batch(create_inventory_bulk, items, atomic, idempotency_key)
+
+@app.post("/inventory/transitions")
+async def api_transition_inventory(
+    items: list[dict], atomic: bool = True,
+    idempotency_key: Optional[str] = Header(None), x_actor: Optional[str] = Header(None),
+):
+    def batch(items, atomic, idempotency_key):
+        return transition_inventory(items, atomic=atomic, idempotency_key=idempotency_key, actor=x_actor)
+    return await _run_batch(batch, items, atomic, idempotency_key)
+
+@app.get("/inventory/transitions")
+async def api_get_transitions(
+    component_id: str = None, since: datetime = None, until: datetime = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    # At most `limit` events, oldest first; page on with since= the last timestamp
+    return await run_in_threadpool(get_transitions, component_id=component_id, since=since, until=until, limit=limit)
 
 @app.get("/inventory/{inventory_id}", response_model=Inventory)
-def api_get_inventory(inventory_id: str):
-    inv = get_inventory(inventory_id)
+async def api_get_inventory(inventory_id: str):
+    inv = await run_in_threadpool(get_inventory, inventory_id)
+    if not inv:
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    # state_history is derived from the transition log rather than stored
+    history = await run_in_threadpool(get_inventory_history, inventory_id)
+    return inv.model_copy(update={"state_history": history})
+
+@app.get("/inventory/{inventory_id}/history")
+async def api_get_inventory_history(inventory_id: str):
+    if not await run_in_threadpool(get_inventory, inventory_id):
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    return await run_in_threadpool(get_inventory_history, inventory_id)
+
+@app.get("/inventory/by-serial/{serial_number}", response_model=Inventory)
+async def api_get_inventory_by_serial(serial_number: str):
+    inv = await run_in_threadpool(get_inventory_by_serial, serial_number)
     if not inv:
         raise HTTPException(status_code=404, detail="Inventory not found")
     return inv
 
 @app.put("/inventory/{inventory_id}", response_model=Inventory)
-def api_update_inventory(inventory_id: str, updates: dict):
-    updated = update_inventory(inventory_id, updates)
+async def api_update_inventory(inventory_id: str, updates: dict, quantity: int = None, x_actor: Optional[str] = Header(None)):
+    try:
+        updated = await writer.submit(update_inventory, inventory_id, updates, quantity=quantity, actor=x_actor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Inventory not found")
     return updated
 
+@app.patch("/inventory/{inventory_id}")
+async def api_patch_inventory(inventory_id: str, patch: InventoryPatch, quantity: int = None,
+                        x_actor: Optional[str] = Header(None)):
+    return await _patched(patch_inventory, "Inventory not found", inventory_id,
+                    patch.model_dump(exclude_unset=True), quantity=quantity, actor=x_actor)
+
 @app.delete("/inventory/{inventory_id}")
-def api_delete_inventory(inventory_id: str):
-    deleted = delete_inventory(inventory_id)
+async def api_delete_inventory(inventory_id: str):
+    deleted = await writer.submit(delete_inventory, inventory_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Inventory not found")
     return {"status": "deleted"}
 
 @app.post("/hardware-revisions/", response_model=HardwareRevision)
-def api_create_hardware_revision(hw: HardwareRevision):
-    return create_hardware_revision(hw)
+async def api_create_hardware_revision(hw: HardwareRevision):
+    try:
+        return await writer.submit(create_hardware_revision, hw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/hardware-revisions/buildable")
+async def api_buildable_report():
+    return await run_in_threadpool(buildable_report)
 
 @app.get("/hardware-revisions/{hwrev_id}", response_model=HardwareRevision)
-def api_get_hardware_revision(hwrev_id: str):
-    hw = get_hardware_revision(hwrev_id)
+async def api_get_hardware_revision(hwrev_id: str):
+    hw = await run_in_threadpool(get_hardware_revision, hwrev_id)
     if not hw:
         raise HTTPException(status_code=404, detail="Hardware revision not found")
     return hw
 
 @app.put("/hardware-revisions/{hwrev_id}", response_model=HardwareRevision)
-def api_update_hardware_revision(hwrev_id: str, updates: dict):
-    updated = update_hardware_revision(hwrev_id, updates)
+async def api_update_hardware_revision(hwrev_id: str, updates: dict):
+    try:
+        updated = await writer.submit(update_hardware_revision, hwrev_id, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not updated:
         raise HTTPException(status_code=404, detail="Hardware revision not found")
     return updated
 
+@app.patch("/hardware-revisions/{hwrev_id}")
+async def api_patch_hardware_revision(hwrev_id: str, patch: HardwareRevisionPatch, x_actor: Optional[str] = Header(None)):
+    return await _patched(patch_hardware_revision, "Hardware revision not found", hwrev_id,
+                    patch.model_dump(exclude_unset=True), actor=x_actor)
+
 @app.delete("/hardware-revisions/{hwrev_id}")
-def api_delete_hardware_revision(hwrev_id: str):
-    deleted = delete_hardware_revision(hwrev_id)
+async def api_delete_hardware_revision(hwrev_id: str):
+    try:
+        deleted = await writer.submit(delete_hardware_revision, hwrev_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if not deleted:
         raise HTTPException(status_code=404, detail="Hardware revision not found")
     return {"status": "deleted"}
 
+@app.get("/hardware-revisions/{hwrev_id}/explode")
+async def api_explode_hardware_revision(hwrev_id: str):
+    exploded = await run_in_threadpool(explode_hardware_revision, hwrev_id)
+    if exploded is None:
+        raise HTTPException(status_code=404, detail="Hardware revision not found")
+    return exploded
+
 @app.post("/components/{component_id}/cost")
-def api_update_component_cost(component_id: str, new_cost: float):
-    updated = update_component_cost(component_id, new_cost)
+async def api_update_component_cost(component_id: str, new_cost: float, impact: bool = False):
+    # With impact, also returns the old and new rolled-up cost of every
+    # hardware revision using the component
+    updated = await writer.submit(reprice_component if impact else update_component_cost, component_id, new_cost)
     if not updated:
         raise HTTPException(status_code=404, detail="Component not found")
     return updated
 
+@app.get("/components/{component_id}/where-used")
+async def api_where_used(component_id: str):
+    if not await run_in_threadpool(get_component, component_id):
+        raise HTTPException(status_code=404, detail="Component not found")
+    return await run_in_threadpool(get_where_used, component_id)
+
 @app.get("/components/{component_id}/cost-history")
-def api_get_component_cost_history(component_id: str):
-    history = get_component_cost_history(component_id)
+async def api_get_component_cost_history(
+    component_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    last: Optional[int] = Query(None, ge=1),
+    bucket: Optional[str] = Query(None, pattern="^(day|week|month)$"),
+):
+    # With bucket, returns {start, min, max, avg, count} per day, week or month
+    if bucket:
+        history = await run_in_threadpool(get_cost_history_report, component_id, since=since, until=until,
+                                          last=last, bucket=bucket)
+        return JSONResponse(content=[dict(b, start=b["start"].isoformat()) for b in history])
+    history = await run_in_threadpool(get_component_cost_history, component_id, since=since, until=until, last=last)
     return JSONResponse(content=[{"value": c.value, "date": c.date.isoformat()} for c in history])
 
+NDJSON = "application/x-ndjson"
+
+# Report endpoints send an ETag derived from the versions of the stores the
+# report reads; a request whose If-None-Match still matches gets a 304 before
+# the report is built or serialized
+def _not_modified(request, etag):
+    tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    return etag in tags or "*" in tags
+
+async def _report_response(request, etag_key, build):
+    # etag_key is report_etag's arguments; reading the store versions may
+    # query SQLite, so the tag is computed in the thread pool with the report
+    def respond():
+        etag = report_etag(*etag_key)
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        try:
+            content = jsonable_encoder(build())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return JSONResponse(content=content, headers={"ETag": etag})
+    return await run_in_threadpool(respond)
+
+def _stream_json_array(items):
+    yield "["
+    for n, item in enumerate(items):
+        yield ("," if n else "") + item.model_dump_json()
+    yield "]"
+
+def _stream_ndjson(items):
+    for item in items:
+        yield item.model_dump_json() + "\n"
+
 @app.get("/inventory/")
-def api_list_inventory(state: str = None, component_id: str = None):
-    items = list_inventory(state=state, component_id=component_id)
-    return items
+async def api_list_inventory(
+    request: Request,
+    state: str = None,
+    component_id: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    after: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+):
+    # Without a limit the whole listing is streamed item by item; with one, a
+    # single page is returned and X-Next-Cursor holds the `after` for the next.
+    # as_of returns the stock per (component_id, state) at that time instead.
+    ndjson = NDJSON in request.headers.get("accept", "")
+    etag = await run_in_threadpool(report_etag, "inventory", state, component_id, limit, after, as_of, ndjson)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        if as_of is not None:
+            if limit is not None or after:
+                raise ValueError("as_of cannot be combined with limit or after")
+            items = await run_in_threadpool(list_inventory, state=state, component_id=component_id, as_of=as_of)
+            headers = {"ETag": etag}
+        elif limit is None:
+            items = (item for _, item in iter_inventory(state=state, component_id=component_id, after=after))
+            headers = {"ETag": etag}
+        else:
+            items, next_cursor = await run_in_threadpool(page_inventory, state=state, component_id=component_id,
+                                                         limit=limit, after=after)
+            headers = {"ETag": etag, "X-Next-Cursor": next_cursor} if next_cursor else {"ETag": etag}
+            if not ndjson:
+                body = await run_in_threadpool("".join, _stream_json_array(items))
+                return Response(content=body, media_type="application/json", headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if ndjson:
+        return StreamingResponse(_stream_ndjson(items), media_type=NDJSON, headers=headers)
+    return StreamingResponse(_stream_json_array(items), media_type="application/json", headers=headers)
 
 @app.get("/hardware-revisions/{hwrev_id}/verify-inventory")
-def api_verify_hardware_revision_inventory(hwrev_id: str):
-    result = verify_hardware_revision_inventory(hwrev_id)
-    if result is None:
-        raise HTTPException(status_code=404, detail="Hardware revision not found")
-    return {"missing": result, "ok": not result}
+async def api_verify_hardware_revision_inventory(request: Request, hwrev_id: str, as_of: Optional[datetime] = None):
+    def build():
+        result = verify_hardware_revision_inventory(hwrev_id, as_of=as_of)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Hardware revision not found")
+        return {"missing": result, "ok": not result}
+    return await _report_response(request, ("verify-inventory", hwrev_id, as_of), build)
 
+# With any of min_days, max_days, sort or top, only components whose `by`
+# lead time is known are listed, sorted by it; top alone lists the longest.
+# group_by=vendor returns observed ordered-to-received statistics per vendor.
 @app.get("/lead-time-report")
-def api_lead_time_report():
-    return get_lead_time_report()
+async def api_lead_time_report(
+    request: Request,
+    min_days: Optional[float] = None,
+    max_days: Optional[float] = None,
+    sort: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    top: Optional[int] = Query(None, ge=1),
+    by: str = Query("actual", pattern="^(actual|estimated)$"),
+    group_by: Optional[str] = Query(None, pattern="^vendor$"),
+):
+    return await _report_response(
+        request, ("lead-time", min_days, max_days, sort, top, by, group_by),
+        lambda: get_lead_time_report(min_days=min_days, max_days=max_days, sort=sort, top=top, by=by,
+                                     group_by=group_by),
+    )
+
+@app.get("/lead-time-report/forecast")
+async def api_lead_time_forecast(request: Request):
+    return await _report_response(request, ("lead-time-forecast",), get_lead_time_forecast)
 
+@app.get("/lead-time-report/variance")
+async def api_lead_time_variance(request: Request):
+    return await _report_response(request, ("lead-time-variance",), get_lead_time_variance)
+
+# group_by=component|vendor|manufacturer reports failure rates observed from
+# inventory state changes, with confidence intervals and 30/90-day windows
 @app.get("/failure-rate-report")
-def api_failure_rate_report(threshold: float = 0.05):
-    return get_failure_rate_report(threshold)
+async def api_failure_rate_report(
+    request: Request,
+    threshold: float = 0.05,
+    top: Optional[int] = Query(None, ge=1),
+    group_by: Optional[str] = Query(None, pattern="^(component|vendor|manufacturer)$"),
+):
+    if group_by is None:
+        etag_key = ("failure-rate", threshold, top)
+    else:
+        # The rolling windows move daily
+        etag_key = ("observed-failure-rate", threshold, top, group_by, int(time.time() // 86400))
+    return await _report_response(request, etag_key, lambda: get_failure_rate_report(threshold, top=top, group_by=group_by))
+
+@app.get("/reports/cache")
+async def api_report_cache_stats():
+    return report_cache_stats()
+
+@app.get("/writer/stats")
+async def api_writer_stats():
+    return writer.stats()
+
+@app.get("/changes")
+async def api_get_changes(kind: Optional[str] = None, record_id: Optional[str] = None, limit: int = Query(100, ge=1)):
+    return await run_in_threadpool(get_changes, kind=kind, record_id=record_id, limit=limit)
 
 @app.get("/allocation-validation/{component_id}")
-def api_validate_inventory_allocation(component_id: str, requested_qty: int):
-    valid, available = validate_inventory_allocation(component_id, requested_qty)
+async def api_validate_inventory_allocation(component_id: str, requested_qty: int):
+    valid, available = await run_in_threadpool(validate_inventory_allocation, component_id, requested_qty)
     return {"valid": valid, "available": available}
 
 @app.get("/cost-history-report/{component_id}")
-def api_cost_history_report(component_id: str):
-    return get_cost_history_report(component_id)
+async def api_cost_history_report(
+    component_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+    last: Optional[int] = Query(None, ge=1),
+):
+    return await run_in_threadpool(get_cost_history_report, component_id, since=since, until=until, last=last)
+
+# Orders are {"hwrev_id", "quantity", "due", "weight"} objects in priority order
+@app.post("/plans/builds")
+async def api_plan_builds(
+    orders: list[dict],
+    objective: str = Query("builds", pattern="^(builds|priority)$"),
+    commit: bool = False,
+    ttl: int = DEFAULT_TTL,
+):
+    # A committed plan is planned and reserved in one command, so no other
+    # change can land in between
+    def build():
+        plan = plan_builds(orders, objective=objective)
+        if commit:
+            plan["reservations"] = commit_plan(plan, ttl=ttl)
+        return plan
+    try:
+        return await (writer.submit(build) if commit else run_in_threadpool(build))
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"missing": e.missing})
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/reports/valuation")
+async def api_valuation_report(
+    as_of: Optional[datetime] = None,
+    group_by: str = Query("state", pattern="^(state|vendor|manufacturer|component)$"),
+):
+    try:
+        return await run_in_threadpool(valuation_report, as_of=as_of, group_by=group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/components/{component_id}/reserve", response_model=Reservation)
+async def api_reserve_component(component_id: str, quantity: int, ttl: int = DEFAULT_TTL):
+    try:
+        return await writer.submit(reserve_component, component_id, quantity, ttl=ttl)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"missing": e.missing})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/hardware-revisions/{hwrev_id}/reserve", response_model=Reservation)
+async def api_reserve_hardware_revision(hwrev_id: str, builds: int = 1, ttl: int = DEFAULT_TTL):
+    try:
+        reservation = await writer.submit(reserve_hardware_revision, hwrev_id, builds=builds, ttl=ttl)
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"missing": e.missing})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Hardware revision not found")
+    return reservation
+
+@app.get("/reservations/{reservation_id}", response_model=Reservation)
+async def api_get_reservation(reservation_id: str):
+    reservation = await run_in_threadpool(get_reservation, reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+@app.post("/reservations/{reservation_id}/confirm", response_model=Reservation)
+async def api_confirm_reservation(reservation_id: str):
+    reservation = await writer.submit(confirm_reservation, reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+@app.delete("/reservations/{reservation_id}")
+async def api_release_reservation(reservation_id: str):
+    if not await writer.submit(release_reservation, reservation_id):
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return {"status": "released"}
@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CommandQueue:
+    """Applies mutations one at a time, in arrival order, on one writer thread.
+
+    Handlers submit a function with its arguments and await its result. The
+    writer task takes every command already waiting (up to `max_batch`) and
+    runs them back to back in a single hop to the writer thread, so a burst of
+    writes costs one thread switch rather than one each, and the event loop
+    never blocks on SQLite or fsync. As only that thread changes the store,
+    writes from the API are serial; readers see each write whole because
+    stored records are replaced rather than changed in place.
+
+    A command whose caller has gone away still runs; its result is dropped.
+    """
+
+    def __init__(self, max_batch=64):
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aim-writer")
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.applied = 0
+
+    def start(self):
+        # Binds the queue to the running event loop; a new loop (a restarted
+        # server, a test client) gets a fresh queue and writer task
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def stop(self):
+        # Applies whatever is queued, then stops the writer task
+        if self._task is None:
+            return
+        task, self._task, self._loop = self._task, None, None
+        await self._queue.join()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, fn, *args, **kwargs):
+        self.start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((fn, args, kwargs, future))
+        return await future
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "applied": self.applied,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "avg_batch": self.applied / self.batches if self.batches else 0.0,
+        }
+
+    async def _run(self):
+        queue, loop = self._queue, asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            results = await loop.run_in_executor(self._executor, _apply, batch)
+            self.batches += 1
+            self.applied += len(batch)
+            for (_, _, _, future), (ok, value) in zip(batch, results):
+                if not future.done():
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                queue.task_done()
+
+
+def _apply(batch):
+    # Runs on the writer thread; one failing command does not stop the rest
+    results = []
+    for fn, args, kwargs, _ in batch:
+        try:
+            results.append((True, fn(*args, **kwargs)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+writer = CommandQueue()